@@ -0,0 +1,8 @@
+"""
+pytest configuration.
+
+The automated tests live in tests/. test_field_extraction.py is an
+interactive script (it asks for a PDF folder) and is not collected.
+"""
+
+collect_ignore = ["test_field_extraction.py"]
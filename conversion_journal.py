@@ -0,0 +1,185 @@
+"""
+Write-ahead journal of extraction results for crash-safe conversions.
+
+Each PDF's extracted values are appended to a JSON Lines file next to the
+output workbook as soon as the PDF is done, and flushed to disk. If the
+conversion dies or the workbook cannot be saved, a resumed run reads the
+journal and only extracts the PDFs that are not in it. The journal is
+removed once all rows have been written.
+
+Outputs that can only append (CSV, Parquet) also record in the journal
+which files were written, so a resumed run does not write them twice.
+"""
+
+import json
+import os
+import threading
+
+from extraction_cache import FAILED_VALUES, mapping_hash
+
+
+def default_journal_path(excel_path):
+    """Return the journal path used for an output workbook"""
+    return os.path.splitext(excel_path)[0] + ".journal.jsonl"
+
+
+def _file_stat(pdf_path):
+    """Return (size, mtime_ns) of a file, or None if it cannot be read"""
+    try:
+        stat = os.stat(pdf_path)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class ConversionJournal:
+    """Append-only journal of per-file extraction results"""
+
+    def __init__(self, journal_path, field_mapping=None, resume=False, engine=None):
+        self.journal_path = journal_path
+        self.mapping_key = mapping_hash(field_mapping, engine=engine)
+        self._torn = False
+        # Results are appended while the writer thread marks written rows
+        self._lock = threading.Lock()
+        # Resumed files whose rows were already written (see mark_written)
+        self.written = set()
+        self.entries = self._load() if resume else {}
+        self.resumed = len(self.entries)
+
+        # Start a fresh journal unless resuming the previous one
+        self.file = open(journal_path, 'a' if resume else 'w', encoding='utf-8')
+        if self._torn:
+            # Don't glue the next entry onto an incomplete last line
+            self.file.write("\n")
+
+    def _load(self):
+        """
+        Read the journal of a previous run.
+
+        Entries for another field mapping, for files that changed since, and
+        failed extractions are ignored. An incomplete last line (the process
+        died while writing it) is skipped. The files marked as written are
+        collected in self.written.
+
+        Returns:
+            Dictionary of absolute pdf_path: [field_values]
+        """
+        entries = {}
+        written = set()
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    self._torn = not line.endswith("\n")
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    if not isinstance(entry, dict) or entry.get('mapping') != self.mapping_key:
+                        continue
+                    if 'written' in entry:
+                        written.update(entry['written'])
+                        continue
+                    # A newer result of the file has not been written yet
+                    written.discard(entry['path'])
+                    if any(value in FAILED_VALUES for value in entry['values']):
+                        continue
+                    if _file_stat(entry['path']) != (entry['size'], entry['mtime_ns']):
+                        continue
+                    entries[entry['path']] = entry['values']
+        except OSError:
+            pass
+        self.written = written & entries.keys()
+        return entries
+
+    def lookup(self, pdf_path):
+        """
+        Look up the journaled field values of a PDF file.
+
+        Returns:
+            List of field values, or None if the file has to be extracted
+        """
+        return self.entries.get(os.path.abspath(pdf_path))
+
+    def was_written(self, pdf_path):
+        """Check whether a resumed file's row was written by the previous run"""
+        return os.path.abspath(pdf_path) in self.written
+
+    def mark_written(self, pdf_paths):
+        """
+        Record that the rows of PDF files were written to the output, and
+        flush the record to disk.
+
+        Args:
+            pdf_paths: Full paths of the written PDF files
+        """
+        entry = {
+            'mapping': self.mapping_key,
+            'written': [os.path.abspath(pdf_path) for pdf_path in pdf_paths],
+        }
+        self._write(entry)
+
+    def skip_written(self, records):
+        """Yield the (filename, values, full_path) records the previous run did not write"""
+        for record in records:
+            if not self.was_written(record[2]):
+                yield record
+
+    def marking_written(self, write_batch):
+        """
+        Wrap a batch writer so the files of every written batch are marked
+        as written (see mark_written).
+
+        Args:
+            write_batch: Function writing a list of records; returns True on success
+        """
+        def write_and_mark(records):
+            if not write_batch(records):
+                return False
+            self.mark_written(pdf_path for _, _, pdf_path in records)
+            return True
+        return write_and_mark
+
+    def append(self, pdf_path, values):
+        """
+        Record the field values of a PDF file and flush them to disk.
+
+        Only the entries of a resumed journal are kept in memory, so the
+        journal does not grow with the number of files in a run.
+
+        Args:
+            pdf_path: Full path to the PDF file
+            values: List of extracted field values
+        """
+        stat = _file_stat(pdf_path)
+        if stat is None:
+            return
+
+        path = os.path.abspath(pdf_path)
+        entry = {
+            'path': path,
+            'size': stat[0],
+            'mtime_ns': stat[1],
+            'mapping': self.mapping_key,
+            'values': values,
+        }
+        self._write(entry)
+
+    def _write(self, entry):
+        """Append an entry as one line and flush it to disk"""
+        with self._lock:
+            self.file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        """Close the journal (it is kept for a later resume)"""
+        if not self.file.closed:
+            self.file.close()
+
+    def discard(self):
+        """Close and delete the journal (all rows were written)"""
+        self.close()
+        try:
+            os.remove(self.journal_path)
+        except OSError:
+            pass
@@ -0,0 +1,304 @@
+"""
+Sidecar index of the PDF files already exported to a workbook.
+
+Checking for duplicates used to mean scanning column A of the target sheet
+on every run. The ExportIndex keeps the exported files of every sheet in a
+small SQLite database next to the workbook, so a duplicate check is an
+index lookup. The index remembers the size and mtime of the workbook it
+describes; if the workbook was changed by anything else (e.g. edited in
+Excel), the index is rebuilt from the sheet.
+
+The content hash of every exported PDF is kept as well, so a renamed or
+re-sent copy of an exported invoice is recognised as a duplicate. Content
+hashes survive rebuilds: a hash counts as long as the row it was recorded
+for is still in the sheet.
+
+Rows of files that could not be extracted (see FAILED_VALUES) are indexed
+apart, with their row number: such a file is not a duplicate, and when it
+is tried again its new result replaces the failed row instead of adding
+another one.
+"""
+
+import os
+import sqlite3
+
+from extraction_cache import FAILED_VALUES
+
+
+def default_index_path(excel_path):
+    """Return the index path used for a workbook"""
+    return os.path.splitext(excel_path)[0] + ".index.db"
+
+
+def path_key(pdf_path):
+    """Index key for a PDF identified by its location"""
+    return "path:" + os.path.normcase(os.path.abspath(pdf_path))
+
+
+def name_key(pdf_name):
+    """Index key for a row that only has a filename (no hyperlink)"""
+    return "name:" + str(pdf_name).strip()
+
+
+class ExportIndex:
+    """Per-workbook, per-sheet index of exported PDF files"""
+
+    def __init__(self, excel_path, index_path=None):
+        self.excel_path = excel_path
+        self.index_path = index_path or default_index_path(excel_path)
+
+        try:
+            # A streamed workbook adds rows from the conversion's writer
+            # thread and is saved from the caller's thread
+            self.conn = sqlite3.connect(self.index_path, check_same_thread=False)
+            self._create_tables()
+        except sqlite3.Error:
+            # Index location not writable: fall back to a throw-away index,
+            # which is rebuilt from the sheet on every run
+            self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._create_tables()
+
+    def _create_tables(self):
+        has_failed = self.conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'failed'"
+        ).fetchone()
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS exported (
+                sheet TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (sheet, key)
+            );
+            CREATE TABLE IF NOT EXISTS failed (
+                sheet TEXT NOT NULL,
+                key TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                PRIMARY KEY (sheet, key)
+            );
+            CREATE TABLE IF NOT EXISTS sheets (
+                sheet TEXT PRIMARY KEY
+            );
+            CREATE TABLE IF NOT EXISTS hashes (
+                sheet TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                key TEXT NOT NULL,
+                PRIMARY KEY (sheet, content_hash)
+            );
+            CREATE TABLE IF NOT EXISTS workbook (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL
+            );
+            """
+        )
+        if has_failed is None:
+            # Indexes made before failed rows were recorded are rebuilt
+            self.reset()
+        self.conn.commit()
+
+    def _workbook_stat(self):
+        """Return (size, mtime_ns) of the workbook, or None if missing"""
+        try:
+            stat = os.stat(self.excel_path)
+        except OSError:
+            return None
+        return (stat.st_size, stat.st_mtime_ns)
+
+    def is_current(self, sheet_name):
+        """
+        Check whether the index describes the workbook's current content
+        for a sheet.
+
+        Any change to the workbook that was not made through the index
+        invalidates every sheet.
+        """
+        recorded = self.conn.execute("SELECT size, mtime_ns FROM workbook").fetchone()
+        if recorded is None or tuple(recorded) != self._workbook_stat():
+            self.reset()
+            return False
+
+        return self.conn.execute(
+            "SELECT 1 FROM sheets WHERE sheet = ?", (sheet_name,)
+        ).fetchone() is not None
+
+    def reset(self):
+        """
+        Forget everything (e.g. the workbook is being created).
+
+        Content hashes are kept; they only count again once their row is
+        found in the sheet.
+        """
+        for table in ("exported", "failed", "sheets", "workbook"):
+            self.conn.execute(f"DELETE FROM {table}")
+
+    def rebuild(self, sheet_name, ws):
+        """
+        Rebuild the index of a sheet from a loaded worksheet.
+
+        Rows are keyed on the PDF path behind their "Open Invoice" hyperlink;
+        rows without a hyperlink fall back to their filename. Rows of files
+        that could not be extracted (see FAILED_VALUES) are recorded as
+        failed rows, so those files are tried again.
+
+        Args:
+            sheet_name: Name of the sheet
+            ws: Loaded (not read-only) openpyxl worksheet
+        """
+        headers = [cell.value for cell in ws[1]]
+        link_col = headers.index("Path to Invoice") if "Path to Invoice" in headers else None
+        excel_dir = os.path.dirname(os.path.abspath(self.excel_path))
+
+        keys = set()
+        failed = {}
+        for row in ws.iter_rows(min_row=2):
+            pdf_name = row[0].value
+            if not pdf_name or not str(pdf_name).strip():
+                continue
+
+            link = row[link_col].hyperlink if link_col is not None and link_col < len(row) else None
+            if link is not None and link.target:
+                key = path_key(os.path.join(excel_dir, link.target))
+            else:
+                key = name_key(pdf_name)
+
+            if any(cell.value in FAILED_VALUES for cell in row[1:link_col]):
+                failed[key] = row[0].row
+            else:
+                keys.add(key)
+
+        self.conn.execute("DELETE FROM exported WHERE sheet = ?", (sheet_name,))
+        self.conn.execute("DELETE FROM failed WHERE sheet = ?", (sheet_name,))
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO exported (sheet, key) VALUES (?, ?)",
+            [(sheet_name, key) for key in keys]
+        )
+        # A file that failed and was exported later is no longer failed
+        self.conn.executemany(
+            "INSERT INTO failed (sheet, key, row) VALUES (?, ?, ?)",
+            [(sheet_name, key, row) for key, row in failed.items() if key not in keys]
+        )
+        self.conn.execute("INSERT OR IGNORE INTO sheets (sheet) VALUES (?)", (sheet_name,))
+
+    def add_sheet(self, sheet_name):
+        """Register a new (empty) sheet"""
+        self.conn.execute("DELETE FROM exported WHERE sheet = ?", (sheet_name,))
+        self.conn.execute("DELETE FROM failed WHERE sheet = ?", (sheet_name,))
+        self.conn.execute("INSERT OR IGNORE INTO sheets (sheet) VALUES (?)", (sheet_name,))
+
+    def count(self, sheet_name):
+        """Number of exported files recorded for a sheet"""
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM exported WHERE sheet = ?", (sheet_name,)
+        ).fetchone()[0]
+
+    def contains(self, sheet_name, pdf_name, pdf_path, content_hash=None):
+        """
+        Check whether a PDF was already exported to a sheet.
+
+        Args:
+            sheet_name: Name of the sheet
+            pdf_name: PDF filename (column A)
+            pdf_path: Full path to the PDF file
+            content_hash: Optional content hash of the PDF file
+        """
+        if self.conn.execute(
+            "SELECT 1 FROM exported WHERE sheet = ? AND key IN (?, ?)",
+            (sheet_name, path_key(pdf_path), name_key(pdf_name))
+        ).fetchone() is not None:
+            return True
+
+        return content_hash is not None and self.conn.execute(
+            """
+            SELECT 1 FROM hashes JOIN exported USING (sheet, key)
+            WHERE sheet = ? AND content_hash = ?
+            """,
+            (sheet_name, content_hash)
+        ).fetchone() is not None
+
+    def pop_failed_row(self, sheet_name, pdf_name, pdf_path):
+        """
+        Return the row number of a failed row of a PDF and forget the row.
+
+        The caller writes the PDF's new result into that row; the row is
+        recorded again (see add and add_failed) once the workbook is saved.
+
+        Args:
+            sheet_name: Name of the sheet
+            pdf_name: PDF filename (column A)
+            pdf_path: Full path to the PDF file
+
+        Returns:
+            Row number, or None if the PDF has no failed row
+        """
+        for key in (path_key(pdf_path), name_key(pdf_name)):
+            found = self.conn.execute(
+                "SELECT row FROM failed WHERE sheet = ? AND key = ?", (sheet_name, key)
+            ).fetchone()
+            if found is not None:
+                self.conn.execute(
+                    "DELETE FROM failed WHERE sheet = ? AND key = ?", (sheet_name, key)
+                )
+                return found[0]
+        return None
+
+    def content_hashes(self, sheet_name):
+        """Return the content hashes of the PDFs exported to a sheet"""
+        return {
+            row[0] for row in self.conn.execute(
+                "SELECT content_hash FROM hashes JOIN exported USING (sheet, key) WHERE sheet = ?",
+                (sheet_name,)
+            )
+        }
+
+    def add(self, sheet_name, pdf_paths, content_hashes=None):
+        """
+        Record PDF files as exported to a sheet.
+
+        Args:
+            sheet_name: Name of the sheet
+            pdf_paths: Full paths of the exported PDF files
+            content_hashes: Optional dictionary of pdf_path: content hash
+        """
+        pdf_paths = list(pdf_paths)
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO exported (sheet, key) VALUES (?, ?)",
+            [(sheet_name, path_key(pdf_path)) for pdf_path in pdf_paths]
+        )
+        if content_hashes:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO hashes (sheet, content_hash, key) VALUES (?, ?, ?)",
+                [(sheet_name, content_hashes[pdf_path], path_key(pdf_path))
+                 for pdf_path in pdf_paths if pdf_path in content_hashes]
+            )
+
+    def add_failed(self, sheet_name, rows):
+        """
+        Record the rows of PDF files that could not be extracted.
+
+        Args:
+            sheet_name: Name of the sheet
+            rows: Tuples (pdf_path, row number)
+        """
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO failed (sheet, key, row) VALUES (?, ?, ?)",
+            [(sheet_name, path_key(pdf_path), row) for pdf_path, row in rows]
+        )
+
+    def commit(self):
+        """Mark the index as describing the workbook as it is now on disk"""
+        stat = self._workbook_stat()
+        if stat is None:
+            self.conn.rollback()
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO workbook (id, size, mtime_ns) VALUES (1, ?, ?)", stat
+        )
+        self.conn.commit()
+
+    def rollback(self):
+        """Discard index changes (e.g. the workbook could not be saved)"""
+        self.conn.rollback()
+
+    def close(self):
+        """Close the database"""
+        self.conn.close()
@@ -0,0 +1,233 @@
+"""
+Persistent cache of PDF extraction results.
+
+Results are stored in a small SQLite database (normally next to
+field_mapping.json) so that unchanged PDFs extracted with an unchanged
+field mapping never have to be parsed again.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+CACHE_FILENAME = "extraction_cache.db"
+
+# Default upper bound for the cached result payloads
+DEFAULT_MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Bump whenever the extraction logic changes in a way that changes results,
+# so values produced by older versions are not served from the cache.
+# 2: tiered Total Amount matching, page statistics and per-file limits
+# 3: only the likely, first and last pages of a PDF are searched
+# 4: every page is searched again, the first and last pages before the rest
+CACHE_VERSION = 4
+
+# Values of files that could not be extracted (an error, or over a per-file
+# limit); such results are retried instead of being cached or resumed
+FAILED_VALUES = ('Error', 'Timeout', 'Too large')
+
+# Approximate per-row overhead (keys, index entries) used for size accounting
+ROW_OVERHEAD_BYTES = 160
+
+# Number of cache writes between commits
+COMMIT_INTERVAL = 100
+
+
+def file_content_hash(pdf_path, chunk_size=1024 * 1024):
+    """
+    Compute the SHA-256 hash of a file's content.
+
+    Args:
+        pdf_path: Full path to the file
+        chunk_size: Number of bytes read at a time
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(pdf_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def mapping_hash(field_mapping, templates=None, engine=None, methods=None):
+    """
+    Compute a stable hash of the active field mapping.
+
+    Args:
+        field_mapping: List of field names (None/empty for default mode)
+        templates: Optional learned field region templates
+        engine: Optional extraction engine; the default pdfplumber engine
+                leaves the hash unchanged
+        methods: Optional learned field methods
+
+    Returns:
+        Hex digest string
+    """
+    config = {'version': CACHE_VERSION, 'fields': list(field_mapping or [])}
+    if templates:
+        config['templates'] = templates
+    if methods:
+        config['methods'] = methods
+    if engine and engine != "pdfplumber":
+        config['engine'] = engine
+    payload = json.dumps(config, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def default_cache_path(mapping_file):
+    """Return the cache database path that sits next to the mapping file"""
+    return os.path.join(os.path.dirname(os.path.abspath(mapping_file)), CACHE_FILENAME)
+
+
+class ExtractionCache:
+    """SQLite-backed cache of extracted field values for one field mapping"""
+
+    def __init__(self, db_path, field_mapping=None, max_bytes=DEFAULT_MAX_CACHE_BYTES,
+                 templates=None, engine=None, methods=None):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.mapping_key = mapping_hash(field_mapping, templates, engine, methods)
+        self.hits = 0
+        self.misses = 0
+        self._keys = {}  # pdf_path -> (content_hash, size, mtime_ns)
+        self._uncommitted = 0
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS results (
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                mapping_hash TEXT NOT NULL,
+                field_values TEXT NOT NULL,
+                nbytes INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (content_hash, size, mtime_ns, mapping_hash)
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used)"
+        )
+        self.conn.commit()
+
+    def _file_key(self, pdf_path, content_hash=None):
+        """Build (content_hash, size, mtime_ns) for a file, or None if unreadable"""
+        try:
+            stat = os.stat(pdf_path)
+            return (content_hash or file_content_hash(pdf_path), stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            return None
+
+    def lookup(self, pdf_path, content_hash=None):
+        """
+        Look up cached field values for a PDF file.
+
+        Args:
+            pdf_path: Full path to the PDF file
+            content_hash: SHA-256 of the file's content, if the caller has
+                          already read it (saves reading the file again)
+
+        Returns:
+            List of field values, or None if the file is not cached
+        """
+        key = self._file_key(pdf_path, content_hash)
+        if key is None:
+            self.misses += 1
+            return None
+
+        self._keys[pdf_path] = key
+        row = self.conn.execute(
+            """
+            SELECT field_values FROM results
+            WHERE content_hash = ? AND size = ? AND mtime_ns = ? AND mapping_hash = ?
+            """,
+            (*key, self.mapping_key)
+        ).fetchone()
+
+        if row is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.conn.execute(
+            """
+            UPDATE results SET last_used = ?
+            WHERE content_hash = ? AND size = ? AND mtime_ns = ? AND mapping_hash = ?
+            """,
+            (time.time(), *key, self.mapping_key)
+        )
+        self._mark_dirty()
+        return json.loads(row[0])
+
+    def store(self, pdf_path, values):
+        """
+        Store extracted field values for a PDF file.
+
+        Results containing one of FAILED_VALUES are not cached so that
+        failed files are retried on the next run.
+
+        Args:
+            pdf_path: Full path to the PDF file
+            values: List of extracted field values
+        """
+        key = self._keys.pop(pdf_path, None)
+        if any(value in FAILED_VALUES for value in values):
+            return
+
+        key = key or self._file_key(pdf_path)
+        if key is None:
+            return
+
+        payload = json.dumps(values)
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO results
+            (content_hash, size, mtime_ns, mapping_hash, field_values, nbytes, last_used)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (*key, self.mapping_key, payload,
+             len(payload.encode('utf-8')) + ROW_OVERHEAD_BYTES, time.time())
+        )
+        self._mark_dirty()
+
+    def _mark_dirty(self):
+        """Commit periodically so a crash loses at most a few entries"""
+        self._uncommitted += 1
+        if self._uncommitted >= COMMIT_INTERVAL:
+            self.evict()
+            self.conn.commit()
+            self._uncommitted = 0
+
+    def evict(self):
+        """Evict least recently used entries until the cache fits max_bytes"""
+        total = self.conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Free a little more than needed so we don't evict on every write
+        to_free = total - int(self.max_bytes * 0.9)
+        freed = 0
+        stale = []
+        for rowid, nbytes in self.conn.execute(
+            "SELECT rowid, nbytes FROM results ORDER BY last_used"
+        ):
+            stale.append((rowid,))
+            freed += nbytes
+            if freed >= to_free:
+                break
+
+        self.conn.executemany("DELETE FROM results WHERE rowid = ?", stale)
+
+    def close(self):
+        """Evict, commit and close the database"""
+        try:
+            self.evict()
+            self.conn.commit()
+        finally:
+            self.conn.close()
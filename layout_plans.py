@@ -0,0 +1,151 @@
+"""
+Persistent extraction plans for PDF layouts.
+
+Folders usually mix invoices from many vendors, but every vendor sends the
+same layout again and again. PDFs are grouped by a cheap layout fingerprint
+(see pdf_to_excel_core.layout_fingerprint); the first PDF of a layout gets
+the full search, and the regions where its fields were found become the
+layout's extraction plan. Plans are kept in a small SQLite database next to
+field_mapping.json, so later runs start with every known vendor on the
+fast path.
+
+The same database counts on which page (from the start and from the end of
+the PDF) every field was found, so fields are looked for on their most
+likely page first.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from extraction_cache import mapping_hash
+
+PLANS_FILENAME = "layout_plans.db"
+
+
+def default_plans_path(mapping_file):
+    """Return the plan database path that sits next to the mapping file"""
+    return os.path.join(os.path.dirname(os.path.abspath(mapping_file)), PLANS_FILENAME)
+
+
+def _decode_plan(payload):
+    """Decode a stored plan (bounding boxes become tuples again)"""
+    return {
+        field: {
+            'page': int(template['page']),
+            'bbox': tuple(template['bbox']),
+            'label_bbox': tuple(template['label_bbox']),
+        }
+        for field, template in json.loads(payload).items()
+    }
+
+
+class LayoutPlanStore:
+    """
+    SQLite store of per-layout extraction plans for one field mapping.
+
+    Plans are kept per extraction engine, since the engines place
+    characters differently.
+    """
+
+    def __init__(self, db_path, field_mapping=None, engine=None):
+        self.db_path = db_path
+        self.mapping_key = mapping_hash(field_mapping, engine=engine)
+        self.learned = 0
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS plans (
+                mapping_hash TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                plan TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (mapping_hash, fingerprint)
+            )
+            """
+        )
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS page_hits (
+                mapping_hash TEXT NOT NULL,
+                field TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                hits INTEGER NOT NULL,
+                PRIMARY KEY (mapping_hash, field, position)
+            )
+            """
+        )
+        self.conn.commit()
+
+    def load(self):
+        """
+        Load the plans of every known layout.
+
+        Returns:
+            Dictionary of fingerprint: plan, where a plan is a dictionary of
+            field_name: template (see learn_field_templates)
+        """
+        return {
+            fingerprint: _decode_plan(payload)
+            for fingerprint, payload in self.conn.execute(
+                "SELECT fingerprint, plan FROM plans WHERE mapping_hash = ?",
+                (self.mapping_key,)
+            )
+        }
+
+    def save(self, fingerprint, plan):
+        """
+        Store the plan learned for a layout.
+
+        Args:
+            fingerprint: Layout fingerprint
+            plan: Dictionary of field_name: template (may be empty)
+        """
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO plans (mapping_hash, fingerprint, plan, updated_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (self.mapping_key, fingerprint, json.dumps(plan), time.time())
+        )
+        self.learned += 1
+
+    def load_page_hits(self):
+        """
+        Load the page statistics of the fields.
+
+        Returns:
+            Dictionary of field_name: {position: hits}; positions count from
+            the first page (0, 1, ...) or from the last page (-1, -2, ...)
+        """
+        page_hits = {}
+        for field, position, hits in self.conn.execute(
+            "SELECT field, position, hits FROM page_hits WHERE mapping_hash = ?",
+            (self.mapping_key,)
+        ):
+            page_hits.setdefault(field, {})[position] = hits
+        return page_hits
+
+    def add_page_hits(self, hits):
+        """
+        Count the pages fields were found on.
+
+        Args:
+            hits: List of (field_name, position) pairs
+        """
+        self.conn.executemany(
+            """
+            INSERT INTO page_hits (mapping_hash, field, position, hits) VALUES (?, ?, ?, 1)
+            ON CONFLICT (mapping_hash, field, position) DO UPDATE SET hits = hits + 1
+            """,
+            [(self.mapping_key, field, position) for field, position in hits]
+        )
+
+    def close(self):
+        """Commit and close the database"""
+        try:
+            self.conn.commit()
+        finally:
+            self.conn.close()
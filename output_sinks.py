@@ -0,0 +1,200 @@
+"""
+Output sinks for high-volume exports.
+
+Excel workbooks have to be rewritten completely on every save and are
+limited to about a million rows. The sinks below append records without
+rewriting what is already there, using the same column layout as the
+Excel sheet: PDF Filename, the mapped fields, Path to Invoice.
+
+    csv      one CSV file, rows appended
+    sqlite   one table in a SQLite database, upserted on the PDF filename
+    parquet  a directory of Parquet part files, one new part per batch
+             (requires pyarrow)
+"""
+
+import csv
+import os
+import sqlite3
+import time
+
+# Output formats handled by a sink, with the extension used for their path
+SINK_EXTENSIONS = {
+    "csv": ".csv",
+    "sqlite": ".db",
+    "parquet": ".parquet",
+}
+
+DEFAULT_TABLE = "PDF Files"
+
+
+def record_row(record):
+    """Turn a (filename, [field_values], full_path) record into a row"""
+    filename, values, pdf_path = record
+    return [filename, *values, os.path.abspath(pdf_path)]
+
+
+class OutputSink:
+    """
+    Base class of the output sinks.
+
+    write() is called with batches of records and returns True once they
+    are stored; close() finishes the output. A sink that upserts replaces
+    the row of a PDF that is written again instead of adding another one.
+    """
+
+    upserts = False
+
+    def __init__(self, path, headers):
+        self.path = path
+        self.headers = list(headers)
+
+    def write(self, records):
+        """Append a batch of (filename, [field_values], full_path) records"""
+        raise NotImplementedError
+
+    def close(self):
+        """Release the output"""
+
+
+class CSVSink(OutputSink):
+    """Appends rows to a CSV file (the header is written once)"""
+
+    def __init__(self, path, headers):
+        super().__init__(path, headers)
+
+        # Refuse to mix column layouts in one file
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r', newline='', encoding='utf-8') as f:
+                existing = next(csv.reader(f), [])
+            if existing != self.headers:
+                raise ValueError(
+                    f"'{path}' has different columns; choose another file for this field mapping"
+                )
+            self.file = open(path, 'a', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+        else:
+            self.file = open(path, 'w', newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            self.writer.writerow(self.headers)
+
+    def write(self, records):
+        self.writer.writerows(record_row(record) for record in records)
+        self.file.flush()
+        return True
+
+    def close(self):
+        self.file.close()
+
+
+class SQLiteSink(OutputSink):
+    """
+    Upserts rows into a SQLite table keyed on the PDF filename.
+
+    Re-exporting a PDF updates its row instead of adding a duplicate, and
+    columns of newly mapped fields are added to an existing table.
+    """
+
+    upserts = True
+
+    def __init__(self, path, headers, table=DEFAULT_TABLE):
+        super().__init__(path, headers)
+        self.table = table or DEFAULT_TABLE
+        # Batches are written from the conversion's writer thread
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+
+        columns = ", ".join(
+            f"{self._quote(header)} TEXT" + (" PRIMARY KEY" if i == 0 else "")
+            for i, header in enumerate(self.headers)
+        )
+        self.conn.execute(f"CREATE TABLE IF NOT EXISTS {self._quote(self.table)} ({columns})")
+
+        existing = {row[1] for row in self.conn.execute(f"PRAGMA table_info({self._quote(self.table)})")}
+        for header in self.headers:
+            if header not in existing:
+                self.conn.execute(
+                    f"ALTER TABLE {self._quote(self.table)} ADD COLUMN {self._quote(header)} TEXT"
+                )
+        self.conn.commit()
+
+        key = self._quote(self.headers[0])
+        self._upsert = (
+            f"INSERT INTO {self._quote(self.table)} "
+            f"({', '.join(self._quote(header) for header in self.headers)}) "
+            f"VALUES ({', '.join('?' for _ in self.headers)}) "
+            f"ON CONFLICT({key}) DO UPDATE SET "
+            + ", ".join(
+                f"{self._quote(header)} = excluded.{self._quote(header)}"
+                for header in self.headers[1:]
+            )
+        )
+
+    @staticmethod
+    def _quote(name):
+        """Quote an SQL identifier"""
+        return '"' + str(name).replace('"', '""') + '"'
+
+    def write(self, records):
+        with self.conn:
+            self.conn.executemany(self._upsert, [record_row(record) for record in records])
+        return True
+
+    def close(self):
+        self.conn.close()
+
+
+class ParquetSink(OutputSink):
+    """
+    Writes each batch as a new part file of a Parquet dataset directory.
+
+    Existing parts are never rewritten; readers such as pandas, pyarrow,
+    DuckDB or Spark read the directory as one table.
+    """
+
+    def __init__(self, path, headers):
+        super().__init__(path, headers)
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self._schema = pyarrow.schema([(header, pyarrow.string()) for header in self.headers])
+        os.makedirs(path, exist_ok=True)
+        self._parts = 0
+
+    def write(self, records):
+        rows = [record_row(record) for record in records]
+        columns = [
+            [None if row[i] is None else str(row[i]) for row in rows]
+            for i in range(len(self.headers))
+        ]
+        table = self._pa.Table.from_arrays(columns, schema=self._schema)
+
+        self._parts += 1
+        part_name = f"part-{time.time_ns()}-{os.getpid()}-{self._parts:05d}.parquet"
+        self._pq.write_table(table, os.path.join(self.path, part_name))
+        return True
+
+
+def open_sink(output_format, path, headers, table=DEFAULT_TABLE):
+    """
+    Open the output sink for a format.
+
+    Args:
+        output_format: "csv", "sqlite" or "parquet"
+        path: Output file (csv, sqlite) or dataset directory (parquet)
+        headers: Column headers (same layout as the Excel sheet)
+        table: Table name (sqlite only)
+
+    Returns:
+        OutputSink instance
+    """
+    if output_format == "csv":
+        return CSVSink(path, headers)
+    if output_format == "sqlite":
+        return SQLiteSink(path, headers, table)
+    if output_format == "parquet":
+        return ParquetSink(path, headers)
+    raise ValueError(f"Unknown output format: {output_format}")
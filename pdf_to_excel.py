@@ -1,398 +1,99 @@
 import os
-from pathlib import Path
-import openpyxl
-from openpyxl import Workbook
-import pdfplumber
-import re
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk, scrolledtext
 import threading
-import json
-from collections import OrderedDict
+import multiprocessing
+import queue
+import logging
+from logging.handlers import RotatingFileHandler
+from collections import Counter
+from itertools import chain
+from extraction_cache import ExtractionCache, default_cache_path
+from layout_plans import LayoutPlanStore, default_plans_path
+from conversion_journal import ConversionJournal, default_journal_path
+from output_sinks import DEFAULT_TABLE, SINK_EXTENSIONS, open_sink
+from pdf_to_excel_core import (
+    DEFAULT_ENGINE,
+    DEFAULT_FILE_LIMITS,
+    DEFAULT_WORKERS,
+    MAPPING_FILENAME,
+    DuplicateFilter,
+    ExcelBatchWriter,
+    FieldDiscovery,
+    FileLimits,
+    discover_fields,
+    exported_content_hashes,
+    format_tier_counts,
+    iter_pdf_files,
+    extract_all_fields_from_pdf,
+    extract_field_from_pdf,
+    extract_total_amount,
+    extract_pdf_record,
+    extract_pdf_records,
+    learn_field_methods,
+    learn_field_templates,
+    read_extraction_engine,
+    read_field_methods,
+    read_field_templates,
+    read_mapping_file,
+    resolve_sheet_name,
+    sample_pdf_files,
+    write_mapping_file,
+    write_to_excel,
+    write_to_excel_gui,
+    write_records_in_batches,
+    write_to_excel_with_mapping,
+)
 
-def get_pdf_files(folder_path):
-    """
-    Get all PDF files from the specified folder.
-    
-    Args:
-        folder_path: Path to the folder containing PDF files
-        
-    Returns:
-        List of PDF file paths
-    """
-    pdf_files = []
-    
-    if not os.path.exists(folder_path):
-        print(f"Error: Folder '{folder_path}' does not exist.")
-        return pdf_files
-    
-    for file in os.listdir(folder_path):
-        if file.lower().endswith('.pdf'):
-            pdf_files.append(os.path.join(folder_path, file))
-    
-    return sorted(pdf_files)
+# Progress log: how often the GUI drains queued messages, how many lines it
+# inserts per drain, and how many lines the progress widget keeps
+LOG_POLL_MS = 100
+LOG_BATCH_LINES = 500
+MAX_LOG_LINES = 2000
 
-def extract_all_fields_from_pdf(pdf_path, max_pages=3):
-    """
-    Extract all possible fields from a PDF file.
-    
-    Args:
-        pdf_path: Full path to the PDF file
-        max_pages: Maximum number of pages to analyze (default: 3)
-        
-    Returns:
-        Dictionary of field_name: value pairs
-    """
-    fields = OrderedDict()
-    
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Limit analysis to first few pages for performance
-            pages_to_analyze = min(max_pages, len(pdf.pages))
-            
-            for page_num in range(pages_to_analyze):
-                page = pdf.pages[page_num]
-                
-                # Extract text
-                text = page.extract_text() or ""
-                
-                # Extract tables
-                tables = page.extract_tables()
-                
-                # Method 1: Extract from tables (column headers and first data row)
-                if tables:
-                    for table in tables:
-                        if not table or len(table) < 2:
-                            continue
-                        
-                        # Get headers (first row)
-                        headers = table[0] if table else []
-                        
-                        # Try to pair headers with values from subsequent rows
-                        for col_idx, header in enumerate(headers):
-                            if not header or not str(header).strip():
-                                continue
-                            
-                            header_clean = str(header).strip()
-                            
-                            # Look for values in the same column
-                            for row_idx in range(1, min(6, len(table))):  # Check first 5 data rows
-                                if len(table[row_idx]) > col_idx:
-                                    value = table[row_idx][col_idx]
-                                    if value and str(value).strip():
-                                        field_key = f"{header_clean}"
-                                        if field_key not in fields:
-                                            fields[field_key] = str(value).strip()
-                                        break
-                
-                # Method 2: Extract key-value pairs from text
-                # Common patterns: "Label: Value", "Label Value", "Label\nValue"
-                lines = text.split('\n')
-                
-                for i, line in enumerate(lines):
-                    line = line.strip()
-                    if not line:
-                        continue
-                    
-                    # Pattern: "Label: Value"
-                    if ':' in line:
-                        parts = line.split(':', 1)
-                        if len(parts) == 2:
-                            key = parts[0].strip()
-                            value = parts[1].strip()
-                            if key and value and len(key) < 50 and len(value) < 200:
-                                if key not in fields:
-                                    fields[key] = value
-                    
-                    # Pattern: Look for common invoice fields
-                    common_patterns = [
-                        (r'Invoice\s*(?:Number|#|No\.?)\s*[:\s]\s*(.+)', 'Invoice Number'),
-                        (r'Invoice\s*Date\s*[:\s]\s*(.+)', 'Invoice Date'),
-                        (r'Due\s*Date\s*[:\s]\s*(.+)', 'Due Date'),
-                        (r'Total\s*Amount\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Total Amount'),
-                        (r'Subtotal\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Subtotal'),
-                        (r'Tax\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Tax'),
-                        (r'Amount\s*Due\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Amount Due'),
-                        (r'Customer\s*(?:Name|ID)?\s*[:\s]\s*(.+)', 'Customer'),
-                        (r'Vendor\s*(?:Name|ID)?\s*[:\s]\s*(.+)', 'Vendor'),
-                        (r'PO\s*(?:Number|#)?\s*[:\s]\s*(.+)', 'PO Number'),
-                    ]
-                    
-                    for pattern, field_name in common_patterns:
-                        match = re.search(pattern, line, re.IGNORECASE)
-                        if match and field_name not in fields:
-                            value = match.group(1).strip()
-                            if value:
-                                fields[field_name] = value
-                
-                # Method 3: Look for standalone labeled fields across multiple lines
-                for i, line in enumerate(lines):
-                    # Check if this line looks like a label (short, ends with specific keywords)
-                    if len(line) < 50 and any(keyword in line.lower() for keyword in 
-                        ['number', 'date', 'name', 'id', 'code', 'amount', 'total', 'address', 'email', 'phone']):
-                        # Check next line for potential value
-                        if i + 1 < len(lines):
-                            next_line = lines[i + 1].strip()
-                            if next_line and len(next_line) < 200:
-                                label = line.strip().rstrip(':')
-                                if label and label not in fields:
-                                    fields[label] = next_line
-                
-    except Exception as e:
-        print(f"Error extracting fields from {os.path.basename(pdf_path)}: {str(e)}")
-    
-    return fields
+# Rotating file that receives a full copy of the progress log
+LOG_FILENAME = "pdf_to_excel.log"
+LOG_MAX_BYTES = 5 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
 
-def extract_field_from_pdf(pdf_path, field_patterns):
-    """
-    Extract specific field(s) from PDF based on field patterns.
-    
-    Args:
-        pdf_path: Full path to the PDF file
-        field_patterns: List of field names/patterns to search for
-        
-    Returns:
-        Dictionary of found field values
-    """
-    results = {}
-    
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            for page in pdf.pages[:3]:  # Check first 3 pages
-                text = page.extract_text() or ""
-                tables = page.extract_tables()
-                
-                # Search in tables
-                if tables:
-                    for table in tables:
-                        if not table:
-                            continue
-                        
-                        for row in table:
-                            if not row:
-                                continue
-                            
-                            for cell in row:
-                                if not cell:
-                                    continue
-                                
-                                cell_str = str(cell)
-                                for pattern in field_patterns:
-                                    if pattern.lower() in cell_str.lower() and pattern not in results:
-                                        # Try to find value in same row or next rows
-                                        row_idx = table.index(row)
-                                        col_idx = row.index(cell)
-                                        
-                                        # Look in same column, next rows
-                                        for data_row in table[row_idx + 1:row_idx + 5]:
-                                            if len(data_row) > col_idx and data_row[col_idx]:
-                                                value = str(data_row[col_idx]).strip()
-                                                if value and value != cell_str:
-                                                    results[pattern] = value
-                                                    break
-                
-                # Search in text
-                for pattern in field_patterns:
-                    if pattern in results:
-                        continue
-                    
-                    # Try various regex patterns
-                    regex_patterns = [
-                        rf'{re.escape(pattern)}\s*[:\s]\s*(.+?)(?:\n|$)',
-                        rf'{re.escape(pattern)}.*?([0-9,]+\.?[0-9]*)',
-                    ]
-                    
-                    for regex in regex_patterns:
-                        match = re.search(regex, text, re.IGNORECASE | re.DOTALL)
-                        if match:
-                            value = match.group(1).strip()
-                            if value:
-                                results[pattern] = value
-                                break
-                
-                # If we found all patterns, break early
-                if len(results) == len(field_patterns):
-                    break
-    
-    except Exception as e:
-        print(f"Error extracting field from {os.path.basename(pdf_path)}: {str(e)}")
-    
-    return results
+# How often the field mapping dialog picks up field discovery results
+DISCOVERY_POLL_MS = 100
+
+# Output formats offered in the GUI; other formats are written next to the
+# selected Excel file, with their own extension
+OUTPUT_FORMATS = {
+    "Excel (.xlsx)": "xlsx",
+    "CSV (.csv)": "csv",
+    "SQLite (.db)": "sqlite",
+    "Parquet (folder)": "parquet",
+}
 
-def extract_total_amount(pdf_path):
+def create_file_logger(log_path):
     """
-    Extract the total amount from a PDF file by looking for 'Total Amount' column.
+    Create the logger that keeps a full copy of the progress log.
     
     Args:
-        pdf_path: Full path to the PDF file
+        log_path: Path of the rotating log file
         
     Returns:
-        Total amount as string or 'N/A' if not found
+        logging.Logger instance
     """
-    try:
-        with pdfplumber.open(pdf_path) as pdf:
-            # Try to extract tables from all pages
-            for page in pdf.pages:
-                tables = page.extract_tables()
-                
-                # Check if tables exist
-                if tables:
-                    for table in tables:
-                        if not table:
-                            continue
-                        
-                        # Look for 'Total Amount' in the table
-                        for row_idx, row in enumerate(table):
-                            if not row:
-                                continue
-                            
-                            # Check each cell for 'Total Amount'
-                            for col_idx, cell in enumerate(row):
-                                if cell and 'Total Amount' in str(cell):
-                                    # Try to find the value in the same column
-                                    for data_row in table[row_idx + 1:]:
-                                        if data_row and len(data_row) > col_idx:
-                                            value = data_row[col_idx]
-                                            if value and str(value).strip():
-                                                # Clean and return the value
-                                                cleaned = str(value).replace(',', '').replace('USD', '').strip()
-                                                if re.match(r'^[0-9.]+$', cleaned):
-                                                    return cleaned
-                
-                # Extract text and look for the pattern
-                text = page.extract_text() or ""
-                
-                # Look for "Total Amount" followed by optional due date and USD amount
-                # Pattern: Total Amount ... Due on ... USD 239.40
-                pattern = r'Total Amount.*?USD\s*([0-9,]+\.?[0-9]*)'
-                match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
-                if match:
-                    amount = match.group(1).replace(',', '')
-                    return amount
-                
-                # Alternative: Look for USD followed by amount near Total Amount
-                lines = text.split('\n')
-                for i, line in enumerate(lines):
-                    if 'Total Amount' in line:
-                        # Check next few lines for USD amount
-                        for j in range(i, min(i + 5, len(lines))):
-                            usd_match = re.search(r'USD\s*([0-9,]+\.?[0-9]*)', lines[j])
-                            if usd_match:
-                                amount = usd_match.group(1).replace(',', '')
-                                return amount
-                
-                # Fallback patterns
-                patterns = [
-                    r'Total Amount[:\s]+USD\s*([0-9,]+\.?[0-9]*)',
-                    r'Total Amount[:\s]+([0-9,]+\.?[0-9]*)',
-                ]
-                
-                for pattern in patterns:
-                    match = re.search(pattern, text, re.IGNORECASE)
-                    if match:
-                        amount = match.group(1).replace(',', '')
-                        return amount
-            
-            return 'N/A'
-            
-    except Exception as e:
-        print(f"   ⚠ Error reading {os.path.basename(pdf_path)}: {str(e)}")
-        return 'Error'
-
-def write_to_excel(pdf_data, excel_path):
-    """
-    Write PDF filenames, total amounts, and hyperlinks to an Excel file.
-    Prevents duplicate entries by checking existing data.
+    logger = logging.getLogger("pdf_to_excel")
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
     
-    Args:
-        pdf_data: List of tuples (filename, total_amount, full_path)
-        excel_path: Path where the Excel file will be saved
-    """
-    try:
-        # Check if Excel file already exists
-        existing_files = set()
-        if os.path.exists(excel_path):
-            try:
-                wb = openpyxl.load_workbook(excel_path)
-                ws = wb.active
-                
-                # Collect existing filenames by iterating only through cells with values
-                # This completely ignores empty/deleted rows
-                for row in ws.iter_rows(min_row=2, min_col=1, max_col=1):
-                    cell_value = row[0].value
-                    if cell_value and str(cell_value).strip():
-                        existing_files.add(cell_value)
-                
-            except PermissionError:
-                print(f"\n❌ ERROR: Cannot open '{excel_path}'")
-                print("   The file is currently open in another program.")
-                print("   Please close the file and try again.\n")
-                return False
-        else:
-            wb = Workbook()
-            ws = wb.active
-            ws.title = "PDF Files"
-            # Add headers
-            ws['A1'] = "PDF Filename"
-            ws['B1'] = "Total Amount"
-            ws['C1'] = "Path to Invoice"
-            ws['A1'].font = openpyxl.styles.Font(bold=True)
-            ws['B1'].font = openpyxl.styles.Font(bold=True)
-            ws['C1'].font = openpyxl.styles.Font(bold=True)
-        
-        # Filter out duplicates
-        new_data = [(name, amount, path) for name, amount, path in pdf_data if name not in existing_files]
-        duplicates_count = len(pdf_data) - len(new_data)
-        
-        if duplicates_count > 0:
-            print(f"\n⚠ Skipped {duplicates_count} duplicate file(s)")
-        
-        if not new_data:
-            print("\n⚠ No new files to add (all files already exist in Excel)")
-            return True
-        
-        # Find the next empty row
-        start_row = ws.max_row + 1 if ws.max_row > 1 else 2
-        
-        # Write only new PDF data
-        for idx, (pdf_name, total_amount, pdf_path) in enumerate(new_data, start=start_row):
-            ws[f'A{idx}'] = pdf_name
-            ws[f'B{idx}'] = total_amount
-            # Use relative path from Excel file location
-            relative_path = os.path.relpath(pdf_path, os.path.dirname(excel_path))
-            ws[f'C{idx}'].hyperlink = relative_path
-            ws[f'C{idx}'].value = "Open Invoice"
-            ws[f'C{idx}'].font = openpyxl.styles.Font(color="0563C1", underline="single")
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 40
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 20
-        
-        # Save the workbook
+    if not logger.handlers:
         try:
-            wb.save(excel_path)
-            print(f"\n✓ Successfully wrote {len(new_data)} PDF file(s) to {excel_path}")
-            if duplicates_count > 0:
-                print(f"  ({duplicates_count} duplicate(s) skipped)")
-            return True
-        except PermissionError:
-            print(f"\n❌ ERROR: Cannot save to '{excel_path}'")
-            print("   The file is currently open in another program (Excel, etc.)")
-            print("   Please close the file and try again.\n")
-            
-            # Offer to save with a different name
-            retry = input("Would you like to save with a different filename? (yes/no): ").strip().lower()
-            if retry in ['yes', 'y']:
-                new_path = input("Enter new Excel file path: ").strip()
-                if not new_path.lower().endswith('.xlsx'):
-                    new_path += '.xlsx'
-                return write_to_excel(pdf_data, new_path)
-            return False
-            
-    except Exception as e:
-        print(f"\n❌ Unexpected error: {e}")
-        return False
+            handler = RotatingFileHandler(
+                log_path, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8"
+            )
+        except OSError as e:
+            print(f"Could not open log file: {e}")
+            handler = logging.NullHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        logger.addHandler(handler)
+    
+    return logger
 
 def main():
     """
@@ -404,23 +105,43 @@ def main():
 class FieldMappingDialog(tk.Toplevel):
     """Dialog for selecting and mapping PDF fields to Excel columns"""
     
-    def __init__(self, parent, sample_fields, existing_mapping=None):
+    def __init__(self, parent, sample_fields, existing_mapping=None,
+                 discovery_queue=None, discovery_total=0, cancel_event=None,
+                 engine=DEFAULT_ENGINE):
         super().__init__(parent)
         
         self.title("Field Mapping Configuration")
         self.geometry("900x650")
         self.resizable(True, True)
         
-        self.sample_fields = sample_fields
+        # Fields found so far; more arrive through discovery_queue: first
+        # the list of sample PDFs being scanned (once the folder has been
+        # searched), then (pdf_path, fields) tuples, and None when
+        # discovery ends
+        self.discovery = FieldDiscovery()
+        self.discovery_sample = []
+        if sample_fields:
+            self.discovery.add("sample", sample_fields)
+        self.discovery_queue = discovery_queue
+        self.discovery_total = discovery_total
+        self.cancel_event = cancel_event
+        self._discovery_job = None
+        
         self.field_mapping = existing_mapping if existing_mapping else []
         self.result = None  # Will store the selected field mapping
+        self.engine = engine
+        self.fast_engine = tk.BooleanVar(value=engine == "pdfminer")
         
         # Make dialog modal
         self.transient(parent)
         self.grab_set()
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
         
         self.create_widgets()
         
+        if self.discovery_queue is not None:
+            self._discovery_job = self.after(DISCOVERY_POLL_MS, self.poll_discovery)
+        
         # Center on parent
         self.update_idletasks()
         x = parent.winfo_x() + (parent.winfo_width() - self.winfo_width()) // 2
@@ -448,7 +169,8 @@ class FieldMappingDialog(tk.Toplevel):
         
         instruction_text = (
             "Select which fields to extract from PDFs and map to Excel columns.\n"
-            "Preview shows fields detected from a sample PDF. Add the fields you want to track."
+            "Fields are detected in a sample of the PDFs; the number shows how many PDFs\n"
+            "each field was found in. Add the fields you want to track."
         )
         instruction_label = tk.Label(
             instruction_frame,
@@ -469,7 +191,7 @@ class FieldMappingDialog(tk.Toplevel):
         # Left panel - Available fields
         left_panel = tk.LabelFrame(
             content_frame,
-            text="Available Fields (from sample PDF)",
+            text="Available Fields (from sample PDFs)",
             font=("Arial", 11, "bold"),
             bg="#f0f0f0",
             fg="#2c3e50",
@@ -488,6 +210,32 @@ class FieldMappingDialog(tk.Toplevel):
         search_entry = tk.Entry(search_frame, textvariable=self.search_var, font=("Arial", 9))
         search_entry.pack(side="left", fill="x", expand=True)
         
+        # Discovery progress
+        if self.discovery_queue is not None:
+            discovery_frame = tk.Frame(left_panel, bg="#f0f0f0")
+            discovery_frame.pack(fill="x", pady=(0, 10))
+            
+            self.discovery_label = tk.Label(
+                discovery_frame,
+                text="Searching the folder for PDFs...",
+                font=("Arial", 9),
+                bg="#f0f0f0",
+                fg="#555"
+            )
+            self.discovery_label.pack(side="left")
+            
+            self.stop_btn = tk.Button(
+                discovery_frame,
+                text="Stop Scanning",
+                command=self.stop_discovery,
+                font=("Arial", 9),
+                bg="#95a5a6",
+                fg="white",
+                cursor="hand2",
+                padx=10
+            )
+            self.stop_btn.pack(side="right")
+        
         # Listbox with scrollbar
         list_frame = tk.Frame(left_panel)
         list_frame.pack(fill="both", expand=True)
@@ -506,7 +254,7 @@ class FieldMappingDialog(tk.Toplevel):
         scrollbar.config(command=self.available_listbox.yview)
         
         # Populate available fields
-        self.all_fields = list(self.sample_fields.keys())
+        self.visible_fields = []
         self.populate_available_fields()
         
         # Field value preview
@@ -668,14 +416,83 @@ class FieldMappingDialog(tk.Toplevel):
         )
         save_btn.pack(side="right")
         
+        fast_engine_check = tk.Checkbutton(
+            bottom_frame,
+            text="Fast text-only extraction (skips table detection)",
+            variable=self.fast_engine,
+            font=("Arial", 9),
+            bg="#f0f0f0"
+        )
+        fast_engine_check.pack(side="left")
+        
     def populate_available_fields(self):
-        """Populate the available fields listbox"""
+        """Populate the available fields listbox (most frequent first)"""
+        selection = self.available_listbox.curselection()
+        selected = self.visible_fields[selection[0]] if selection else None
+        scroll = self.available_listbox.yview()[0]
+        
         self.available_listbox.delete(0, tk.END)
         search_term = self.search_var.get().lower()
         
-        for field in self.all_fields:
-            if search_term in field.lower():
-                self.available_listbox.insert(tk.END, field)
+        self.visible_fields = [
+            field for field in self.discovery.ranked_fields() if search_term in field.lower()
+        ]
+        for field in self.visible_fields:
+            self.available_listbox.insert(tk.END, f"{field} ({self.discovery.counts[field]})")
+        
+        # Keep the user's place while results stream in
+        if selected in self.visible_fields:
+            self.available_listbox.selection_set(self.visible_fields.index(selected))
+        self.available_listbox.yview_moveto(scroll)
+    
+    def poll_discovery(self):
+        """Add discovery results that arrived since the last poll"""
+        self._discovery_job = None
+        finished = False
+        changed = False
+        try:
+            while True:
+                item = self.discovery_queue.get_nowait()
+                if item is None:
+                    finished = True
+                    break
+                if isinstance(item, list):
+                    self.discovery_sample = item
+                    self.discovery_total = len(item)
+                    continue
+                self.discovery.add(*item)
+                changed = True
+        except queue.Empty:
+            pass
+        
+        if changed:
+            self.populate_available_fields()
+        
+        scanned = len(self.discovery.files)
+        if finished:
+            if self.discovery_total:
+                text = f"Found {len(self.discovery.counts)} field(s) in {scanned} PDF(s)"
+            else:
+                text = "No PDF files found in the selected folder"
+            self.discovery_label.config(text=text)
+            self.stop_btn.pack_forget()
+        elif self.discovery_total is None:
+            self._discovery_job = self.after(DISCOVERY_POLL_MS, self.poll_discovery)
+        else:
+            self.discovery_label.config(text=f"Scanning PDFs: {scanned} of {self.discovery_total}...")
+            self._discovery_job = self.after(DISCOVERY_POLL_MS, self.poll_discovery)
+    
+    def stop_discovery(self):
+        """Stop scanning further PDFs (fields found so far are kept)"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        if self.discovery_queue is not None and self._discovery_job is not None:
+            self.after_cancel(self._discovery_job)
+            self._discovery_job = None
+            self.discovery_label.config(
+                text=f"Stopped: {len(self.discovery.counts)} field(s) in {len(self.discovery.files)} PDF(s)"
+            )
+            self.stop_btn.pack_forget()
     
     def filter_fields(self, *args):
         """Filter available fields based on search"""
@@ -685,15 +502,18 @@ class FieldMappingDialog(tk.Toplevel):
         """Show preview of selected field value"""
         selection = self.available_listbox.curselection()
         if selection:
-            field_name = self.available_listbox.get(selection[0])
-            value = self.sample_fields.get(field_name, "N/A")
-            self.preview_label.config(text=f"{value}")
+            field_name = self.visible_fields[selection[0]]
+            value = self.discovery.samples.get(field_name, "N/A")
+            count = self.discovery.counts.get(field_name, 0)
+            self.preview_label.config(
+                text=f"{value}\n\nFound in {count} of {len(self.discovery.files)} PDF(s)"
+            )
     
     def add_field(self, event=None):
         """Add selected field to mapping"""
         selection = self.available_listbox.curselection()
         if selection:
-            field_name = self.available_listbox.get(selection[0])
+            field_name = self.visible_fields[selection[0]]
             if field_name not in self.field_mapping:
                 self.field_mapping.append(field_name)
                 self.selected_listbox.insert(tk.END, field_name)
@@ -749,11 +569,14 @@ class FieldMappingDialog(tk.Toplevel):
             messagebox.showwarning("Warning", "Please select at least one field!")
             return
         
+        self.stop_discovery()
         self.result = self.field_mapping
+        self.engine = "pdfminer" if self.fast_engine.get() else DEFAULT_ENGINE
         self.destroy()
     
     def cancel(self):
         """Cancel and close dialog"""
+        self.stop_discovery()
         self.result = None
         self.destroy()
     
@@ -774,11 +597,30 @@ class PDFtoExcelApp(tk.Tk):
         
         # Variables
         self.folder_path = tk.StringVar()
+        self.include_subfolders = tk.BooleanVar(value=False)  # Walk subfolders too
         self.excel_path = tk.StringVar()
         self.sheet_name = tk.StringVar()
         self.available_sheets = []
         self.field_mapping = []  # List of field names to extract
-        self.mapping_file = "field_mapping.json"  # File to save mapping
+        self.field_templates = {}  # Learned value regions of the fields
+        self.extraction_engine = DEFAULT_ENGINE  # Engine selected for the mapping
+        self.field_methods = {}  # How each field was found (table/text/multiline)
+        self.learning_fields = False  # A new mapping's regions are being learned
+        self.mapping_file = MAPPING_FILENAME  # File to save mapping
+        self.worker_count = tk.IntVar(value=DEFAULT_WORKERS)  # Extraction processes
+        self.bypass_cache = tk.BooleanVar(value=False)  # Re-extract every PDF
+        self.resume_run = tk.BooleanVar(value=False)  # Continue from the journal
+        # Per-PDF limits (0 = no limit); see FileLimits
+        self.max_seconds = tk.IntVar(value=DEFAULT_FILE_LIMITS.seconds)
+        self.max_pages = tk.IntVar(value=DEFAULT_FILE_LIMITS.pages)
+        self.max_memory = tk.IntVar(value=DEFAULT_FILE_LIMITS.memory // (1024 * 1024))  # MB
+        self.output_format = tk.StringVar(value="Excel (.xlsx)")
+        
+        # Progress messages from worker threads, drained by the Tk main loop
+        self.log_queue = queue.Queue()
+        self.file_logger = create_file_logger(
+            os.path.join(os.path.dirname(os.path.abspath(self.mapping_file)), LOG_FILENAME)
+        )
         
         # Load saved mapping if exists
         self.load_field_mapping()
@@ -786,6 +628,8 @@ class PDFtoExcelApp(tk.Tk):
         # Create GUI elements
         self.create_widgets()
         
+        self.after(LOG_POLL_MS, self.drain_log_queue)
+        
     def create_widgets(self):
         # Header
         header_frame = tk.Frame(self, bg="#2c3e50", height=80)
@@ -838,6 +682,16 @@ class PDFtoExcelApp(tk.Tk):
         )
         folder_btn.pack(side="left")
         
+        subfolders_check = tk.Checkbutton(
+            folder_frame,
+            text="Include subfolders",
+            variable=self.include_subfolders,
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        )
+        subfolders_check.pack(side="left", padx=(10, 0))
+        
         # Field Mapping section
         mapping_frame = tk.LabelFrame(
             content_frame,
@@ -863,7 +717,7 @@ class PDFtoExcelApp(tk.Tk):
         )
         self.mapping_label.pack(side="left", padx=(0, 10))
         
-        mapping_btn = tk.Button(
+        self.mapping_btn = tk.Button(
             mapping_info_frame,
             text="Configure Fields",
             command=self.configure_field_mapping,
@@ -874,7 +728,7 @@ class PDFtoExcelApp(tk.Tk):
             padx=15,
             pady=5
         )
-        mapping_btn.pack(side="left")
+        self.mapping_btn.pack(side="left")
         
         # Excel file selection
         excel_frame = tk.LabelFrame(
@@ -909,6 +763,16 @@ class PDFtoExcelApp(tk.Tk):
         )
         excel_btn.pack(side="left")
         
+        format_combo = ttk.Combobox(
+            excel_frame,
+            textvariable=self.output_format,
+            values=list(OUTPUT_FORMATS),
+            font=("Arial", 10),
+            width=14,
+            state="readonly"
+        )
+        format_combo.pack(side="left", padx=(10, 0))
+        
         # Sheet selection
         sheet_frame = tk.LabelFrame(
             content_frame,
@@ -993,9 +857,85 @@ class PDFtoExcelApp(tk.Tk):
             length=300
         )
         
+        # Per-PDF limits: files over a limit are recorded as "Timeout" or
+        # "Too large" instead of stalling the conversion
+        limits_frame = tk.Frame(content_frame, bg="#f0f0f0")
+        limits_frame.pack(pady=(0, 10))
+        
+        tk.Label(
+            limits_frame,
+            text="Limits per PDF (0 = none):",
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        ).pack(side="left", padx=(0, 5))
+        
+        for variable, unit, maximum in (
+            (self.max_seconds, "seconds", 86400),
+            (self.max_pages, "pages", 100000),
+            (self.max_memory, "MB", 1024 * 1024),
+        ):
+            tk.Spinbox(
+                limits_frame,
+                from_=0,
+                to=maximum,
+                textvariable=variable,
+                font=("Arial", 10),
+                width=6
+            ).pack(side="left")
+            tk.Label(
+                limits_frame,
+                text=unit,
+                font=("Arial", 10),
+                bg="#f0f0f0",
+                fg="#2c3e50"
+            ).pack(side="left", padx=(2, 10))
+        
+        # Conversion options and convert button
+        action_frame = tk.Frame(content_frame, bg="#f0f0f0")
+        action_frame.pack()
+        
+        tk.Label(
+            action_frame,
+            text="Worker processes:",
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        ).pack(side="left", padx=(0, 5))
+        
+        workers_spin = tk.Spinbox(
+            action_frame,
+            from_=1,
+            to=max(DEFAULT_WORKERS, 32),
+            textvariable=self.worker_count,
+            font=("Arial", 10),
+            width=4
+        )
+        workers_spin.pack(side="left", padx=(0, 15))
+        
+        cache_check = tk.Checkbutton(
+            action_frame,
+            text="Bypass cache",
+            variable=self.bypass_cache,
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        )
+        cache_check.pack(side="left", padx=(0, 15))
+        
+        resume_check = tk.Checkbutton(
+            action_frame,
+            text="Resume previous run",
+            variable=self.resume_run,
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        )
+        resume_check.pack(side="left", padx=(0, 15))
+        
         # Convert button
         self.convert_btn = tk.Button(
-            content_frame,
+            action_frame,
             text="Convert PDFs to Excel",
             command=self.start_conversion,
             font=("Arial", 14, "bold"),
@@ -1005,7 +945,7 @@ class PDFtoExcelApp(tk.Tk):
             padx=30,
             pady=10
         )
-        self.convert_btn.pack()
+        self.convert_btn.pack(side="left")
         
     def browse_folder(self):
         folder = filedialog.askdirectory(title="Select Folder with PDF Files")
@@ -1032,6 +972,7 @@ class PDFtoExcelApp(tk.Tk):
         
         if os.path.exists(excel_path):
             try:
+                import openpyxl
                 wb = openpyxl.load_workbook(excel_path)
                 self.available_sheets.extend(wb.sheetnames)
                 wb.close()
@@ -1070,6 +1011,7 @@ class PDFtoExcelApp(tk.Tk):
             return
         
         try:
+            import openpyxl
             wb = openpyxl.load_workbook(excel_path)
             if sheet_name not in wb.sheetnames:
                 messagebox.showerror("Error", f"Sheet '{sheet_name}' not found!")
@@ -1094,12 +1036,33 @@ class PDFtoExcelApp(tk.Tk):
             messagebox.showerror("Error", f"An error occurred:\n{str(e)}")
             
     def log_message(self, message):
-
-        self.progress_text.config(state="normal")
-        self.progress_text.insert("end", message + "\n")
-        self.progress_text.see("end")
-        self.progress_text.config(state="disabled")
-        self.update_idletasks()
+        """Queue a progress message (safe to call from any thread)"""
+        self.log_queue.put(message)
+        self.file_logger.info(message)
+    
+    def drain_log_queue(self):
+        """Insert queued progress messages into the widget, a batch at a time"""
+        lines = []
+        try:
+            while len(lines) < LOG_BATCH_LINES:
+                lines.append(self.log_queue.get_nowait())
+        except queue.Empty:
+            pass
+        
+        if lines:
+            self.progress_text.config(state="normal")
+            self.progress_text.insert("end", "\n".join(lines) + "\n")
+            
+            # Keep only the most recent lines in the widget
+            line_count = int(self.progress_text.index("end-1c").split(".")[0])
+            if line_count > MAX_LOG_LINES:
+                self.progress_text.delete("1.0", f"{line_count - MAX_LOG_LINES + 1}.0")
+            
+            self.progress_text.see("end")
+            self.progress_text.config(state="disabled")
+        
+        # Come back sooner if there is still a backlog
+        self.after(1 if len(lines) == LOG_BATCH_LINES else LOG_POLL_MS, self.drain_log_queue)
         
     def start_conversion(self):
         folder = self.folder_path.get()
@@ -1109,14 +1072,36 @@ class PDFtoExcelApp(tk.Tk):
         if not folder:
             messagebox.showerror("Error", "Please select a PDF folder!")
             return
+        
+        if self.learning_fields:
+            messagebox.showwarning("Warning", "Please wait until the field mapping is saved.")
+            return
             
         if not excel:
             messagebox.showerror("Error", "Please select an Excel file!")
             return
             
-        if not sheet or sheet == "Select a sheet or create new...":
+        output_format = OUTPUT_FORMATS.get(self.output_format.get(), "xlsx")
+        if output_format == "xlsx" and (not sheet or sheet == "Select a sheet or create new..."):
             messagebox.showerror("Error", "Please select a sheet!")
             return
+        
+        try:
+            workers = max(1, int(self.worker_count.get()))
+        except (tk.TclError, ValueError):
+            messagebox.showerror("Error", "Worker processes must be a whole number!")
+            return
+        
+        try:
+            limits = FileLimits(
+                int(self.max_seconds.get()), int(self.max_pages.get()),
+                int(self.max_memory.get()) * 1024 * 1024
+            )
+        except (tk.TclError, ValueError):
+            limits = None
+        if limits is None or min(limits) < 0:
+            messagebox.showerror("Error", "Limits per PDF must be whole numbers (0 = no limit)!")
+            return
             
         # Clear previous progress
         self.progress_text.config(state="normal")
@@ -1129,26 +1114,45 @@ class PDFtoExcelApp(tk.Tk):
         self.progress_bar.start()
         
         # Run conversion in a separate thread
-        thread = threading.Thread(target=self.run_conversion, args=(folder, excel, sheet))
+        thread = threading.Thread(
+            target=self.run_conversion,
+            args=(folder, excel, sheet, workers, not self.bypass_cache.get(), self.resume_run.get(),
+                  output_format, self.include_subfolders.get(), limits)
+        )
         thread.daemon = True
         thread.start()
         
-    def run_conversion(self, folder_path, excel_path, sheet_name):
+    def run_conversion(self, folder_path, excel_path, sheet_name, workers=1, use_cache=True,
+                       resume=False, output_format="xlsx", recursive=False,
+                       limits=DEFAULT_FILE_LIMITS):
+        cache = None
+        plans = None
+        journal = None
+        sink = None
+        dedup = None
+        excel_writer = None
+        success = False
         try:
-            # Ensure Excel file has .xlsx extension
-            if not excel_path.lower().endswith('.xlsx'):
-                excel_path += '.xlsx'
+            if output_format == "xlsx":
+                # Ensure Excel file has .xlsx extension
+                if not excel_path.lower().endswith('.xlsx'):
+                    excel_path += '.xlsx'
+            else:
+                # Other formats are written next to the selected Excel file
+                excel_path = os.path.splitext(excel_path)[0] + SINK_EXTENSIONS[output_format]
             
-            # Get PDF files
-            self.log_message(f"Searching for PDF files in: {folder_path}")
-            pdf_files = get_pdf_files(folder_path)
+            # Get PDF files (extraction starts while the folder is still being searched)
+            self.log_message(f"Searching for PDF files in: {folder_path}"
+                             + (" and its subfolders" if recursive else ""))
+            pdf_files = iter_pdf_files(folder_path, recursive)
+            first_pdf = next(pdf_files, None)
             
-            if not pdf_files:
+            if first_pdf is None:
                 self.after(0, lambda: messagebox.showwarning("Warning", "No PDF files found!"))
-                self.finish_conversion()
                 return
             
-            self.log_message(f"Found {len(pdf_files)} PDF file(s)\n")
+            pdf_files = chain([first_pdf], pdf_files)
+            self.log_message("PDF files are extracted as they are found\n")
             
             # Check if field mapping is configured
             if not self.field_mapping:
@@ -1159,58 +1163,143 @@ class PDFtoExcelApp(tk.Tk):
                 use_default = False
             
             self.log_message("Extracting data from PDFs...")
+            if workers > 1:
+                self.log_message(f"Using up to {workers} worker process(es)")
             self.log_message("-" * 50)
             
-            # Extract data from each PDF
-            pdf_data = []
-            for i, pdf_path in enumerate(pdf_files, 1):
-                filename = os.path.basename(pdf_path)
-                self.log_message(f"{i}. Processing: {filename}...")
-                
-                if use_default:
-                    # Use old method for backward compatibility
-                    total_amount = extract_total_amount(pdf_path)
-                    pdf_data.append((filename, [total_amount], pdf_path))
-                    self.log_message(f"   Total: {total_amount}")
+            # Open the result cache (connection must live on this thread)
+            if use_cache:
+                try:
+                    cache = ExtractionCache(
+                        default_cache_path(self.mapping_file), self.field_mapping,
+                        templates=self.field_templates, engine=self.extraction_engine,
+                        methods=self.field_methods
+                    )
+                except Exception as e:
+                    self.log_message(f"⚠ Extraction cache unavailable: {e}")
+            else:
+                self.log_message("Cache bypassed, all PDFs will be re-extracted")
+            
+            # Extraction plans of known PDF layouts
+            if not use_default:
+                try:
+                    plans = LayoutPlanStore(
+                        default_plans_path(self.mapping_file), self.field_mapping,
+                        self.extraction_engine
+                    )
+                except Exception as e:
+                    self.log_message(f"⚠ Layout plans unavailable: {e}")
+            
+            # Journal of extracted results, so a failed run can be resumed
+            try:
+                journal = ConversionJournal(
+                    default_journal_path(excel_path), self.field_mapping, resume,
+                    self.extraction_engine
+                )
+                if journal.resumed:
+                    self.log_message(f"Resuming: {journal.resumed} PDF(s) already extracted")
+            except Exception as e:
+                self.log_message(f"⚠ Journal unavailable, progress will not be resumable: {e}")
+            
+            if output_format != "xlsx":
+                if sheet_name in ("", "[Create New Sheet]", "Select a sheet or create new..."):
+                    sheet_name = DEFAULT_TABLE
+                headers = ["PDF Filename"] + (self.field_mapping or ["Total Amount"]) + ["Path to Invoice"]
+                sink = open_sink(output_format, excel_path, headers, sheet_name)
+                if journal is not None and not sink.upserts:
+                    # Rows the previous run appended must not be appended again
+                    if journal.written:
+                        self.log_message(f"{len(journal.written)} of them already written to {excel_path}")
+                    write_sink = journal.marking_written(sink.write)
                 else:
-                    # Use field mapping
-                    field_values = extract_field_from_pdf(pdf_path, self.field_mapping)
+                    write_sink = sink.write
+            else:
+                # Batches of rows are all written to the same sheet
+                sheet_name = resolve_sheet_name(excel_path, sheet_name)
+                # Files with the same content as an exported one are skipped
+                dedup = DuplicateFilter(exported_content_hashes(excel_path, sheet_name))
+                excel_writer = ExcelBatchWriter(
+                    excel_path, sheet_name, None if use_default else self.field_mapping,
+                    self.log_message, dedup.hashes
+                )
+            
+            def write_batch(batch):
+                if sink is not None:
+                    self.log_message(f"\nWriting {len(batch)} row(s) to {excel_path}")
+                    return write_sink(batch)
+                
+                self.log_message(f"\nWriting {len(batch)} row(s) to Excel file: {excel_path}")
+                self.log_message(f"Sheet: {sheet_name}")
+                return excel_writer.write(batch)
+            
+            def logged(records):
+                for i, (filename, values, pdf_path) in enumerate(records, 1):
+                    self.log_message(f"{i}. Processed: {filename}")
                     
-                    # Create ordered list of values matching field mapping
-                    values = []
-                    for field in self.field_mapping:
-                        value = field_values.get(field, 'N/A')
-                        values.append(value)
-                        self.log_message(f"   {field}: {value}")
+                    if use_default:
+                        self.log_message(f"   Total: {values[0]}")
+                    else:
+                        for field, value in zip(self.field_mapping, values):
+                            self.log_message(f"   {field}: {value}")
                     
-                    pdf_data.append((filename, values, pdf_path))
+                    yield (filename, values, pdf_path)
             
-            self.log_message("-" * 50)
-            self.log_message(f"\nWriting to Excel file: {excel_path}")
-            self.log_message(f"Sheet: {sheet_name}")
+            # Folder search, extraction and writing run as concurrent stages:
+            # results arrive in file order and a writer thread saves them
+            # in batches while the next files are extracted
+            tiers = Counter()
+            records = extract_pdf_records(
+                pdf_files, self.field_mapping, workers, cache, self.field_templates, plans,
+                journal=journal, engine=self.extraction_engine, methods=self.field_methods,
+                dedup=dedup, tiers=tiers, limits=limits
+            )
+            if sink is not None and journal is not None and not sink.upserts:
+                records = journal.skip_written(records)
+            count, success = write_records_in_batches(logged(records), write_batch)
+            if success and excel_writer is not None:
+                # A new workbook is saved once all its rows are streamed
+                success = excel_writer.close()
             
-            # Write to Excel
-            if use_default:
-                # Use old write method
-                old_format_data = [(name, vals[0], path) for name, vals, path in pdf_data]
-                success = write_to_excel_gui(old_format_data, excel_path, sheet_name, self.log_message)
-            else:
-                # Use new write method with field mapping
-                success = write_to_excel_with_mapping(
-                    pdf_data, excel_path, sheet_name, self.field_mapping, self.log_message
+            if dedup is not None and dedup.skipped:
+                self.log_message(
+                    f"\n{len(dedup.skipped)} duplicate PDF(s) skipped (same content as an exported file)"
                 )
             
+            if cache is not None and cache.hits:
+                self.log_message(f"\n{cache.hits} of {count} PDF(s) served from cache")
+            if plans is not None and plans.learned:
+                self.log_message(f"Learned {plans.learned} new PDF layout(s)")
+            if tiers:
+                self.log_message(f"Fields by extraction tier: {format_tier_counts(tiers)}")
+            self.log_message("-" * 50)
+            
             if success:
                 self.log_message("\n✓ Operation completed successfully!")
-                self.after(0, lambda: messagebox.showinfo("Success", f"Successfully processed {len(pdf_data)} PDF files!\n\nExcel file saved at:\n{excel_path}\nSheet: {sheet_name}"))
+                self.after(0, lambda: messagebox.showinfo("Success", f"Successfully processed {count} PDF files!\n\nExcel file saved at:\n{excel_path}\nSheet: {sheet_name}"))
             else:
                 self.log_message("\n⚠ Operation was not completed.")
+                if journal is not None:
+                    self.log_message("Extracted results were kept; tick \"Resume previous run\" to continue without extracting them again.")
                 
         except Exception as e:
-            self.log_message(f"\n❌ Error: {str(e)}")
-            self.after(0, lambda: messagebox.showerror("Error", f"An error occurred:\n{str(e)}"))
+            error = str(e)
+            self.log_message(f"\n❌ Error: {error}")
+            self.after(0, lambda: messagebox.showerror("Error", f"An error occurred:\n{error}"))
         finally:
-            self.finish_conversion()
+            if cache is not None:
+                cache.close()
+            if plans is not None:
+                plans.close()
+            if sink is not None:
+                sink.close()
+            if journal is not None:
+                # Keep the journal unless every row reached the workbook
+                if success:
+                    journal.discard()
+                else:
+                    journal.close()
+            # Widgets may only be touched from the Tk main loop
+            self.after(0, self.finish_conversion)
             
     def finish_conversion(self):
         self.progress_bar.stop()
@@ -1221,18 +1310,24 @@ class PDFtoExcelApp(tk.Tk):
         """Load saved field mapping from JSON file"""
         try:
             if os.path.exists(self.mapping_file):
-                with open(self.mapping_file, 'r') as f:
-                    data = json.load(f)
-                    self.field_mapping = data.get('fields', [])
+                self.field_mapping = read_mapping_file(self.mapping_file)
+                self.field_templates = read_field_templates(self.mapping_file)
+                self.extraction_engine = read_extraction_engine(self.mapping_file)
+                self.field_methods = read_field_methods(self.mapping_file)
         except Exception as e:
             print(f"Could not load field mapping: {e}")
             self.field_mapping = []
+            self.field_templates = {}
+            self.extraction_engine = DEFAULT_ENGINE
+            self.field_methods = {}
     
     def save_field_mapping(self):
         """Save field mapping to JSON file"""
         try:
-            with open(self.mapping_file, 'w') as f:
-                json.dump({'fields': self.field_mapping}, f, indent=2)
+            write_mapping_file(
+                self.mapping_file, self.field_mapping, self.field_templates, self.extraction_engine,
+                self.field_methods
+            )
         except Exception as e:
             print(f"Could not save field mapping: {e}")
     
@@ -1242,6 +1337,33 @@ class PDFtoExcelApp(tk.Tk):
             return "⚠ No fields configured (will use default: Total Amount)"
         return f"✓ {len(self.field_mapping)} field(s) configured: {', '.join(self.field_mapping[:3])}{'...' if len(self.field_mapping) > 3 else ''}"
     
+    def run_field_discovery(self, folder, recursive, workers, results, cancel_event):
+        """
+        Search the folder and discover fields in a sample of its PDFs
+        (worker thread); results are queued for the mapping dialog.
+        """
+        try:
+            pdf_files = []
+            for pdf_path in iter_pdf_files(folder, recursive):
+                if cancel_event.is_set():
+                    return
+                pdf_files.append(pdf_path)
+            pdf_files.sort()
+            
+            sample = sample_pdf_files(pdf_files)
+            results.put(sample)
+            if not sample:
+                self.log_message("No PDF files found in the selected folder")
+                return
+            self.log_message(f"Discovering fields in {len(sample)} of {len(pdf_files)} PDF(s)...")
+            
+            for pdf_path, fields in discover_fields(sample, workers, cancel_event):
+                results.put((pdf_path, fields))
+        except Exception as e:
+            self.log_message(f"⚠ Field discovery failed: {e}")
+        finally:
+            results.put(None)
+    
     def configure_field_mapping(self):
         """Open field mapping configuration dialog"""
         folder = self.folder_path.get()
@@ -1250,271 +1372,88 @@ class PDFtoExcelApp(tk.Tk):
             messagebox.showwarning("Warning", "Please select a PDF folder first!")
             return
         
-        # Get sample PDF
-        pdf_files = get_pdf_files(folder)
-        if not pdf_files:
-            messagebox.showerror("Error", "No PDF files found in the selected folder!")
-            return
-        
-        # Extract fields from first PDF as sample
-        sample_pdf = pdf_files[0]
-        self.log_message(f"Analyzing sample PDF: {os.path.basename(sample_pdf)}...")
-        
-        sample_fields = extract_all_fields_from_pdf(sample_pdf)
-        
-        if not sample_fields:
-            messagebox.showwarning("Warning", "Could not extract fields from sample PDF!")
-            return
-        
-        self.log_message(f"Found {len(sample_fields)} fields in sample PDF")
+        try:
+            workers = max(1, int(self.worker_count.get()))
+        except (tk.TclError, ValueError):
+            workers = 1
+        
+        # Search the folder and discover fields in a sample of its PDFs in
+        # the background; results stream into the dialog while it is open
+        results = queue.Queue()
+        cancel_event = threading.Event()
+        thread = threading.Thread(
+            target=self.run_field_discovery,
+            args=(folder, self.include_subfolders.get(), workers, results, cancel_event),
+            daemon=True
+        )
+        thread.start()
         
-        # Open mapping dialog
-        dialog = FieldMappingDialog(self, sample_fields, self.field_mapping)
+        dialog = FieldMappingDialog(
+            self, {}, self.field_mapping, results, None, cancel_event, self.extraction_engine
+        )
         self.wait_window(dialog)
+        cancel_event.set()
+        
+        self.log_message(
+            f"Found {len(dialog.discovery.counts)} fields in {len(dialog.discovery.files)} PDF(s)"
+        )
         
         # Get result
         result = dialog.get_result()
-        if result is not None:
-            self.field_mapping = result
-            self.save_field_mapping()
-            self.mapping_label.config(text=self.get_mapping_status_text())
-            self.log_message(f"\n✓ Field mapping saved: {len(self.field_mapping)} field(s)")
-            messagebox.showinfo("Success", f"Field mapping configured with {len(self.field_mapping)} field(s)!")
-
-def write_to_excel_gui(pdf_data, excel_path, sheet_name, log_func):
-    """
-    Write PDF filenames, total amounts, and hyperlinks to an Excel file (GUI version).
-    """
-    try:
-        existing_files = set()
-        create_new_sheet = (sheet_name == "[Create New Sheet]")
-        
-        if os.path.exists(excel_path):
-            try:
-                wb = openpyxl.load_workbook(excel_path)
-                
-                if create_new_sheet:
-                    # Generate new sheet name
-                    base_name = "PDF Files"
-                    counter = 1
-                    while base_name in wb.sheetnames:
-                        base_name = f"PDF Files {counter}"
-                        counter += 1
-                    ws = wb.create_sheet(base_name)
-                    sheet_name = base_name
-                    log_func(f"Creating new sheet: {sheet_name}")
-                else:
-                    # Use existing sheet
-                    if sheet_name in wb.sheetnames:
-                        ws = wb[sheet_name]
-                        # Collect existing filenames by iterating only through cells with values
-                        # This completely ignores empty/deleted rows
-                        for row in ws.iter_rows(min_row=2, min_col=1, max_col=1):
-                            cell_value = row[0].value
-                            if cell_value and str(cell_value).strip():
-                                existing_files.add(cell_value)
-                        
-                        # Debug: Log what we found
-                        if existing_files:
-                            log_func(f"Found {len(existing_files)} existing file(s) in sheet")
-                        else:
-                            log_func("Sheet is empty, will add all files")
-                    else:
-                        ws = wb.create_sheet(sheet_name)
-                
-            except PermissionError:
-                log_func(f"\n❌ ERROR: Cannot open '{excel_path}'")
-                log_func("   The file is currently open in another program.")
-                log_func("   Please close the file and try again.")
-                return False
-        else:
-            wb = Workbook()
-            ws = wb.active
-            if create_new_sheet or not sheet_name:
-                ws.title = "PDF Files"
-                sheet_name = "PDF Files"
-            else:
-                ws.title = sheet_name
-        
-        # Add headers if new sheet or empty
-        if ws.max_row == 1 or ws['A1'].value != "PDF Filename":
-            ws['A1'] = "PDF Filename"
-            ws['B1'] = "Total Amount"
-            ws['C1'] = "Path to Invoice"
-            ws['A1'].font = openpyxl.styles.Font(bold=True)
-            ws['B1'].font = openpyxl.styles.Font(bold=True)
-            ws['C1'].font = openpyxl.styles.Font(bold=True)
-        
-        new_data = [(name, amount, path) for name, amount, path in pdf_data if name not in existing_files]
-        duplicates_count = len(pdf_data) - len(new_data)
-        
-        if duplicates_count > 0:
-            log_func(f"\n⚠ Skipped {duplicates_count} duplicate file(s)")
-        
-        if not new_data:
-            log_func("\n⚠ No new files to add (all files already exist in Excel)")
-            return True
-        
-        start_row = ws.max_row + 1 if ws.max_row > 1 else 2
-        
-        for idx, (pdf_name, total_amount, pdf_path) in enumerate(new_data, start=start_row):
-            ws[f'A{idx}'] = pdf_name
-            ws[f'B{idx}'] = total_amount
-            # Use relative path from Excel file location
-            relative_path = os.path.relpath(pdf_path, os.path.dirname(excel_path))
-            ws[f'C{idx}'].hyperlink = relative_path
-            ws[f'C{idx}'].value = "Open Invoice"
-            ws[f'C{idx}'].font = openpyxl.styles.Font(color="0563C1", underline="single")
-        
-        ws.column_dimensions['A'].width = 40
-        ws.column_dimensions['B'].width = 20
-        ws.column_dimensions['C'].width = 20
+        if result is None:
+            return
         
-        try:
-            wb.save(excel_path)
-            log_func(f"\n✓ Successfully wrote {len(new_data)} PDF file(s) to Excel")
-            if duplicates_count > 0:
-                log_func(f"  ({duplicates_count} duplicate(s) skipped)")
-            return True
-        except PermissionError:
-            log_func(f"\n❌ ERROR: Cannot save to '{excel_path}'")
-            log_func("   The file is currently open in another program.")
-            return False
-            
-    except Exception as e:
-        log_func(f"\n❌ Unexpected error: {e}")
-        return False
-
-def write_to_excel_with_mapping(pdf_data, excel_path, sheet_name, field_mapping, log_func):
-    """
-    Write PDF data to Excel using custom field mapping.
+        # Learn where the selected fields sit in the sample PDF that has most
+        # of them, in the background (parsing a long PDF takes a while)
+        sample_pdf = dialog.discovery.best_sample(result) or next(iter(dialog.discovery_sample), None)
+        self.learning_fields = True
+        self.mapping_btn.config(state="disabled")
+        self.mapping_label.config(text="Learning field regions...")
+        thread = threading.Thread(
+            target=self.learn_field_mapping,
+            args=(sample_pdf, result, dialog.engine),
+            daemon=True
+        )
+        thread.start()
     
-    Args:
-        pdf_data: List of tuples (filename, [field_values], full_path)
-        excel_path: Path where the Excel file will be saved
-        sheet_name: Name of the sheet to write to
-        field_mapping: List of field names (column headers)
-        log_func: Function to log messages
-    """
-    try:
-        existing_files = set()
-        create_new_sheet = (sheet_name == "[Create New Sheet]")
-        
-        if os.path.exists(excel_path):
-            try:
-                wb = openpyxl.load_workbook(excel_path)
+    def learn_field_mapping(self, sample_pdf, field_mapping, engine):
+        """Learn the regions and methods of the mapped fields (worker thread)"""
+        templates = {}
+        methods = {}
+        try:
+            if sample_pdf is not None:
+                templates = learn_field_templates(sample_pdf, field_mapping, engine)
+                self.log_message(f"Learned field regions: {len(templates)} of {len(field_mapping)} field(s)")
                 
-                if create_new_sheet:
-                    # Generate new sheet name
-                    base_name = "PDF Files"
-                    counter = 1
-                    while base_name in wb.sheetnames:
-                        base_name = f"PDF Files {counter}"
-                        counter += 1
-                    ws = wb.create_sheet(base_name)
-                    sheet_name = base_name
-                    log_func(f"Creating new sheet: {sheet_name}")
+                # Record how each field is found, so tables are only searched when needed
+                methods = learn_field_methods(sample_pdf, field_mapping, engine)
+                table_fields = [field for field in field_mapping
+                                if methods.get(field, 'table') == 'table']
+                if table_fields:
+                    self.log_message(f"Table detection needed for: {', '.join(table_fields)}")
                 else:
-                    # Use existing sheet
-                    if sheet_name in wb.sheetnames:
-                        ws = wb[sheet_name]
-                        # Collect existing filenames
-                        for row in ws.iter_rows(min_row=2, min_col=1, max_col=1):
-                            cell_value = row[0].value
-                            if cell_value and str(cell_value).strip():
-                                existing_files.add(cell_value)
-                        
-                        if existing_files:
-                            log_func(f"Found {len(existing_files)} existing file(s) in sheet")
-                        else:
-                            log_func("Sheet is empty, will add all files")
-                    else:
-                        ws = wb.create_sheet(sheet_name)
-                
-            except PermissionError:
-                log_func(f"\n❌ ERROR: Cannot open '{excel_path}'")
-                log_func("   The file is currently open in another program.")
-                log_func("   Please close the file and try again.")
-                return False
-        else:
-            wb = Workbook()
-            ws = wb.active
-            if create_new_sheet or not sheet_name:
-                ws.title = "PDF Files"
-                sheet_name = "PDF Files"
-            else:
-                ws.title = sheet_name
-        
-        # Add headers if new sheet or empty
-        expected_cols = 2 + len(field_mapping)  # PDF Filename + fields + Path
-        if ws.max_row == 1 or ws['A1'].value != "PDF Filename":
-            # Set up headers
-            ws['A1'] = "PDF Filename"
-            ws['A1'].font = openpyxl.styles.Font(bold=True)
-            
-            # Add field headers
-            for idx, field_name in enumerate(field_mapping, start=2):
-                col_letter = openpyxl.utils.get_column_letter(idx)
-                ws[f'{col_letter}1'] = field_name
-                ws[f'{col_letter}1'].font = openpyxl.styles.Font(bold=True)
-            
-            # Add path column
-            path_col = openpyxl.utils.get_column_letter(len(field_mapping) + 2)
-            ws[f'{path_col}1'] = "Path to Invoice"
-            ws[f'{path_col}1'].font = openpyxl.styles.Font(bold=True)
-        
-        # Filter duplicates
-        new_data = [(name, values, path) for name, values, path in pdf_data if name not in existing_files]
-        duplicates_count = len(pdf_data) - len(new_data)
-        
-        if duplicates_count > 0:
-            log_func(f"\n⚠ Skipped {duplicates_count} duplicate file(s)")
-        
-        if not new_data:
-            log_func("\n⚠ No new files to add (all files already exist in Excel)")
-            return True
-        
-        start_row = ws.max_row + 1 if ws.max_row > 1 else 2
-        
-        # Write data
-        for row_idx, (pdf_name, field_values, pdf_path) in enumerate(new_data, start=start_row):
-            # PDF filename
-            ws[f'A{row_idx}'] = pdf_name
-            
-            # Field values
-            for col_idx, value in enumerate(field_values, start=2):
-                col_letter = openpyxl.utils.get_column_letter(col_idx)
-                ws[f'{col_letter}{row_idx}'] = value
-            
-            # Path hyperlink
-            path_col = openpyxl.utils.get_column_letter(len(field_mapping) + 2)
-            relative_path = os.path.relpath(pdf_path, os.path.dirname(excel_path))
-            ws[f'{path_col}{row_idx}'].hyperlink = relative_path
-            ws[f'{path_col}{row_idx}'].value = "Open Invoice"
-            ws[f'{path_col}{row_idx}'].font = openpyxl.styles.Font(color="0563C1", underline="single")
-        
-        # Adjust column widths
-        ws.column_dimensions['A'].width = 40
-        for col_idx in range(2, len(field_mapping) + 2):
-            col_letter = openpyxl.utils.get_column_letter(col_idx)
-            ws.column_dimensions[col_letter].width = 20
-        path_col = openpyxl.utils.get_column_letter(len(field_mapping) + 2)
-        ws.column_dimensions[path_col].width = 20
+                    self.log_message("All fields are read from text, table detection is skipped")
+        except Exception as e:
+            self.log_message(f"⚠ Could not learn field regions: {e}")
         
-        try:
-            wb.save(excel_path)
-            log_func(f"\n✓ Successfully wrote {len(new_data)} PDF file(s) to Excel")
-            if duplicates_count > 0:
-                log_func(f"  ({duplicates_count} duplicate(s) skipped)")
-            return True
-        except PermissionError:
-            log_func(f"\n❌ ERROR: Cannot save to '{excel_path}'")
-            log_func("   The file is currently open in another program.")
-            return False
-            
-    except Exception as e:
-        log_func(f"\n❌ Unexpected error: {e}")
-        return False
+        # Widgets may only be touched from the Tk main loop
+        self.after(0, lambda: self.finish_field_mapping(field_mapping, engine, templates, methods))
+    
+    def finish_field_mapping(self, field_mapping, engine, templates, methods):
+        """Save a configured field mapping once its regions are learned"""
+        self.field_mapping = field_mapping
+        self.extraction_engine = engine
+        self.field_templates = templates
+        self.field_methods = methods
+        self.learning_fields = False
+        
+        self.save_field_mapping()
+        self.mapping_btn.config(state="normal")
+        self.mapping_label.config(text=self.get_mapping_status_text())
+        self.log_message(f"\n✓ Field mapping saved: {len(self.field_mapping)} field(s)")
+        messagebox.showinfo("Success", f"Field mapping configured with {len(self.field_mapping)} field(s)!")
 
 if __name__ == "__main__":
+    # Required for worker processes in the frozen (PyInstaller) executable
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,572 @@
+"""
+Command-line interface of the PDF to Excel Converter.
+
+Runs the same extraction and export as the GUI without importing tkinter,
+so it works on headless servers and can be driven by cron jobs and other
+tools. Besides xlsx, results can be streamed as JSON Lines or CSV, or
+appended to a CSV file, a SQLite database or a Parquet dataset.
+
+Examples:
+    python pdf_to_excel_cli.py invoices/ -o invoices.xlsx --sheet "January"
+    python pdf_to_excel_cli.py invoices/ --format jsonl --workers 8 > rows.jsonl
+    python pdf_to_excel_cli.py invoices/ --format sqlite -o invoices.db
+    python pdf_to_excel_cli.py share/ -r --exclude "*/drafts" -o invoices.xlsx
+    python pdf_to_excel_cli.py dropbox/ -o invoices.xlsx --watch --interval 10
+    python pdf_to_excel_cli.py invoices/ --compare-engines
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from collections import Counter
+from itertools import chain
+
+from extraction_cache import ExtractionCache, default_cache_path
+from layout_plans import LayoutPlanStore, default_plans_path
+from conversion_journal import ConversionJournal, default_journal_path
+from output_sinks import SINK_EXTENSIONS, open_sink
+from watch_folder import (
+    DEFAULT_POLL_INTERVAL,
+    FolderWatcher,
+    ProcessedManifest,
+    default_manifest_path,
+)
+from pdf_to_excel_core import (
+    DEFAULT_DOCUMENT_MEMORY_LIMIT,
+    DEFAULT_ENGINE,
+    DEFAULT_FILE_LIMITS,
+    DEFAULT_WORKERS,
+    EXTRACTION_ENGINES,
+    FLUSH_EVERY_FILES,
+    MAPPING_FILENAME,
+    DuplicateFilter,
+    ExcelBatchWriter,
+    FileLimits,
+    compare_engines,
+    exported_content_hashes,
+    format_tier_counts,
+    get_pdf_files,
+    iter_pdf_files,
+    extract_pdf_records,
+    read_extraction_engine,
+    read_field_methods,
+    read_field_templates,
+    read_mapping_file,
+    resolve_sheet_name,
+    write_records_in_batches,
+    write_to_excel_gui,
+    write_to_excel_with_mapping,
+)
+
+# Exit codes
+EXIT_OK = 0
+EXIT_FAILURE = 1
+EXIT_USAGE = 2
+EXIT_NO_PDFS = 3
+
+OUTPUT_FORMATS = ("xlsx", "jsonl", "csv", "sqlite", "parquet")
+
+
+def log(message):
+    """Log progress to stderr so stdout stays machine-readable"""
+    print(message, file=sys.stderr)
+
+
+def build_parser():
+    """Build the argument parser"""
+    parser = argparse.ArgumentParser(
+        description="Extract fields from PDF files into Excel, JSON Lines or CSV."
+    )
+    parser.add_argument("folder", help="Folder containing the PDF files")
+    parser.add_argument(
+        "-r", "--recursive", action="store_true",
+        help="Also search subfolders (PDFs are extracted while folders are being searched)"
+    )
+    parser.add_argument(
+        "--include", action="append", metavar="GLOB",
+        help='Only use PDFs whose relative path or name matches GLOB, e.g. "2024/*" '
+             "(can be repeated)"
+    )
+    parser.add_argument(
+        "--exclude", action="append", metavar="GLOB",
+        help='Skip files and folders whose relative path or name matches GLOB, e.g. "*draft*" '
+             "(can be repeated)"
+    )
+    parser.add_argument(
+        "-o", "--output",
+        help="Excel file (xlsx), SQLite database (sqlite), Parquet dataset directory "
+             "(parquet), or output file for jsonl/csv (default for jsonl/csv: stdout; "
+             "a csv file is appended to)"
+    )
+    parser.add_argument(
+        "-s", "--sheet", default="PDF Files",
+        help='Sheet to append to, or "[Create New Sheet]"; table name for sqlite '
+             '(default: PDF Files)'
+    )
+    parser.add_argument(
+        "-m", "--mapping",
+        help=f"Field mapping file (default: {MAPPING_FILENAME} if it exists, "
+             "otherwise extract Total Amount only)"
+    )
+    parser.add_argument(
+        "-w", "--workers", type=int, default=DEFAULT_WORKERS,
+        help=f"Number of extraction worker processes (default: {DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        "-f", "--format", choices=OUTPUT_FORMATS, default="xlsx",
+        help="Output format (default: xlsx)"
+    )
+    parser.add_argument(
+        "-e", "--engine", choices=EXTRACTION_ENGINES,
+        help="Extraction engine (default: the one saved in the mapping file, otherwise "
+             f"{DEFAULT_ENGINE}); pdfminer is faster but does not read tables"
+    )
+    parser.add_argument(
+        "--compare-engines", action="store_true",
+        help="Extract the PDFs with every engine and report speed and agreement "
+             "instead of writing output"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true",
+        help="Bypass the extraction cache and re-extract every PDF"
+    )
+    parser.add_argument(
+        "--memory-limit", type=int, default=DEFAULT_DOCUMENT_MEMORY_LIMIT // (1024 * 1024),
+        metavar="MB",
+        help="Parsed-page memory per PDF before pages are processed one at a time "
+             "(0 = always; default: %(default)s)"
+    )
+    parser.add_argument(
+        "--max-seconds", type=float, default=DEFAULT_FILE_LIMITS.seconds, metavar="SECONDS",
+        help="Stop extracting a PDF after this long and record it as \"Timeout\" "
+             "(0 = no limit; default: %(default)s)"
+    )
+    parser.add_argument(
+        "--max-pages", type=int, default=DEFAULT_FILE_LIMITS.pages, metavar="PAGES",
+        help="Record PDFs with more pages as \"Too large\" without extracting them "
+             "(0 = no limit; default: %(default)s)"
+    )
+    parser.add_argument(
+        "--max-memory", type=int, default=DEFAULT_FILE_LIMITS.memory // (1024 * 1024),
+        metavar="MB",
+        help="Stop extracting a PDF whose worker uses more memory and record it as "
+             "\"Too large\" (Linux and Windows; 0 = no limit; default: %(default)s)"
+    )
+
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Continue a failed xlsx conversion: PDFs in the journal "
+             "(<output>.journal.jsonl) are not extracted again"
+    )
+    parser.add_argument(
+        "--flush-every", type=int, default=FLUSH_EVERY_FILES, metavar="N",
+        help="Write rows to the output every N files; an existing workbook is loaded and "
+             f"saved once per batch (default: {FLUSH_EVERY_FILES})"
+    )
+
+    watch_group = parser.add_argument_group("watch mode")
+    watch_group.add_argument(
+        "--watch", action="store_true",
+        help="Keep running and append new or changed PDFs as they arrive (xlsx only)"
+    )
+    watch_group.add_argument(
+        "--interval", type=float, default=DEFAULT_POLL_INTERVAL,
+        help=f"Seconds between folder polls (default: {DEFAULT_POLL_INTERVAL:g})"
+    )
+    watch_group.add_argument(
+        "--manifest",
+        help="Manifest of processed files (default: <output>.manifest.db)"
+    )
+    watch_group.add_argument(
+        "--baseline", action="store_true",
+        help="Mark the PDFs already in the folder as processed before watching"
+    )
+    return parser
+
+
+def load_mapping(mapping_arg):
+    """
+    Resolve the field mapping to use.
+
+    Returns:
+        Tuple (field_mapping, templates, methods, engine, mapping_file);
+        field_mapping is None if the mapping could not be read
+    """
+    mapping_file = mapping_arg or MAPPING_FILENAME
+
+    if not os.path.exists(mapping_file):
+        if mapping_arg:
+            log(f"❌ Error: Mapping file '{mapping_arg}' does not exist")
+            return None, {}, {}, DEFAULT_ENGINE, mapping_file
+        return [], {}, {}, DEFAULT_ENGINE, mapping_file
+
+    try:
+        return (
+            read_mapping_file(mapping_file),
+            read_field_templates(mapping_file),
+            read_field_methods(mapping_file),
+            read_extraction_engine(mapping_file),
+            mapping_file,
+        )
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        log(f"❌ Error: Could not read mapping file '{mapping_file}': {e}")
+        return None, {}, {}, DEFAULT_ENGINE, mapping_file
+
+
+def write_stream(records, output, output_format, headers):
+    """
+    Write records as JSON Lines or CSV while they are being extracted.
+
+    Args:
+        records: Iterable of tuples (filename, [field_values], full_path)
+        output: Writable text file object
+        output_format: "jsonl" or "csv"
+        headers: Column headers (same layout as the Excel sheet)
+
+    Returns:
+        Number of records written
+    """
+    count = 0
+    writer = None
+    if output_format == "csv":
+        writer = csv.writer(output)
+        writer.writerow(headers)
+
+    for filename, values, pdf_path in records:
+        row = [filename, *values, os.path.abspath(pdf_path)]
+        if writer is not None:
+            writer.writerow(row)
+        else:
+            output.write(json.dumps(dict(zip(headers, row)), ensure_ascii=False) + "\n")
+        output.flush()
+        count += 1
+
+    return count
+
+
+def write_excel(pdf_data, args, field_mapping, content_hashes=None, changed=None):
+    """
+    Append extracted records to the Excel sheet given on the command line.
+
+    content_hashes is an optional dictionary of pdf_path: content hash that
+    is recorded in the workbook's duplicate index; changed is an optional
+    set of already exported paths whose content changed (they are appended
+    again).
+
+    Returns:
+        True if the workbook was written successfully
+    """
+    log(f"Writing to Excel file: {args.output} (sheet: {args.sheet})")
+    if not field_mapping:
+        old_format_data = [(name, vals[0], path) for name, vals, path in pdf_data]
+        return write_to_excel_gui(
+            old_format_data, args.output, args.sheet, log, content_hashes, changed
+        )
+    return write_to_excel_with_mapping(
+        pdf_data, args.output, args.sheet, field_mapping, log, content_hashes, changed
+    )
+
+
+def write_journaled(pdf_files, args, field_mapping, cache, templates, plans, write_batch,
+                    dedup=None, finish=None, append_only=False):
+    """
+    Extract PDFs and write them to the output every --flush-every files,
+    journaling each result so a failed run can be resumed.
+
+    Args:
+        write_batch: Function writing a list of records; returns True on success
+        dedup: Optional DuplicateFilter skipping already exported content
+        finish: Optional function completing the output after the last
+                batch; returns True on success
+        append_only: The output cannot tell written rows from new ones
+                     (csv, parquet): written batches are marked in the
+                     journal, and a resumed run skips the files the
+                     previous run already wrote
+
+    Returns:
+        Tuple (number of records, success)
+    """
+    journal = None
+    try:
+        journal = ConversionJournal(
+            default_journal_path(args.output), field_mapping, args.resume, args.engine
+        )
+        if journal.resumed:
+            log(f"Resuming: {journal.resumed} PDF(s) already extracted")
+        if append_only and journal.written:
+            log(f"{len(journal.written)} of them already written to {args.output}")
+    except OSError as e:
+        log(f"⚠ Journal unavailable, progress will not be resumable: {e}")
+
+    if append_only and journal is not None:
+        write_batch = journal.marking_written(write_batch)
+
+    success = False
+    try:
+        records = extract_pdf_records(
+            pdf_files, field_mapping, args.workers, cache, templates, plans,
+            args.memory_limit * 1024 * 1024, journal, args.engine, args.methods, dedup,
+            args.tiers, args.limits
+        )
+        if append_only and journal is not None:
+            records = journal.skip_written(records)
+        count, success = write_records_in_batches(records, write_batch, args.flush_every)
+        if success and finish is not None:
+            success = finish()
+        return count, success
+    finally:
+        if journal is not None:
+            if success:
+                journal.discard()
+            else:
+                journal.close()
+                log("Extracted results were kept; rerun with --resume to continue")
+
+
+def log_duplicates(dedup):
+    """Report the files a DuplicateFilter skipped"""
+    if dedup.skipped:
+        log(f"{len(dedup.skipped)} duplicate PDF(s) skipped (same content as an exported file)")
+
+
+def run_watch(args, field_mapping, cache, templates=None, plans=None):
+    """
+    Watch the folder and append new or changed PDFs until interrupted.
+
+    A PDF whose content changed at an already exported path gets a new row.
+
+    Returns:
+        Process exit code
+    """
+    # Every poll appends to the same sheet
+    args.sheet = resolve_sheet_name(args.output, args.sheet)
+    manifest = ProcessedManifest(args.manifest or default_manifest_path(args.output))
+    try:
+        watcher = FolderWatcher(args.folder, manifest)
+        if args.baseline:
+            log(f"Baseline: marked {watcher.baseline()} existing PDF file(s) as processed")
+
+        def process(pdf_paths, changed):
+            dedup = DuplicateFilter(exported_content_hashes(args.output, args.sheet))
+            records = extract_pdf_records(
+                pdf_paths, field_mapping, args.workers, cache, templates, plans,
+                args.memory_limit * 1024 * 1024, engine=args.engine, methods=args.methods,
+                dedup=dedup, tiers=args.tiers, limits=args.limits
+            )
+            records = list(records)
+            log_duplicates(dedup)
+            if not records:
+                return True
+            return write_excel(records, args, field_mapping, dedup.hashes, changed)
+
+        log(f"Watching '{args.folder}' every {args.interval:g}s (Ctrl+C to stop)")
+        watcher.watch(process, args.interval, log)
+    except KeyboardInterrupt:
+        log("\n✓ Stopped watching")
+        return EXIT_OK
+    finally:
+        manifest.close()
+
+
+def run_compare(pdf_files, field_mapping, templates, methods=None):
+    """
+    Print a speed and accuracy comparison of the extraction engines.
+
+    Returns:
+        Process exit code
+    """
+    log(f"Comparing {', '.join(EXTRACTION_ENGINES)} on {len(pdf_files)} PDF file(s)...")
+    report = compare_engines(pdf_files, field_mapping, templates, methods)
+    total = len(pdf_files) * len(field_mapping)
+    reference = report[DEFAULT_ENGINE]['seconds']
+
+    print(f"{'Engine':<12}{'Seconds':>10}{'Per PDF':>10}{'Speed':>8}{'Found':>10}{'Agree':>10}")
+    for engine, stats in report.items():
+        speed = reference / stats['seconds'] if stats['seconds'] else 0
+        print(
+            f"{engine:<12}{stats['seconds']:>10.2f}{stats['seconds'] / len(pdf_files):>10.3f}"
+            f"{speed:>7.1f}x{stats['found']:>10}{stats['agree'] / total:>10.1%}"
+        )
+
+    for engine, stats in report.items():
+        if stats['differences']:
+            print(f"\nDifferences from {DEFAULT_ENGINE} ({engine}):")
+            for filename, field, value, expected in stats['differences']:
+                print(f"  {filename}: {field} = {value!r} (expected {expected!r})")
+    return EXIT_OK
+
+
+def run(args):
+    """
+    Run a conversion for parsed command-line arguments.
+
+    Returns:
+        Process exit code
+    """
+    if args.workers < 1:
+        log("❌ Error: --workers must be at least 1")
+        return EXIT_USAGE
+
+    if args.flush_every < 1:
+        log("❌ Error: --flush-every must be at least 1")
+        return EXIT_USAGE
+
+    if args.memory_limit < 0:
+        log("❌ Error: --memory-limit must not be negative")
+        return EXIT_USAGE
+
+    if args.max_seconds < 0 or args.max_pages < 0 or args.max_memory < 0:
+        log("❌ Error: --max-seconds, --max-pages and --max-memory must not be negative")
+        return EXIT_USAGE
+    args.limits = FileLimits(args.max_seconds, args.max_pages, args.max_memory * 1024 * 1024)
+
+    if args.compare_engines:
+        if not os.path.isdir(args.folder):
+            log(f"❌ Error: Folder '{args.folder}' does not exist")
+            return EXIT_USAGE
+        field_mapping, templates, methods, _, _ = load_mapping(args.mapping)
+        if not field_mapping:
+            log("❌ Error: --compare-engines needs a field mapping")
+            return EXIT_USAGE
+        pdf_files = get_pdf_files(args.folder, args.recursive, args.include, args.exclude)
+        if not pdf_files:
+            log(f"⚠ No PDF files found in '{args.folder}'")
+            return EXIT_NO_PDFS
+        return run_compare(pdf_files, field_mapping, templates, methods)
+
+    if args.watch and args.format != "xlsx":
+        log("❌ Error: --watch only supports xlsx output")
+        return EXIT_USAGE
+
+    if args.watch and (args.recursive or args.include or args.exclude):
+        log("❌ Error: --watch does not support --recursive, --include or --exclude")
+        return EXIT_USAGE
+
+    if args.format == "xlsx":
+        if not args.output:
+            log("❌ Error: --output is required for xlsx output")
+            return EXIT_USAGE
+        if not args.output.lower().endswith('.xlsx'):
+            args.output += '.xlsx'
+
+    if args.format in ("sqlite", "parquet") and not args.output:
+        log(f"❌ Error: --output is required for {args.format} output")
+        return EXIT_USAGE
+
+    if not os.path.isdir(args.folder):
+        log(f"❌ Error: Folder '{args.folder}' does not exist")
+        return EXIT_USAGE
+
+    field_mapping, templates, methods, engine, mapping_file = load_mapping(args.mapping)
+    if field_mapping is None:
+        return EXIT_USAGE
+    args.engine = args.engine or engine
+    args.methods = methods
+    # Number of extracted fields served by each extraction tier
+    args.tiers = Counter()
+
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = ExtractionCache(
+                default_cache_path(mapping_file), field_mapping, templates=templates,
+                engine=args.engine, methods=methods
+            )
+        except Exception as e:
+            log(f"⚠ Extraction cache unavailable: {e}")
+
+    plans = None
+    if field_mapping:
+        try:
+            plans = LayoutPlanStore(default_plans_path(mapping_file), field_mapping, args.engine)
+        except Exception as e:
+            log(f"⚠ Layout plans unavailable: {e}")
+
+    try:
+        if args.watch:
+            return run_watch(args, field_mapping, cache, templates, plans)
+
+        # Extraction starts while the folder is still being searched
+        pdf_files = iter_pdf_files(args.folder, args.recursive, args.include, args.exclude)
+        first_pdf = next(pdf_files, None)
+        if first_pdf is None:
+            log(f"⚠ No PDF files found in '{args.folder}'")
+            return EXIT_NO_PDFS
+
+        pdf_files = chain([first_pdf], pdf_files)
+        log("Extracting PDF files as they are found")
+        columns = field_mapping or ["Total Amount"]
+        headers = ["PDF Filename"] + columns + ["Path to Invoice"]
+
+        to_file = bool(args.output) and args.output != "-"
+
+        if args.format == "jsonl" or (args.format == "csv" and not to_file):
+            records = extract_pdf_records(
+                pdf_files, field_mapping, args.workers, cache, templates, plans,
+                args.memory_limit * 1024 * 1024, engine=args.engine, methods=args.methods,
+                tiers=args.tiers, limits=args.limits
+            )
+            if to_file:
+                with open(args.output, 'w', newline='', encoding='utf-8') as output:
+                    count = write_stream(records, output, args.format, headers)
+            else:
+                count = write_stream(records, sys.stdout, args.format, headers)
+            log(f"✓ Wrote {count} record(s)")
+            return EXIT_OK
+
+        if args.format in SINK_EXTENSIONS:
+            sink = open_sink(args.format, args.output, headers, args.sheet)
+            try:
+                count, success = write_journaled(
+                    pdf_files, args, field_mapping, cache, templates, plans, sink.write,
+                    append_only=not sink.upserts
+                )
+            finally:
+                sink.close()
+            log(f"✓ Wrote {count} record(s) to {args.output}")
+            return EXIT_OK if success else EXIT_FAILURE
+
+        # Every batch goes to the same sheet
+        args.sheet = resolve_sheet_name(args.output, args.sheet)
+        dedup = DuplicateFilter(exported_content_hashes(args.output, args.sheet))
+        log(f"Writing to Excel file: {args.output} (sheet: {args.sheet})")
+        writer = ExcelBatchWriter(args.output, args.sheet, field_mapping, log, dedup.hashes)
+        count, success = write_journaled(
+            pdf_files, args, field_mapping, cache, templates, plans, writer.write, dedup,
+            writer.close
+        )
+        log_duplicates(dedup)
+        log(f"✓ Processed {count} PDF file(s)")
+        return EXIT_OK if success else EXIT_FAILURE
+
+    except KeyboardInterrupt:
+        log("\n⚠ Conversion cancelled by user")
+        return EXIT_FAILURE
+    except Exception as e:
+        log(f"❌ Error: {e}")
+        return EXIT_FAILURE
+    finally:
+        if cache is not None:
+            cache.close()
+            if cache.hits:
+                log(f"{cache.hits} PDF(s) served from cache")
+        if plans is not None:
+            plans.close()
+            if plans.learned:
+                log(f"Learned {plans.learned} new PDF layout(s)")
+        if args.tiers:
+            log(f"Fields by extraction tier: {format_tier_counts(args.tiers)}")
+
+
+def main(argv=None):
+    """Command-line entry point"""
+    args = build_parser().parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,3057 @@
+"""
+Core extraction and export functions of the PDF to Excel Converter.
+
+This module has no GUI dependencies, so it can be used by the Tk
+application, the command-line interface and extraction worker processes.
+pdfplumber, pdfminer and openpyxl are imported on first use rather than
+with the module, so importing it (e.g. in every worker process) is cheap.
+"""
+
+import io
+import os
+import sys
+import re
+import time
+import queue
+import threading
+import json
+import hashlib
+import multiprocessing
+import multiprocessing.connection
+from fnmatch import fnmatch
+from collections import OrderedDict, deque, namedtuple
+from functools import lru_cache
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from itertools import groupby
+from operator import itemgetter
+from export_index import ExportIndex
+from extraction_cache import FAILED_VALUES
+
+# Default number of worker processes used for extraction
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Default file used to persist the field mapping
+MAPPING_FILENAME = "field_mapping.json"
+
+# Number of PDFs sampled from a folder to discover the available fields
+DISCOVERY_SAMPLE_SIZE = 20
+
+# Seconds between checks for cancellation while discovery results are pending
+DISCOVERY_POLL_SECONDS = 0.2
+
+# Number of recently analyzed PDFs whose page results are kept in memory
+ANALYSIS_CACHE_SIZE = 8
+
+# Default memory ceiling (bytes) for the parsed page layouts of one PDF.
+# Beyond it the PDF is processed in low-memory mode: each page's layout is
+# released as soon as the next page is scanned.
+DEFAULT_DOCUMENT_MEMORY_LIMIT = 256 * 1024 * 1024
+
+# Estimated memory held by one parsed layout object (char, line, rect, ...)
+LAYOUT_OBJECT_BYTES = 2048
+
+# Number of characters after a field label that are searched for its value
+VALUE_WINDOW_CHARS = 200
+
+# Region searched around a field label found by its word positions: the
+# full page width, from just above the label to this many points below it
+ANCHOR_REGION_HEIGHT = 150
+ANCHOR_REGION_MARGIN = 12
+
+# Padding (points) around the value and label boxes of learned field templates
+TEMPLATE_PADDING = 1
+
+# Layout fingerprint: number of text lines of the first page whose position
+# is used, and the grid (points) positions are snapped to
+FINGERPRINT_LINES = 12
+FINGERPRINT_GRID = 5
+
+# How a field's value was found in the sample PDF when the mapping was
+# configured: below its label in a table, after its label on the same text
+# line, or on the line after its label. Fields found as text never need
+# the table finder.
+FIELD_METHODS = ("table", "text", "multiline")
+
+# Extraction engines a field mapping can select. "pdfminer" reads text and
+# word positions straight from pdfminer's layout analysis, without
+# pdfplumber's object model and table finder; it suits mappings whose
+# fields are not read from table columns
+DEFAULT_ENGINE = "pdfplumber"
+EXTRACTION_ENGINES = ("pdfplumber", "pdfminer")
+
+# Layout analysis of the pdfminer engine: boxes_flow=None skips ordering
+# the text boxes (lines are ordered by position instead), and a large
+# char_margin keeps a label and its value in one text line
+ENGINE_LAPARAMS = {'char_margin': 20.0, 'line_margin': 0.3, 'word_margin': 0.1, 'boxes_flow': None}
+# Words whose tops are this close (points) are on the same text line
+LINE_TOLERANCE = 3
+# Estimated memory held by one character of the pdfminer engine
+ENGINE_CHAR_BYTES = 256
+
+# Files queued for each extraction worker ahead of the results being used
+PENDING_FILES_PER_WORKER = 4
+
+# Per-file limits enforced by the extraction watchdog: seconds, pages and
+# worker memory (bytes) per PDF; 0 turns a limit off. A PDF over a limit
+# gets "Timeout" or "Too large" as its values instead of stalling the run.
+FileLimits = namedtuple('FileLimits', ['seconds', 'pages', 'memory'])
+DEFAULT_FILE_LIMITS = FileLimits(seconds=300, pages=1000, memory=2048 * 1024 * 1024)
+NO_FILE_LIMITS = FileLimits(seconds=0, pages=0, memory=0)
+
+# How often the watchdog checks the time and memory of running files
+WATCHDOG_POLL_SECONDS = 0.2
+
+# Extraction tiers, cheapest first: learned regions, text-only matching,
+# table detection, and a scan of every page of the document
+EXTRACTION_TIERS = ("template", "text", "table", "document")
+
+# Pages searched at the start and at the end of a PDF right after the pages
+# its fields were found on before, ahead of the pages in between
+SEARCH_EDGE_PAGES = 3
+
+# Minimum confidence of a text-only Total Amount match; weaker matches are
+# escalated to the table and full-document tiers
+TIER_CONFIDENCE = 0.8
+
+# Total Amount patterns of the text tier with their confidence: an amount
+# in USD on the label's own line, an amount without currency on that line,
+# and an amount in USD anywhere after the label (e.g. in a table column)
+TOTAL_AMOUNT_PATTERNS = (
+    (re.compile(r'Total Amount[^\n]*?USD\s*([0-9,]+\.?[0-9]*)', re.IGNORECASE), 1.0),
+    (re.compile(r'Total Amount[: \t]+([0-9,]+\.?[0-9]*)', re.IGNORECASE), 0.6),
+    (re.compile(r'Total Amount.*?USD\s*([0-9,]+\.?[0-9]*)', re.IGNORECASE | re.DOTALL), 0.5),
+)
+
+# Number of extracted files written to the output at a time; an existing
+# workbook is loaded and saved once per batch, so batches are large
+FLUSH_EVERY_FILES = 5000
+
+# Pipeline queues: discovered paths waiting for extraction, and batches of
+# rows waiting for the writer while it saves the previous one
+DISCOVERY_QUEUE_SIZE = 256
+WRITE_QUEUE_BATCHES = 1
+
+# Consecutive batches that could not be written (e.g. the workbook is open
+# in Excel) before a conversion stops; the unwritten rows are kept for a
+# retry until then, and the conversion journal keeps them for a resume
+MAX_FAILED_WRITES = 3
+
+# Named cell styles shared by all header and hyperlink cells in a workbook
+HEADER_STYLE = "PDF Header"
+LINK_STYLE = "Invoice Link"
+
+def _warn(message):
+    """
+    Report a problem with a folder or PDF on stderr.
+
+    stdout may be the data stream of the command-line tool (jsonl or csv
+    output), also in worker processes, so diagnostics never go there.
+    """
+    print(message, file=sys.stderr)
+
+def get_pdf_files(folder_path, recursive=False, include=None, exclude=None):
+    """
+    Get all PDF files from the specified folder.
+    
+    Args:
+        folder_path: Path to the folder containing PDF files
+        recursive: Also search subfolders
+        include: Optional glob patterns of the files to use (see iter_pdf_files)
+        exclude: Optional glob patterns of files and folders to skip
+        
+    Returns:
+        List of PDF file paths
+    """
+    if not os.path.exists(folder_path):
+        _warn(f"Error: Folder '{folder_path}' does not exist.")
+        return []
+    
+    return sorted(iter_pdf_files(folder_path, recursive, include, exclude))
+
+def iter_pdf_files(folder_path, recursive=False, include=None, exclude=None):
+    """
+    Yield the PDF files of a folder while it is being walked.
+    
+    Each folder is listed with os.scandir and its PDFs are yielded (sorted
+    by name) before the walk moves on, so extraction can start long before
+    a large tree of year/month folders has been listed completely.
+    
+    Glob patterns are matched case-insensitively against the path relative
+    to folder_path (with "/" separators) and against the name, so "*.pdf",
+    "2024/*" and "*draft*" all work.
+    
+    Args:
+        folder_path: Path to the folder containing PDF files
+        recursive: Also walk subfolders (symbolic links to folders are not followed)
+        include: Optional glob patterns; only PDFs matching one of them are yielded
+        exclude: Optional glob patterns of files and folders to skip
+        
+    Yields:
+        PDF file paths
+    """
+    include = [pattern.lower() for pattern in include or []]
+    exclude = [pattern.lower() for pattern in exclude or []]
+    
+    def matches(relative_path, name, patterns):
+        relative_path, name = relative_path.lower(), name.lower()
+        return any(fnmatch(relative_path, pattern) or fnmatch(name, pattern) for pattern in patterns)
+    
+    folders = [(folder_path, "")]
+    while folders:
+        folder, relative_folder = folders.pop()
+        try:
+            with os.scandir(folder) as entries:
+                entries = sorted(entries, key=lambda entry: entry.name)
+        except OSError as e:
+            _warn(f"Warning: Cannot read folder '{folder}': {e}")
+            continue
+        
+        subfolders = []
+        for entry in entries:
+            relative_path = relative_folder + entry.name
+            if exclude and matches(relative_path, entry.name, exclude):
+                continue
+            
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        subfolders.append((entry.path, relative_path + "/"))
+                    continue
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            
+            if not entry.name.lower().endswith('.pdf'):
+                continue
+            if include and not matches(relative_path, entry.name, include):
+                continue
+            yield entry.path
+        
+        # Walk subfolders in name order
+        folders.extend(reversed(subfolders))
+
+def read_mapping_file(mapping_file):
+    """
+    Read the configured field names from a field mapping file.
+    
+    Args:
+        mapping_file: Path to the JSON mapping file
+        
+    Returns:
+        List of field names (empty if none are configured)
+    """
+    with open(mapping_file, 'r') as f:
+        data = json.load(f)
+    return data.get('fields', [])
+
+def read_field_templates(mapping_file):
+    """
+    Read the learned field region templates from a field mapping file.
+    
+    Args:
+        mapping_file: Path to the JSON mapping file
+        
+    Returns:
+        Dictionary of field_name: template (empty if none were learned)
+    """
+    with open(mapping_file, 'r') as f:
+        data = json.load(f)
+    return {
+        field: {
+            'page': int(template['page']),
+            'bbox': tuple(template['bbox']),
+            'label_bbox': tuple(template['label_bbox']),
+        }
+        for field, template in data.get('templates', {}).items()
+    }
+
+def read_field_methods(mapping_file):
+    """
+    Read how each field was found when the mapping was configured.
+    
+    Args:
+        mapping_file: Path to the JSON mapping file
+        
+    Returns:
+        Dictionary of field_name: method (one of FIELD_METHODS)
+    """
+    with open(mapping_file, 'r') as f:
+        data = json.load(f)
+    return {
+        field: method
+        for field, method in data.get('methods', {}).items()
+        if method in FIELD_METHODS
+    }
+
+def read_extraction_engine(mapping_file):
+    """
+    Read the extraction engine selected in a field mapping file.
+    
+    Args:
+        mapping_file: Path to the JSON mapping file
+        
+    Returns:
+        Engine name (one of EXTRACTION_ENGINES)
+    """
+    with open(mapping_file, 'r') as f:
+        data = json.load(f)
+    engine = data.get('engine', DEFAULT_ENGINE)
+    return engine if engine in EXTRACTION_ENGINES else DEFAULT_ENGINE
+
+def write_mapping_file(mapping_file, field_mapping, templates=None, engine=DEFAULT_ENGINE,
+                       methods=None):
+    """
+    Write the configured field names to a field mapping file.
+    
+    Args:
+        mapping_file: Path to the JSON mapping file
+        field_mapping: List of field names
+        templates: Optional dictionary of field_name: template
+                   (see learn_field_templates)
+        engine: Extraction engine used for this mapping
+        methods: Optional dictionary of field_name: method
+                 (see learn_field_methods)
+    """
+    data = {'fields': field_mapping}
+    if methods:
+        data['methods'] = methods
+    if engine != DEFAULT_ENGINE:
+        data['engine'] = engine
+    if templates:
+        data['templates'] = {
+            field: {
+                'page': template['page'],
+                'bbox': list(template['bbox']),
+                'label_bbox': list(template['label_bbox']),
+            }
+            for field, template in templates.items()
+        }
+    with open(mapping_file, 'w') as f:
+        json.dump(data, f, indent=2)
+
+class PDFAnalysis:
+    """
+    Lazily computed text, words and tables for each page of one PDF.
+    
+    Every page is laid out by pdfplumber at most once per analysis. Results
+    are kept after the PDF is closed, so the same analysis can be reused by
+    all extractors (e.g. the mapping dialog and a later conversion).
+    
+    pdfplumber keeps the parsed layout of every page it has seen. Once the
+    estimated size of those layouts exceeds memory_limit, the analysis
+    switches to low-memory mode: a page's layout (and its words) is released
+    as soon as another page is accessed, so memory depends on the size of a
+    page rather than the number of pages.
+    
+    If the file's content has already been read (data), the PDF is parsed
+    from that buffer instead of being read from disk again.
+    """
+    
+    def __init__(self, pdf_path, memory_limit=DEFAULT_DOCUMENT_MEMORY_LIMIT, low_memory=False,
+                 data=None):
+        self.pdf_path = pdf_path
+        self.memory_limit = memory_limit
+        self.low_memory = low_memory
+        self.data = data
+        self._parsed = {}  # page_num -> estimated bytes of its parsed layout
+        self._current_page = None
+        self._pdf = None
+        self._page_count = None
+        self._text = {}
+        self._words = {}
+        self._tables = {}
+        self._regions = {}
+        self._depth = 0
+    
+    def __enter__(self):
+        self._depth += 1
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Nested uses share the open PDF; close when the outermost one ends
+        self._depth -= 1
+        if self._depth <= 0:
+            self._depth = 0
+            self.close()
+    
+    def _open(self):
+        """Open the underlying PDF on first use"""
+        if self._pdf is None:
+            import pdfplumber
+            self._pdf = pdfplumber.open(io.BytesIO(self.data) if self.data is not None else self.pdf_path)
+            self._page_count = len(self._pdf.pages)
+        return self._pdf
+    
+    @property
+    def page_count(self):
+        """Number of pages in the PDF"""
+        if self._page_count is None:
+            self._open()
+        return self._page_count
+    
+    def page(self, page_num):
+        """Return the pdfplumber page object (0-based page number)"""
+        self._open()
+        if page_num != self._current_page:
+            self._leave_page()
+            self._current_page = page_num
+        return self._load_page(page_num)
+    
+    def _load_page(self, page_num):
+        """Return the page object of an open PDF"""
+        return self._pdf.pages[page_num]
+    
+    def _parsed_size(self, page_num):
+        """Return the estimated memory of a page's parsed layout, or None if not parsed"""
+        page = self._pdf.pages[page_num]
+        if not hasattr(page, '_layout'):
+            return None
+        return LAYOUT_OBJECT_BYTES * sum(len(objects) for objects in page.objects.values())
+    
+    def _free_page(self, page_num):
+        """Drop the parsed layout of a page of an open PDF"""
+        self._pdf.pages[page_num].close()
+    
+    def _leave_page(self):
+        """Account for the memory of the page scanned last, or release it"""
+        page_num = self._current_page
+        if page_num is None or self._pdf is None:
+            return
+        
+        if self.low_memory:
+            self.release(page_num)
+            return
+        
+        size = self._parsed_size(page_num) if page_num not in self._parsed else None
+        if size is not None:
+            self._parsed[page_num] = size
+            if self.memory_limit is not None and sum(self._parsed.values()) > self.memory_limit:
+                self.low_memory = True
+                for parsed_page in list(self._parsed):
+                    self.release(parsed_page)
+    
+    def release(self, page_num):
+        """
+        Free the parsed layout of a page.
+        
+        Text and tables computed from it are kept; in low-memory mode its
+        words and cropped regions are dropped as well.
+        """
+        if self._pdf is not None:
+            self._free_page(page_num)
+        self._parsed.pop(page_num, None)
+        
+        if self.low_memory:
+            self._words.pop(page_num, None)
+            for key in [key for key in self._regions if key[1] == page_num]:
+                del self._regions[key]
+    
+    def text(self, page_num):
+        """Return the extracted text of a page"""
+        if page_num not in self._text:
+            self._text[page_num] = self.page(page_num).extract_text() or ""
+        return self._text[page_num]
+    
+    def words(self, page_num):
+        """Return the positioned words of a page"""
+        if page_num not in self._words:
+            self._words[page_num] = self.page(page_num).extract_words()
+        return self._words[page_num]
+    
+    def tables(self, page_num):
+        """Return the extracted tables of a page"""
+        if page_num not in self._tables:
+            self._tables[page_num] = self.page(page_num).extract_tables()
+        return self._tables[page_num]
+    
+    def region_text(self, page_num, bbox):
+        """Return the extracted text of a region (x0, top, x1, bottom) of a page"""
+        key = ('text', page_num, bbox)
+        if key not in self._regions:
+            self._regions[key] = self.page(page_num).crop(bbox).extract_text() or ""
+        return self._regions[key]
+    
+    def region_tables(self, page_num, bbox):
+        """Return the tables found in a region (x0, top, x1, bottom) of a page"""
+        key = ('tables', page_num, bbox)
+        if key not in self._regions:
+            self._regions[key] = self.page(page_num).crop(bbox).extract_tables()
+        return self._regions[key]
+    
+    def label_regions(self, page_num, labels):
+        """
+        Find the regions of a page around occurrences of field labels.
+        
+        Labels are located with the page's word positions, which is much
+        cheaper than running the table finder over the whole page.
+        
+        Args:
+            page_num: 0-based page number
+            labels: Field labels to look for (case-insensitive)
+            
+        Returns:
+            List of non-overlapping (x0, top, x1, bottom) regions, top to bottom
+        """
+        words = self.words(page_num)
+        page_x0, page_top, page_x1, page_bottom = self.page(page_num).bbox
+        
+        bands = []
+        for label in labels:
+            for _, top, _, bottom in _word_runs(words, label):
+                bands.append((
+                    max(page_top, top - ANCHOR_REGION_MARGIN),
+                    min(page_bottom, bottom + ANCHOR_REGION_HEIGHT)
+                ))
+        
+        # Merge overlapping bands so each part of the page is cropped once
+        regions = []
+        for top, bottom in sorted(bands):
+            if regions and top <= regions[-1][3]:
+                regions[-1] = (page_x0, regions[-1][1], page_x1, max(bottom, regions[-1][3]))
+            else:
+                regions.append((page_x0, top, page_x1, bottom))
+        return regions
+    
+    def anchored_labels(self, page_num, labels):
+        """Return the labels whose words appear on a page (case-insensitive)"""
+        words = self.words(page_num)
+        return [label for label in labels if next(_word_runs(words, label), None) is not None]
+    
+    def close(self):
+        """Close the underlying PDF (computed page results are kept)"""
+        if self._pdf is not None:
+            self._pdf.close()
+            self._pdf = None
+        self.data = None
+        self._parsed.clear()
+        self._current_page = None
+
+def _word_runs(words, label, exact=False):
+    """
+    Yield the bounding box (x0, top, x1, bottom) of each run of words that
+    spells the label (case-insensitive).
+    
+    Unless exact is set, the last word may carry trailing punctuation
+    ("Amount:", "Amount(USD)").
+    """
+    tokens = label.lower().split()
+    if not tokens:
+        return
+    
+    for i in range(len(words) - len(tokens) + 1):
+        run = words[i:i + len(tokens)]
+        texts = [word['text'].lower() for word in run]
+        if texts[:-1] != tokens[:-1]:
+            continue
+        if texts[-1] == tokens[-1] or (not exact and texts[-1].startswith(tokens[-1])):
+            yield (
+                min(word['x0'] for word in run),
+                min(word['top'] for word in run),
+                max(word['x1'] for word in run),
+                max(word['bottom'] for word in run),
+            )
+
+class PDFMinerPage:
+    """
+    One page as read by the pdfminer engine.
+    
+    Provides the parts of a pdfplumber page the extractors use (bbox,
+    chars, crop, extract_text, extract_words). Tables are not detected.
+    """
+    
+    def __init__(self, bbox, chars):
+        self.bbox = bbox
+        self.chars = chars  # dicts with text, fontname, x0, top, x1, bottom, word
+    
+    @property
+    def width(self):
+        return self.bbox[2] - self.bbox[0]
+    
+    @property
+    def height(self):
+        return self.bbox[3] - self.bbox[1]
+    
+    @classmethod
+    def from_layout(cls, layout):
+        """Build a page from the LTPage of pdfminer's layout analysis"""
+        from pdfminer.layout import LTAnno, LTChar
+        
+        chars = []
+        word = 0
+        for line in _text_lines(layout):
+            word += 1
+            for item in line:
+                text = item.get_text()
+                if isinstance(item, LTChar) and not text.isspace():
+                    # Measure from the top of the page, like pdfplumber
+                    chars.append({
+                        'text': text,
+                        'fontname': item.fontname,
+                        'x0': item.x0,
+                        'top': layout.y1 - item.y1,
+                        'x1': item.x1,
+                        'bottom': layout.y1 - item.y0,
+                        'word': word,
+                    })
+                elif isinstance(item, LTAnno) or text.isspace():
+                    word += 1
+        return cls((layout.x0, 0, layout.x1, layout.height), chars)
+    
+    def crop(self, bbox):
+        """Return the part of the page within (x0, top, x1, bottom)"""
+        x0, top, x1, bottom = bbox
+        return PDFMinerPage(bbox, [
+            char for char in self.chars
+            if char['x0'] < x1 and char['x1'] > x0 and char['top'] < bottom and char['bottom'] > top
+        ])
+    
+    def extract_words(self):
+        """Return the positioned words of the page, in reading order"""
+        words = []
+        for _, chars in groupby(self.chars, key=itemgetter('word')):
+            chars = list(chars)
+            words.append({
+                'text': ''.join(char['text'] for char in chars),
+                'x0': min(char['x0'] for char in chars),
+                'top': min(char['top'] for char in chars),
+                'x1': max(char['x1'] for char in chars),
+                'bottom': max(char['bottom'] for char in chars),
+            })
+        return [word for row in _word_rows(words) for word in row]
+    
+    def extract_text(self):
+        """Return the text of the page, one text line per line"""
+        return "\n".join(
+            " ".join(word['text'] for word in row) for row in _word_rows(self.extract_words())
+        )
+    
+    def extract_tables(self):
+        """The pdfminer engine does not detect tables"""
+        return []
+
+def _text_lines(container):
+    """Yield the horizontal text lines of a pdfminer layout, depth first"""
+    from pdfminer.layout import LTContainer, LTTextLineHorizontal
+    
+    for item in container:
+        if isinstance(item, LTTextLineHorizontal):
+            yield item
+        elif isinstance(item, LTContainer):
+            yield from _text_lines(item)
+
+def _word_rows(words):
+    """Group words into text lines (by their top), each sorted left to right"""
+    rows = []
+    for word in sorted(words, key=itemgetter('top', 'x0')):
+        if rows and word['top'] - rows[-1][0]['top'] <= LINE_TOLERANCE:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+    return [sorted(row, key=itemgetter('x0')) for row in rows]
+
+class PDFMinerAnalysis(PDFAnalysis):
+    """
+    PDFAnalysis using the pdfminer engine.
+    
+    Pages are laid out by pdfminer directly (see ENGINE_LAPARAMS) and only
+    their characters are kept, which is much cheaper than pdfplumber's
+    object model. Tables are never found, so fields are read from text.
+    """
+    
+    def __init__(self, pdf_path, memory_limit=DEFAULT_DOCUMENT_MEMORY_LIMIT, low_memory=False,
+                 data=None):
+        super().__init__(pdf_path, memory_limit, low_memory, data)
+        self._file = None
+        self._pages = {}
+        self._interpreter = None
+        self._device = None
+    
+    def _open(self):
+        """Open the underlying PDF on first use"""
+        if self._pdf is None:
+            from pdfminer.converter import PDFPageAggregator
+            from pdfminer.layout import LAParams
+            from pdfminer.pdfdocument import PDFDocument
+            from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+            from pdfminer.pdfpage import PDFPage
+            from pdfminer.pdfparser import PDFParser
+            
+            self._file = io.BytesIO(self.data) if self.data is not None else open(self.pdf_path, 'rb')
+            try:
+                pages = list(PDFPage.create_pages(PDFDocument(PDFParser(self._file))))
+            except Exception:
+                self._file.close()
+                self._file = None
+                raise
+            
+            resources = PDFResourceManager()
+            self._device = PDFPageAggregator(resources, laparams=LAParams(**ENGINE_LAPARAMS))
+            self._interpreter = PDFPageInterpreter(resources, self._device)
+            self._pdf = pages
+            self._page_count = len(pages)
+        return self._pdf
+    
+    def _load_page(self, page_num):
+        page = self._pages.get(page_num)
+        if page is None:
+            self._interpreter.process_page(self._pdf[page_num])
+            page = PDFMinerPage.from_layout(self._device.get_result())
+            self._pages[page_num] = page
+        return page
+    
+    def _parsed_size(self, page_num):
+        page = self._pages.get(page_num)
+        return ENGINE_CHAR_BYTES * len(page.chars) if page is not None else None
+    
+    def _free_page(self, page_num):
+        self._pages.pop(page_num, None)
+    
+    def close(self):
+        """Close the underlying PDF (computed page results are kept)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self._pdf = None
+        self.data = None
+        self._pages.clear()
+        self._interpreter = None
+        self._device = None
+        self._parsed.clear()
+        self._current_page = None
+
+_analysis_cache = OrderedDict()
+_analysis_lock = threading.Lock()
+_document_memory_limit = DEFAULT_DOCUMENT_MEMORY_LIMIT
+
+def set_document_memory_limit(limit):
+    """
+    Set the memory ceiling for the parsed page layouts of one PDF.
+    
+    Args:
+        limit: Ceiling in bytes (0 = always use low-memory mode, None = never)
+    """
+    global _document_memory_limit
+    _document_memory_limit = limit
+
+def get_pdf_analysis(pdf_path, engine=DEFAULT_ENGINE, data=None):
+    """
+    Get the shared PDFAnalysis for a PDF file.
+    
+    Analyses of recently used files are reused as long as the file has not
+    changed on disk, so several extractors never lay out a page twice.
+    
+    Args:
+        pdf_path: Full path to the PDF file
+        engine: Extraction engine ("pdfplumber" or "pdfminer")
+        data: Optional content of the file, if it has already been read
+        
+    Returns:
+        PDFAnalysis instance (use it as a context manager)
+    """
+    analysis_class = PDFMinerAnalysis if engine == "pdfminer" else PDFAnalysis
+    try:
+        stat = os.stat(pdf_path)
+    except OSError:
+        # Let the extractor report the error when the file is opened
+        return analysis_class(pdf_path, _document_memory_limit, data=data)
+    
+    key = (os.path.abspath(pdf_path), stat.st_size, stat.st_mtime_ns, analysis_class)
+    
+    with _analysis_lock:
+        analysis = _analysis_cache.get(key)
+        if analysis is None:
+            analysis = analysis_class(pdf_path, _document_memory_limit, data=data)
+            _analysis_cache[key] = analysis
+            while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+                _analysis_cache.popitem(last=False)[1].close()
+        else:
+            _analysis_cache.move_to_end(key)
+            if data is not None and analysis.data is None:
+                analysis.data = data
+    
+    return analysis
+
+def extract_all_fields_from_pdf(pdf_path, max_pages=3):
+    """
+    Extract all possible fields from a PDF file.
+    
+    Args:
+        pdf_path: Full path to the PDF file
+        max_pages: Maximum number of pages to analyze (default: 3)
+        
+    Returns:
+        Dictionary of field_name: value pairs
+    """
+    fields = OrderedDict()
+    
+    try:
+        with get_pdf_analysis(pdf_path) as analysis:
+            # Limit analysis to first few pages for performance
+            pages_to_analyze = min(max_pages, analysis.page_count)
+            
+            for page_num in range(pages_to_analyze):
+                # Extract text
+                text = analysis.text(page_num)
+                
+                # Extract tables
+                tables = analysis.tables(page_num)
+                
+                # Method 1: Extract from tables (column headers and first data row)
+                if tables:
+                    for table in tables:
+                        if not table or len(table) < 2:
+                            continue
+                        
+                        # Get headers (first row)
+                        headers = table[0] if table else []
+                        
+                        # Try to pair headers with values from subsequent rows
+                        for col_idx, header in enumerate(headers):
+                            if not header or not str(header).strip():
+                                continue
+                            
+                            header_clean = str(header).strip()
+                            
+                            # Look for values in the same column
+                            for row_idx in range(1, min(6, len(table))):  # Check first 5 data rows
+                                if len(table[row_idx]) > col_idx:
+                                    value = table[row_idx][col_idx]
+                                    if value and str(value).strip():
+                                        field_key = f"{header_clean}"
+                                        if field_key not in fields:
+                                            fields[field_key] = str(value).strip()
+                                        break
+                
+                # Method 2: Extract key-value pairs from text
+                # Common patterns: "Label: Value", "Label Value", "Label\nValue"
+                lines = text.split('\n')
+                
+                for i, line in enumerate(lines):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    
+                    # Pattern: "Label: Value"
+                    if ':' in line:
+                        parts = line.split(':', 1)
+                        if len(parts) == 2:
+                            key = parts[0].strip()
+                            value = parts[1].strip()
+                            if key and value and len(key) < 50 and len(value) < 200:
+                                if key not in fields:
+                                    fields[key] = value
+                    
+                    # Pattern: Look for common invoice fields
+                    common_patterns = [
+                        (r'Invoice\s*(?:Number|#|No\.?)\s*[:\s]\s*(.+)', 'Invoice Number'),
+                        (r'Invoice\s*Date\s*[:\s]\s*(.+)', 'Invoice Date'),
+                        (r'Due\s*Date\s*[:\s]\s*(.+)', 'Due Date'),
+                        (r'Total\s*Amount\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Total Amount'),
+                        (r'Subtotal\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Subtotal'),
+                        (r'Tax\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Tax'),
+                        (r'Amount\s*Due\s*[:\s]?\s*(?:USD|usd|\$)?\s*([0-9,]+\.?[0-9]*)', 'Amount Due'),
+                        (r'Customer\s*(?:Name|ID)?\s*[:\s]\s*(.+)', 'Customer'),
+                        (r'Vendor\s*(?:Name|ID)?\s*[:\s]\s*(.+)', 'Vendor'),
+                        (r'PO\s*(?:Number|#)?\s*[:\s]\s*(.+)', 'PO Number'),
+                    ]
+                    
+                    for pattern, field_name in common_patterns:
+                        match = re.search(pattern, line, re.IGNORECASE)
+                        if match and field_name not in fields:
+                            value = match.group(1).strip()
+                            if value:
+                                fields[field_name] = value
+                
+                # Method 3: Look for standalone labeled fields across multiple lines
+                for i, line in enumerate(lines):
+                    # Check if this line looks like a label (short, ends with specific keywords)
+                    if len(line) < 50 and any(keyword in line.lower() for keyword in 
+                        ['number', 'date', 'name', 'id', 'code', 'amount', 'total', 'address', 'email', 'phone']):
+                        # Check next line for potential value
+                        if i + 1 < len(lines):
+                            next_line = lines[i + 1].strip()
+                            if next_line and len(next_line) < 200:
+                                label = line.strip().rstrip(':')
+                                if label and label not in fields:
+                                    fields[label] = next_line
+                
+    except Exception as e:
+        _warn(f"Error extracting fields from {os.path.basename(pdf_path)}: {str(e)}")
+    
+    return fields
+
+def sample_pdf_files(pdf_files, sample_size=DISCOVERY_SAMPLE_SIZE):
+    """
+    Pick PDFs spread evenly over a list of files.
+    
+    Args:
+        pdf_files: List of PDF file paths (e.g. from get_pdf_files)
+        sample_size: Maximum number of files to pick
+        
+    Returns:
+        List of PDF file paths, in the original order
+    """
+    if len(pdf_files) <= sample_size:
+        return list(pdf_files)
+    return [pdf_files[i * len(pdf_files) // sample_size] for i in range(sample_size)]
+
+def discover_fields(pdf_files, workers=1, cancel_event=None):
+    """
+    Extract all possible fields from several PDFs, optionally in parallel.
+    
+    Results are yielded as soon as each PDF is done (not in file order), so
+    a caller can show them while the remaining files are still analyzed.
+    
+    Args:
+        pdf_files: List of PDF file paths (e.g. from sample_pdf_files)
+        workers: Number of worker processes (1 = extract in this process)
+        cancel_event: Optional threading.Event; when set, no further results
+                      are yielded and pending files are not analyzed
+        
+    Yields:
+        Tuples (pdf_path, {field_name: value})
+    """
+    def cancelled():
+        return cancel_event is not None and cancel_event.is_set()
+    
+    workers = max(1, min(workers or 1, len(pdf_files)))
+    
+    if workers == 1:
+        for pdf_path in pdf_files:
+            if cancelled():
+                return
+            yield pdf_path, extract_all_fields_from_pdf(pdf_path)
+        return
+    
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = {
+            executor.submit(extract_all_fields_from_pdf, pdf_path): pdf_path
+            for pdf_path in pdf_files
+        }
+        while pending and not cancelled():
+            done, _ = wait(pending, timeout=DISCOVERY_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            for future in done:
+                pdf_path = pending.pop(future)
+                if cancelled():
+                    return
+                yield pdf_path, future.result()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+class FieldDiscovery:
+    """
+    Fields discovered in several PDFs, with the number of PDFs each field
+    was found in.
+    """
+    
+    def __init__(self):
+        self.counts = OrderedDict()   # field_name -> number of PDFs
+        self.samples = {}             # field_name -> first value seen
+        self.files = OrderedDict()    # pdf_path -> set of field names
+    
+    def add(self, pdf_path, fields):
+        """Merge the fields discovered in one PDF"""
+        self.files[pdf_path] = set(fields)
+        for field_name, value in fields.items():
+            self.counts[field_name] = self.counts.get(field_name, 0) + 1
+            self.samples.setdefault(field_name, value)
+    
+    def ranked_fields(self):
+        """Return the field names, most frequent first (ties in discovery order)"""
+        order = {field_name: i for i, field_name in enumerate(self.counts)}
+        return sorted(self.counts, key=lambda field_name: (-self.counts[field_name], order[field_name]))
+    
+    def best_sample(self, field_names):
+        """Return the analyzed PDF that contains most of the given fields, or None"""
+        if not self.files:
+            return None
+        wanted = set(field_names)
+        return max(self.files, key=lambda pdf_path: len(self.files[pdf_path] & wanted))
+
+class FieldMatcher:
+    """
+    Finds the labels of all mapped fields in a single scan of the text.
+    
+    The labels are combined into one case-insensitive alternation, so the
+    cost of a scan grows with the length of the text rather than with the
+    number of fields. Values are only captured from a short window after
+    each label.
+    """
+    
+    # Value right after the label ("Label: value" or "Label value")
+    VALUE_AFTER_LABEL = re.compile(r'\s*[:\s]\s*(.+?)(?:\n|$)', re.DOTALL)
+    # First number after the label
+    NUMBER_AFTER_LABEL = re.compile(r'([0-9,]+\.?[0-9]*)')
+    
+    def __init__(self, field_patterns):
+        self.field_patterns = [pattern for pattern in field_patterns if pattern]
+        
+        # Case-insensitive label -> field names using it
+        self._fields_by_label = OrderedDict()
+        for pattern in self.field_patterns:
+            self._fields_by_label.setdefault(pattern.lower(), []).append(pattern)
+        
+        # Anchored label regexes, grouped by first character, used to find
+        # every label starting at a position where the alternation matched
+        self._labels_by_first_char = {}
+        for label in self._fields_by_label:
+            regex = re.compile(re.escape(label), re.IGNORECASE)
+            for first_char in {label[0].lower(), label[0].upper()}:
+                self._labels_by_first_char.setdefault(first_char, []).append((label, regex))
+        
+        # Zero-width lookahead so overlapping labels are all found
+        labels = sorted(self._fields_by_label, key=len, reverse=True)
+        self._anchor_regex = re.compile(
+            '(?=(?:' + '|'.join(re.escape(label) for label in labels) + '))',
+            re.IGNORECASE
+        ) if labels else None
+    
+    def find_anchors(self, text):
+        """
+        Find where each field label occurs in the text.
+        
+        Args:
+            text: Text to scan
+            
+        Returns:
+            Dictionary of field_name: [end offsets of the label], in text order
+        """
+        anchors = {}
+        if self._anchor_regex is None or not text:
+            return anchors
+        
+        for match in self._anchor_regex.finditer(text):
+            pos = match.start()
+            for label, regex in self._labels_by_first_char.get(text[pos], []):
+                label_match = regex.match(text, pos)
+                if label_match:
+                    for field in self._fields_by_label[label]:
+                        anchors.setdefault(field, []).append(label_match.end())
+        
+        return anchors
+    
+    def fields_in(self, text):
+        """Return the set of fields whose label occurs in the text"""
+        return set(self.find_anchors(text))
+    
+    def match_values(self, text, fields=None, found_by=None):
+        """
+        Extract values for fields from the text.
+        
+        For each field, the first label followed by a value is used; if no
+        label has a value on the same or next line, the first number after
+        a label is used instead.
+        
+        Args:
+            text: Text to scan
+            fields: Optional subset of field names to look for
+            found_by: Optional dictionary that receives field_name: "text" or
+                      "multiline" (value on a later line than its label)
+            
+        Returns:
+            Dictionary of found field values
+        """
+        results = {}
+        anchors = self.find_anchors(text)
+        
+        for field in (fields if fields is not None else self.field_patterns):
+            for value_regex in (self.VALUE_AFTER_LABEL, self.NUMBER_AFTER_LABEL):
+                match = None
+                for end in anchors.get(field, []):
+                    window = text[end:end + VALUE_WINDOW_CHARS]
+                    if value_regex is self.VALUE_AFTER_LABEL:
+                        match = value_regex.match(window)
+                    else:
+                        match = value_regex.search(window)
+                    if match:
+                        break
+                
+                if match:
+                    value = match.group(1).strip()
+                    if value:
+                        results[field] = value
+                        if found_by is not None:
+                            found_by[field] = 'multiline' if '\n' in match.string[:match.start(1)] else 'text'
+                        break
+        
+        return results
+
+@lru_cache(maxsize=32)
+def _compiled_field_matcher(field_patterns):
+    return FieldMatcher(field_patterns)
+
+def get_field_matcher(field_patterns):
+    """
+    Get the compiled FieldMatcher for a field mapping.
+    
+    Matchers are built once per mapping and reused for every page and PDF.
+    
+    Args:
+        field_patterns: List of field names/patterns
+        
+    Returns:
+        FieldMatcher instance
+    """
+    return _compiled_field_matcher(tuple(field_patterns))
+
+def page_hits(found_on):
+    """
+    Turn the pages fields were found on into page positions.
+    
+    Every page is counted both from the start (0 = first page) and from the
+    end (-1 = last page) of its PDF, so "always on the last page" is learned
+    from PDFs of any length.
+    
+    Args:
+        found_on: Dictionary of field_name: (page_num, page_count)
+        
+    Returns:
+        List of (field_name, position) pairs
+    """
+    hits = []
+    for field, (page_num, page_count) in found_on.items():
+        hits.append((field, page_num))
+        hits.append((field, page_num - page_count))
+    return hits
+
+class PageStats:
+    """
+    Statistics of the pages fields were found on, used to search the most
+    likely pages of a PDF first.
+    
+    The likely pages are followed by the first and last SEARCH_EDGE_PAGES
+    pages, where fields usually are, and only then by the pages in between,
+    so every page is still searched for a field that is not found earlier.
+    """
+    
+    def __init__(self, hits=None):
+        # field_name -> {position: number of times found there}
+        self.hits = hits or {}
+    
+    def add(self, hits):
+        """Count (field_name, position) pairs (see page_hits)"""
+        for field, position in hits:
+            positions = self.hits.setdefault(field, {})
+            positions[position] = positions.get(position, 0) + 1
+    
+    def likely_pages(self, fields, page_count):
+        """Return the pages any of the fields was found on before, most likely first"""
+        scores = {}
+        for field in fields:
+            positions = self.hits.get(field)
+            if not positions:
+                continue
+            for page_num in range(page_count):
+                score = positions.get(page_num, 0) + positions.get(page_num - page_count, 0)
+                if score:
+                    scores[page_num] = scores.get(page_num, 0) + score
+        return sorted(scores, key=lambda page_num: (-scores[page_num], page_num))
+    
+    def page_order(self, fields, page_count):
+        """
+        Return every page number in search order: the likely pages first,
+        then the first and last SEARCH_EDGE_PAGES pages, then the rest.
+        """
+        edges = min(SEARCH_EDGE_PAGES, page_count // 2)
+        pages = [
+            *range(edges),
+            *range(page_count - edges, page_count),
+            *range(edges, page_count - edges),
+        ]
+        likely = self.likely_pages(fields, page_count)
+        seen = set(likely)
+        return likely + [page_num for page_num in pages if page_num not in seen]
+
+def extract_field_from_pdf(pdf_path, field_patterns, templates=None, engine=DEFAULT_ENGINE,
+                           methods=None, found_by=None, page_stats=None, found_on=None):
+    """
+    Extract specific field(s) from PDF based on field patterns.
+    
+    Args:
+        pdf_path: Full path to the PDF file
+        field_patterns: List of field names/patterns to search for
+        templates: Optional dictionary of field_name: template learned from
+                   a sample PDF (see learn_field_templates)
+        engine: Extraction engine ("pdfplumber" or "pdfminer")
+        methods: Optional dictionary of field_name: method (see
+                 learn_field_methods); the table finder only runs while a
+                 missing field was found in a table, or has no method
+        found_by: Optional dictionary that receives field_name: method
+                  for the fields found in tables or text
+        page_stats: Optional PageStats; pages are searched in order of where
+                    the fields were found before, otherwise from the first
+                    page (see PageStats.page_order)
+        found_on: Optional dictionary that receives field_name:
+                  (page_num, page_count) for the fields found
+        
+    Returns:
+        Dictionary of found field values
+    """
+    results = {}
+    matcher = get_field_matcher(field_patterns)
+    page_stats = page_stats or PageStats()
+    
+    def needs_tables(missing):
+        return methods is None or any(methods.get(field, 'table') == 'table' for field in missing)
+    
+    def match_tables(tables):
+        found = set(results)
+        _match_table_values(tables, matcher, results)
+        if found_by is not None:
+            for field in results.keys() - found:
+                found_by[field] = 'table'
+    
+    try:
+        with get_pdf_analysis(pdf_path, engine) as analysis:
+            # Read fields straight from their learned regions, as long as
+            # the label is still where it was in the sample PDF
+            for field, template in (templates or {}).items():
+                if field not in field_patterns or template['page'] >= analysis.page_count:
+                    continue
+                
+                label_text = analysis.region_text(template['page'], template['label_bbox'])
+                if field.lower() in label_text.lower():
+                    value = analysis.region_text(template['page'], template['bbox']).strip()
+                    if value:
+                        results[field] = value
+                        if found_on is not None:
+                            found_on[field] = (template['page'], analysis.page_count)
+            
+            if len(results) == len(field_patterns):
+                return results
+            
+            missing = [pattern for pattern in field_patterns if pattern not in results]
+            for page_num in page_stats.page_order(missing, analysis.page_count):
+                found = set(results)
+                missing = [pattern for pattern in field_patterns if pattern not in results]
+                
+                # Search the regions around the labels first, so the table
+                # finder only runs over a small part of the page
+                for bbox in analysis.label_regions(page_num, missing):
+                    if needs_tables(missing):
+                        match_tables(analysis.region_tables(page_num, bbox))
+                        missing = [pattern for pattern in field_patterns if pattern not in results]
+                    if missing:
+                        results.update(matcher.match_values(
+                            analysis.region_text(page_num, bbox), missing, found_by
+                        ))
+                        missing = [pattern for pattern in field_patterns if pattern not in results]
+                    if not missing:
+                        break
+                
+                # Fall back to the full page for fields whose label is on the
+                # page but whose region did not give a value; pages without
+                # the label never run the table finder
+                anchored = analysis.anchored_labels(page_num, missing) if missing else []
+                if anchored and needs_tables(anchored):
+                    match_tables(analysis.tables(page_num))
+                    missing = [pattern for pattern in field_patterns if pattern not in results]
+                
+                # Search in text (single scan for all remaining fields)
+                if missing:
+                    results.update(matcher.match_values(analysis.text(page_num), missing, found_by))
+                
+                if found_on is not None:
+                    for field in results.keys() - found:
+                        found_on[field] = (page_num, analysis.page_count)
+                
+                # If we found all patterns, break early
+                if len(results) == len(field_patterns):
+                    break
+    
+    except Exception as e:
+        _warn(f"Error extracting field from {os.path.basename(pdf_path)}: {str(e)}")
+    
+    return results
+
+def _match_table_values(tables, matcher, results):
+    """
+    Find values of fields whose label is a table cell.
+    
+    The value is taken from the same column in the next rows. Fields that
+    already have a value in results are skipped.
+    
+    Args:
+        tables: Tables extracted by pdfplumber
+        matcher: FieldMatcher of the field mapping
+        results: Dictionary of found field values (updated in place)
+    """
+    for table in tables or []:
+        if not table:
+            continue
+        
+        for row_idx, row in enumerate(table):
+            if not row:
+                continue
+            
+            for col_idx, cell in enumerate(row):
+                if not cell:
+                    continue
+                
+                cell_str = str(cell)
+                for pattern in matcher.fields_in(cell_str):
+                    if pattern in results:
+                        continue
+                    
+                    # Look in same column, next rows
+                    for data_row in table[row_idx + 1:row_idx + 5]:
+                        if len(data_row) > col_idx and data_row[col_idx]:
+                            value = str(data_row[col_idx]).strip()
+                            if value and value != cell_str:
+                                results[pattern] = value
+                                break
+
+def layout_fingerprint(analysis):
+    """
+    Compute a cheap fingerprint of a PDF's layout.
+    
+    PDFs generated by the same system (e.g. one vendor's invoices) share the
+    first page's size, fonts and the positions of its first text lines, even
+    though the text itself differs.
+    
+    Args:
+        analysis: PDFAnalysis of the PDF
+        
+    Returns:
+        Hex digest string
+    """
+    page = analysis.page(0)
+    
+    # Subset prefixes ("ABCDEF+Helvetica") differ between files
+    fonts = sorted({
+        str(char.get('fontname', '')).split('+')[-1] for char in page.chars
+    })
+    
+    # Left edge of each of the first text lines, snapped to a grid
+    lines = {}
+    for word in analysis.words(0):
+        line = round(word['top'] / FINGERPRINT_GRID)
+        lines[line] = min(lines.get(line, word['x0']), word['x0'])
+    blocks = [
+        (line, round(x0 / FINGERPRINT_GRID))
+        for line, x0 in sorted(lines.items())[:FINGERPRINT_LINES]
+    ]
+    
+    payload = json.dumps({
+        'size': [round(page.width), round(page.height)],
+        'fonts': fonts,
+        'blocks': blocks,
+    })
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def learn_field_templates(pdf_path, field_patterns, engine=DEFAULT_ENGINE):
+    """
+    Learn where the values of the mapped fields sit in a sample PDF.
+    
+    Each field is extracted as usual, then its value is located with the
+    page's word positions next to its label. A template is only kept if
+    reading its region gives back exactly the extracted value.
+    
+    Args:
+        pdf_path: Full path to the sample PDF file
+        field_patterns: List of field names/patterns
+        engine: Extraction engine ("pdfplumber" or "pdfminer")
+        
+    Returns:
+        Dictionary of field_name: {'page': page_num,
+                                   'bbox': (x0, top, x1, bottom) of the value,
+                                   'label_bbox': (x0, top, x1, bottom) of the label}
+    """
+    values = extract_field_from_pdf(pdf_path, field_patterns, engine=engine)
+    
+    try:
+        with get_pdf_analysis(pdf_path, engine) as analysis:
+            return _learn_templates(analysis, values)
+    
+    except Exception as e:
+        _warn(f"Error learning field templates from {os.path.basename(pdf_path)}: {str(e)}")
+    
+    return {}
+
+def learn_field_methods(pdf_path, field_patterns, engine=DEFAULT_ENGINE):
+    """
+    Learn how the values of the mapped fields are found in a sample PDF.
+    
+    Conversions use this to skip the table finder when no missing field
+    was found in a table.
+    
+    Args:
+        pdf_path: Full path to the sample PDF file
+        field_patterns: List of field names/patterns
+        engine: Extraction engine ("pdfplumber" or "pdfminer")
+        
+    Returns:
+        Dictionary of field_name: method (one of FIELD_METHODS) for the
+        fields found in the sample
+    """
+    found_by = {}
+    extract_field_from_pdf(pdf_path, field_patterns, engine=engine, found_by=found_by)
+    return {field: found_by[field] for field in field_patterns if field in found_by}
+
+def _learn_templates(analysis, values, found_on=None):
+    """
+    Return the templates of the extracted field values found in a PDF.
+    
+    found_on gives the pages the values were found on (see
+    extract_field_from_pdf); other fields are looked for on every page.
+    """
+    found_on = found_on or {}
+    templates = {}
+    for field, value in values.items():
+        pages = [found_on[field][0]] if field in found_on else range(analysis.page_count)
+        for page_num in pages:
+            template = _learn_field_template(analysis, page_num, field, value)
+            if template is not None:
+                templates[field] = template
+                break
+    return templates
+
+def _learn_field_template(analysis, page_num, field, value):
+    """Return the template of a field on one page, or None if not found"""
+    words = analysis.words(page_num)
+    page_x0, page_top, page_x1, page_bottom = analysis.page(page_num).bbox
+    
+    labels = list(_word_runs(words, field))
+    values = list(_word_runs(words, value, exact=True))
+    if not labels or not values:
+        return None
+    
+    # Use the value occurrence closest below/right of the first label
+    label = labels[0]
+    candidates = [box for box in values if box[1] >= label[1] - TEMPLATE_PADDING] or values
+    box = min(candidates, key=lambda b: (abs(b[1] - label[1]), abs(b[0] - label[0])))
+    
+    # Let the region grow to the right up to the next word on the same line,
+    # so longer values in other PDFs of the same layout still fit
+    right = page_x1
+    for word in words:
+        if word['x0'] > box[2] and word['top'] < box[3] and word['bottom'] > box[1]:
+            right = min(right, word['x0'] - TEMPLATE_PADDING)
+    
+    def rounded(x0, top, x1, bottom):
+        # Stored boxes are rounded; rounding must not leave the page (e.g.
+        # an A4 page is 595.2756 points wide)
+        return (
+            max(page_x0, round(x0, 2)),
+            max(page_top, round(top, 2)),
+            min(page_x1, round(x1, 2)),
+            min(page_bottom, round(bottom, 2)),
+        )
+    
+    bbox = rounded(
+        box[0] - TEMPLATE_PADDING,
+        box[1] - TEMPLATE_PADDING,
+        right,
+        box[3] + TEMPLATE_PADDING,
+    )
+    label_bbox = rounded(
+        label[0] - TEMPLATE_PADDING,
+        label[1] - TEMPLATE_PADDING,
+        label[2] + TEMPLATE_PADDING,
+        label[3] + TEMPLATE_PADDING,
+    )
+    
+    if analysis.region_text(page_num, bbox).strip() != value:
+        return None
+    if field.lower() not in analysis.region_text(page_num, label_bbox).lower():
+        return None
+    
+    return {
+        'page': page_num,
+        'bbox': bbox,
+        'label_bbox': label_bbox,
+    }
+
+def extract_total_amount(pdf_path, found_by=None, page_stats=None, found_on=None):
+    """
+    Extract the total amount from a PDF file by looking for 'Total Amount' column.
+    
+    The text of the two most likely pages (by default the last and the
+    first page) is matched first; only when that gives no amount with at
+    least TIER_CONFIDENCE is the file escalated to table detection and a
+    scan of every page in the order of PageStats.page_order.
+    
+    Args:
+        pdf_path: Full path to the PDF file
+        found_by: Optional dictionary that receives 'Total Amount': tier
+                  (see EXTRACTION_TIERS) when an amount is found
+        page_stats: Optional PageStats of where amounts were found before
+        found_on: Optional dictionary that receives 'Total Amount':
+                  (page_num, page_count) when an amount is found
+        
+    Returns:
+        Total amount as string or 'N/A' if not found
+    """
+    fields = ['Total Amount']
+    page_stats = page_stats or PageStats()
+    
+    try:
+        with get_pdf_analysis(pdf_path) as analysis:
+            def served(amount, tier, page_num):
+                if found_by is not None:
+                    found_by['Total Amount'] = tier
+                if found_on is not None:
+                    found_on['Total Amount'] = (page_num, analysis.page_count)
+                return amount
+            
+            pages = page_stats.likely_pages(fields, analysis.page_count)
+            if not pages and analysis.page_count:
+                # Totals are usually at the end of an invoice
+                pages = sorted({analysis.page_count - 1, 0}, reverse=True)
+            amount, confidence, page_num = _total_amount_from_pages(analysis, pages[:2])
+            if amount and confidence >= TIER_CONFIDENCE:
+                return served(amount, 'text', page_num)
+            
+            for page_num in page_stats.page_order(fields, analysis.page_count):
+                # Search the regions around the label first, so the table
+                # finder only runs over a small part of the page
+                regions = analysis.label_regions(page_num, fields)
+                for bbox in regions:
+                    amount = _total_amount_from_tables(analysis.region_tables(page_num, bbox))
+                    if amount:
+                        return served(amount, 'table', page_num)
+                    amount = _total_amount_from_text(analysis.region_text(page_num, bbox))
+                    if amount:
+                        return served(amount, 'document', page_num)
+                
+                # Fall back to the full page; its tables only when the label
+                # is on the page but its region did not give an amount
+                if regions:
+                    amount = _total_amount_from_tables(analysis.tables(page_num))
+                    if amount:
+                        return served(amount, 'table', page_num)
+                amount = _total_amount_from_text(analysis.text(page_num))
+                if amount:
+                    return served(amount, 'document', page_num)
+            
+            return 'N/A'
+            
+    except Exception as e:
+        _warn(f"   ⚠ Error reading {os.path.basename(pdf_path)}: {str(e)}")
+        return 'Error'
+
+def _total_amount_from_pages(analysis, pages):
+    """
+    Text tier of extract_total_amount: match the text of a few pages.
+    
+    Returns:
+        Tuple (amount, confidence, page_num) of the most confident match,
+        or (None, 0.0, None)
+    """
+    best = (None, 0.0, None)
+    for page_num in pages:
+        amount, confidence = _scored_total_amount(analysis.text(page_num))
+        if confidence > best[1]:
+            best = (amount, confidence, page_num)
+        if confidence >= TIER_CONFIDENCE:
+            break
+    return best
+
+def _scored_total_amount(text):
+    """Return (amount, confidence) of the best TOTAL_AMOUNT_PATTERNS match in text"""
+    for pattern, confidence in TOTAL_AMOUNT_PATTERNS:
+        match = pattern.search(text)
+        if match:
+            return match.group(1).replace(',', ''), confidence
+    return None, 0.0
+
+def _total_amount_from_tables(tables):
+    """Return the amount below a 'Total Amount' table cell, or None"""
+    # Check if tables exist
+    if tables:
+        for table in tables:
+            if not table:
+                continue
+            
+            # Look for 'Total Amount' in the table
+            for row_idx, row in enumerate(table):
+                if not row:
+                    continue
+                
+                # Check each cell for 'Total Amount'
+                for col_idx, cell in enumerate(row):
+                    if cell and 'Total Amount' in str(cell):
+                        # Try to find the value in the same column
+                        for data_row in table[row_idx + 1:]:
+                            if data_row and len(data_row) > col_idx:
+                                value = data_row[col_idx]
+                                if value and str(value).strip():
+                                    # Clean and return the value
+                                    cleaned = str(value).replace(',', '').replace('USD', '').strip()
+                                    if re.match(r'^[0-9.]+$', cleaned):
+                                        return cleaned
+    return None
+
+def _total_amount_from_text(text):
+    """Return the amount following 'Total Amount' in page text, or None"""
+    # Look for "Total Amount" followed by optional due date and USD amount
+    # Pattern: Total Amount ... Due on ... USD 239.40
+    pattern = r'Total Amount.*?USD\s*([0-9,]+\.?[0-9]*)'
+    match = re.search(pattern, text, re.IGNORECASE | re.DOTALL)
+    if match:
+        amount = match.group(1).replace(',', '')
+        return amount
+    
+    # Alternative: Look for USD followed by amount near Total Amount
+    lines = text.split('\n')
+    for i, line in enumerate(lines):
+        if 'Total Amount' in line:
+            # Check next few lines for USD amount
+            for j in range(i, min(i + 5, len(lines))):
+                usd_match = re.search(r'USD\s*([0-9,]+\.?[0-9]*)', lines[j])
+                if usd_match:
+                    amount = usd_match.group(1).replace(',', '')
+                    return amount
+    
+    # Fallback patterns
+    patterns = [
+        r'Total Amount[:\s]+USD\s*([0-9,]+\.?[0-9]*)',
+        r'Total Amount[:\s]+([0-9,]+\.?[0-9]*)',
+    ]
+    
+    for pattern in patterns:
+        match = re.search(pattern, text, re.IGNORECASE)
+        if match:
+            amount = match.group(1).replace(',', '')
+            return amount
+    
+    return None
+
+def extract_pdf_record(pdf_path, field_mapping=None, templates=None, engine=DEFAULT_ENGINE,
+                       methods=None):
+    """
+    Extract the configured fields from a single PDF file.
+    
+    Args:
+        pdf_path: Full path to the PDF file
+        field_mapping: List of field names to extract, or None/empty to use
+                       the default (Total Amount) extraction
+        templates: Optional learned field region templates
+        engine: Extraction engine of the field mapping
+        methods: Optional learned field methods (see learn_field_methods)
+        
+    Returns:
+        Tuple (filename, [field_values], full_path)
+    """
+    return _extract_pdf_record(pdf_path, field_mapping, templates, None, engine, methods)[0]
+
+# Extraction plans of the layouts seen by this process:
+# (field mapping, engine, fingerprint) -> plan
+_layout_plans = {}
+
+def _extract_pdf_record(pdf_path, field_mapping=None, templates=None, layout_plans=None,
+                        engine=DEFAULT_ENGINE, methods=None, page_stats=None, data=None,
+                        page_limit=0):
+    """
+    Extract a record, using and learning per-layout extraction plans.
+    
+    This is the unit of work handed to extraction worker processes, so it
+    must stay a module-level function (picklable).
+    
+    A PDF whose layout has a plan (in layout_plans, or learned earlier by
+    this process) is read with that plan. Otherwise the fields are searched
+    as usual and the regions they were found in become the layout's plan.
+    
+    Pages are searched in the order of page_stats (see PageStats), and
+    data is the content of the file if the caller has already read it.
+    A PDF with more than page_limit pages (0 = no limit) is not extracted;
+    its values are "Too large".
+    
+    Returns:
+        Tuple (record, learned, tiers, found_on); learned is (fingerprint,
+        plan) when a new layout was learned, otherwise None, tiers is a
+        dictionary of field_name: tier (see EXTRACTION_TIERS) and found_on
+        of field_name: (page_num, page_count) of the fields found
+    """
+    filename = os.path.basename(pdf_path)
+    tiers = {}
+    found_on = {}
+    
+    if not field_mapping:
+        with get_pdf_analysis(pdf_path, data=data) as analysis:
+            if _exceeds_page_limit(analysis, page_limit):
+                return _failed_result(pdf_path, field_mapping, 'Too large')
+            amount = extract_total_amount(pdf_path, tiers, page_stats, found_on)
+            return (filename, [amount], pdf_path), None, tiers, found_on
+    
+    learned = None
+    with get_pdf_analysis(pdf_path, engine, data) as analysis:
+        if _exceeds_page_limit(analysis, page_limit):
+            return _failed_result(pdf_path, field_mapping, 'Too large')
+        
+        try:
+            fingerprint = layout_fingerprint(analysis)
+        except Exception:
+            # Unreadable PDF: let the extractor report the error
+            fingerprint = None
+        
+        plan_key = (tuple(field_mapping), engine, fingerprint)
+        plan = (layout_plans or {}).get(fingerprint)
+        if plan is None:
+            plan = _layout_plans.get(plan_key)
+        
+        found_by = {}
+        field_values = extract_field_from_pdf(
+            pdf_path, field_mapping, plan if plan is not None else templates, engine, methods,
+            found_by, page_stats, found_on
+        )
+        # Fields not found in tables or text came from their learned regions
+        for field in field_values:
+            method = found_by.get(field)
+            if method is None:
+                tiers[field] = 'template'
+            else:
+                tiers[field] = 'table' if method == 'table' else 'text'
+        
+        if fingerprint is not None and plan is None:
+            try:
+                plan = _learn_templates(analysis, field_values, found_on)
+            except Exception:
+                plan = {}
+            _layout_plans[plan_key] = plan
+            learned = (fingerprint, plan)
+    
+    values = [field_values.get(field, 'N/A') for field in field_mapping]
+    return (filename, values, pdf_path), learned, tiers, found_on
+
+def _exceeds_page_limit(analysis, page_limit):
+    """Check a PDF against a page limit (unreadable PDFs are left to the extractor)"""
+    if not page_limit:
+        return False
+    try:
+        return analysis.page_count > page_limit
+    except Exception:
+        return False
+
+def _failed_result(pdf_path, field_mapping, value):
+    """Return the _extract_pdf_record() result of a file that was not extracted"""
+    values = [value] * (len(field_mapping) if field_mapping else 1)
+    return (os.path.basename(pdf_path), values, pdf_path), None, {}, {}
+
+def extract_pdf_records(pdf_files, field_mapping=None, workers=1, cache=None, templates=None,
+                        plans=None, memory_limit=DEFAULT_DOCUMENT_MEMORY_LIMIT, journal=None,
+                        engine=DEFAULT_ENGINE, methods=None, dedup=None, tiers=None,
+                        limits=DEFAULT_FILE_LIMITS):
+    """
+    Extract records from many PDF files, optionally using a process pool.
+    
+    Results are yielded in the same order as pdf_files, regardless of the
+    order in which worker processes finish.
+    
+    Args:
+        pdf_files: Iterable of PDF file paths (e.g. from iter_pdf_files); it
+                   is consumed by a background thread while the records are
+                   extracted, at most DISCOVERY_QUEUE_SIZE paths ahead
+        field_mapping: List of field names to extract (None for default)
+        workers: Number of worker processes (1 = extract in this process)
+        cache: Optional ExtractionCache; cached files are not parsed again
+        templates: Optional learned field region templates
+        plans: Optional LayoutPlanStore; plans of known layouts are used and
+               newly learned layouts are saved to it, together with the
+               pages the fields were found on (see PageStats)
+        memory_limit: Memory ceiling (bytes) for the parsed page layouts of
+                      one PDF before it is processed in low-memory mode
+        journal: Optional ConversionJournal; files it already holds are not
+                 extracted again, and every other result is appended to it
+        engine: Extraction engine of the field mapping
+        methods: Optional learned field methods (see learn_field_methods)
+        dedup: Optional DuplicateFilter; files with the same content as an
+               exported file or an earlier file are skipped before parsing
+        tiers: Optional collections.Counter that receives the number of
+               extracted field values served by each tier (see
+               EXTRACTION_TIERS); cached and journaled files are not counted
+        limits: FileLimits per PDF; when a time or memory limit is set,
+                files are extracted in worker processes that are killed when
+                a file takes too long or uses too much memory (see
+                WatchdogPool)
+        
+    Yields:
+        Tuples (filename, [field_values], full_path)
+    """
+    # Paths whose values came from the journal (they are not appended again)
+    journaled = set()
+    
+    def tasks():
+        """Yield (pdf_path, known values or None, content or None) per file"""
+        for pdf_path in prefetch(pdf_files, DISCOVERY_QUEUE_SIZE):
+            # Read each file once: its hash (duplicates, cache) and the
+            # parser both use the same buffer
+            data = content_hash = None
+            if dedup is not None or cache is not None:
+                try:
+                    with open(pdf_path, 'rb') as f:
+                        data = f.read()
+                    content_hash = hashlib.sha256(data).hexdigest()
+                except OSError:
+                    pass  # Let the extractor report the error
+            
+            if dedup is not None and content_hash is not None and not dedup.admit(pdf_path, content_hash):
+                continue
+            
+            if journal is not None:
+                values = journal.lookup(pdf_path)
+                if values is not None:
+                    journaled.add(pdf_path)
+                    yield pdf_path, values, None
+                    continue
+            if cache is not None:
+                values = cache.lookup(pdf_path, content_hash)
+                if values is not None:
+                    yield pdf_path, values, None
+                    continue
+            yield pdf_path, None, data
+    
+    layout_plans = plans.load() if plans is not None and field_mapping else None
+    page_stats = PageStats(plans.load_page_hits() if plans is not None and field_mapping else None)
+    results = _extract_records(
+        tasks(), field_mapping, workers, templates, layout_plans, memory_limit, engine, methods,
+        page_stats, limits
+    )
+    
+    for pdf_path, known, result in results:
+        if known is not None:
+            if journal is not None and pdf_path not in journaled:
+                journal.append(pdf_path, known)
+            journaled.discard(pdf_path)
+            yield (os.path.basename(pdf_path), known, pdf_path)
+            continue
+        
+        record, learned, served, found_on = result
+        if tiers is not None:
+            tiers.update(served.values())
+        hits = page_hits(found_on)
+        page_stats.add(hits)
+        if plans is not None and field_mapping:
+            plans.add_page_hits(hits)
+        if learned is not None and plans is not None:
+            fingerprint, plan = learned
+            if fingerprint not in layout_plans:
+                layout_plans[fingerprint] = plan
+                plans.save(fingerprint, plan)
+        if cache is not None:
+            cache.store(pdf_path, record[1])
+        if journal is not None:
+            journal.append(pdf_path, record[1])
+        yield record
+
+def _extract_records(tasks, field_mapping, workers, templates=None, layout_plans=None,
+                     memory_limit=DEFAULT_DOCUMENT_MEMORY_LIMIT, engine=DEFAULT_ENGINE,
+                     methods=None, page_stats=None, limits=NO_FILE_LIMITS):
+    """
+    Extract the files of tasks whose values are not known yet, in order.
+    
+    tasks is an iterable of (pdf_path, known, data) tuples; known are the
+    field values of a journaled or cached file, or None if the file has to
+    be extracted, and data is the file's content if it was already read.
+    It is consumed lazily, so files are extracted while later ones are
+    still being discovered, and at most PENDING_FILES_PER_WORKER files per
+    worker are in flight.
+    
+    Files extracted in this process use page_stats as it is updated by the
+    caller; worker processes start from a copy and update their own.
+    
+    With a time or memory limit set, files are always extracted in a
+    WatchdogPool, even with one worker, so a file over its limits can be
+    stopped; a page limit alone is checked in this process.
+    
+    Yields:
+        Tuples (pdf_path, known, result); result is the _extract_pdf_record()
+        result of an extracted file, otherwise None
+    """
+    workers = max(1, workers or 1)
+    limits = limits or NO_FILE_LIMITS
+    # The page limit is checked by the extraction itself; time and memory
+    # need a process that can be killed
+    watched = bool(limits.seconds or limits.memory)
+    
+    if workers == 1 and not watched:
+        set_document_memory_limit(memory_limit)
+        for pdf_path, known, data in tasks:
+            result = None
+            if known is None:
+                result = _extract_pdf_record(
+                    pdf_path, field_mapping, templates, layout_plans, engine, methods,
+                    page_stats, data, limits.pages
+                )
+            yield pdf_path, known, result
+        return
+    
+    settings = {
+        'field_mapping': field_mapping,
+        'templates': templates,
+        'layout_plans': layout_plans,
+        'engine': engine,
+        'methods': methods,
+        'page_stats': page_stats,
+        'page_limit': limits.pages,
+    }
+    
+    executor = None
+    pending = deque()  # (pdf_path, known, future) in file order
+    
+    def ready():
+        head = pending[0][2]
+        return len(pending) > workers * PENDING_FILES_PER_WORKER or head is None or head.done()
+    
+    try:
+        for pdf_path, known, data in tasks:
+            future = None
+            if known is None:
+                if executor is None:
+                    # Start the workers when the first file has to be extracted;
+                    # the settings are sent once instead of with every file
+                    if watched:
+                        executor = WatchdogPool(
+                            workers, (memory_limit, settings), limits,
+                            lambda pdf_path, value: _failed_result(pdf_path, field_mapping, value)
+                        )
+                    else:
+                        executor = ProcessPoolExecutor(
+                            max_workers=workers, initializer=_init_extraction_worker,
+                            initargs=(memory_limit, settings)
+                        )
+                future = executor.submit(_extract_in_worker, pdf_path, data)
+            pending.append((pdf_path, known, future))
+            
+            # Hand on finished results right away, block only when enough
+            # files are in flight
+            while pending and ready():
+                pdf_path, known, future = pending.popleft()
+                yield pdf_path, known, future.result() if future is not None else None
+        
+        while pending:
+            pdf_path, known, future = pending.popleft()
+            yield pdf_path, known, future.result() if future is not None else None
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+# Settings of the extraction in a worker process (see _init_extraction_worker)
+_worker_settings = None
+
+def _init_extraction_worker(memory_limit, settings):
+    """Initialize an extraction worker process"""
+    global _worker_settings
+    set_document_memory_limit(memory_limit)
+    _worker_settings = settings
+
+def _extract_in_worker(pdf_path, data=None):
+    """Extract one file in a worker process (see _extract_pdf_record)"""
+    result = _extract_pdf_record(pdf_path, data=data, **_worker_settings)
+    
+    # Later files of this worker benefit from where the fields were found
+    page_stats = _worker_settings['page_stats']
+    if page_stats is not None:
+        page_stats.add(page_hits(result[3]))
+    return result
+
+def _run_watched_worker(conn, initargs):
+    """Main loop of a WatchdogPool worker process"""
+    _init_extraction_worker(*initargs)
+    while True:
+        try:
+            task = conn.recv()
+        except EOFError:
+            return
+        if task is None:
+            return
+        
+        fn, args = task
+        try:
+            reply = (True, fn(*args))
+        except Exception as e:
+            reply = (False, e)
+        conn.send(reply)
+
+def process_memory(process):
+    """
+    Return the memory used by a process, in bytes.
+    
+    Args:
+        process: multiprocessing.Process
+        
+    Returns:
+        Resident memory (Linux) or working set (Windows), or None if it
+        cannot be measured on this platform
+    """
+    if sys.platform.startswith('linux'):
+        try:
+            with open(f"/proc/{process.pid}/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+        except (OSError, ValueError, IndexError):
+            return None
+    
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+        
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + [
+                (name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize',
+                    'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage',
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage',
+                    'PagefileUsage', 'PeakPagefileUsage',
+                )
+            ]
+        
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        # The sentinel of a Windows process is its process handle
+        if ctypes.windll.psapi.GetProcessMemoryInfo(
+            wintypes.HANDLE(process.sentinel), ctypes.byref(counters), counters.cb
+        ):
+            return counters.WorkingSetSize
+    
+    return None
+
+class _WatchedWorker:
+    """A worker process of a WatchdogPool and the file it is extracting"""
+    
+    def __init__(self, context, initargs):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(
+            target=_run_watched_worker, args=(child_conn, initargs), daemon=True
+        )
+        self.process.start()
+        child_conn.close()
+        self.job = None  # (future, args) of the running file
+        self.started = 0.0
+    
+    def kill(self):
+        """Stop the process at once"""
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+    
+    def stop(self):
+        """Let an idle process exit, killing it if it does not"""
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(WATCHDOG_POLL_SECONDS * 5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+class WatchdogPool:
+    """
+    Process pool that stops files exceeding their FileLimits.
+    
+    A monitor thread hands files to the workers and checks the time and
+    memory of every running file. A worker over a limit is killed (a PDF
+    stuck in the parser cannot be interrupted otherwise) and replaced; its
+    file's result becomes failed_result(pdf_path, "Timeout" or "Too large").
+    Page limits are checked by the workers themselves (see
+    _extract_pdf_record). Used like the ProcessPoolExecutor in
+    _extract_records: submit() returns a Future.
+    """
+    
+    def __init__(self, max_workers, initargs, limits, failed_result):
+        self.max_workers = max_workers
+        self.initargs = initargs
+        self.limits = limits
+        self.failed_result = failed_result
+        self._context = multiprocessing.get_context()
+        self._jobs = deque()  # (future, fn, args) waiting for a worker
+        self._workers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup, self._notify = multiprocessing.Pipe(duplex=False)
+        self._thread = threading.Thread(target=self._monitor, name="extraction-watchdog", daemon=True)
+        self._thread.start()
+    
+    def submit(self, fn, pdf_path, data=None):
+        """Queue fn(pdf_path, data) for a worker and return its Future"""
+        future = Future()
+        with self._lock:
+            self._jobs.append((future, fn, (pdf_path, data)))
+        self._notify.send(None)
+        return future
+    
+    def shutdown(self, cancel_futures=False):
+        """Stop the monitor and the workers (running files are abandoned)"""
+        self._stop.set()
+        self._notify.send(None)
+        self._thread.join()
+        
+        with self._lock:
+            for future, _, _ in self._jobs:
+                future.cancel()
+            self._jobs.clear()
+        for worker in self._workers:
+            if worker.job is not None:
+                worker.kill()
+            else:
+                worker.stop()
+        self._workers = []
+        self._wakeup.close()
+        self._notify.close()
+    
+    def _monitor(self):
+        try:
+            while not self._stop.is_set():
+                self._dispatch()
+                busy = [worker for worker in self._workers if worker.job is not None]
+                ready = multiprocessing.connection.wait(
+                    [self._wakeup] + [worker.conn for worker in busy], WATCHDOG_POLL_SECONDS
+                )
+                while self._wakeup.poll():
+                    self._wakeup.recv()
+                
+                now = time.monotonic()
+                for worker in busy:
+                    if worker.conn in ready:
+                        self._receive(worker)
+                    elif self.limits.seconds and now - worker.started > self.limits.seconds:
+                        self._fail(worker, 'Timeout')
+                    elif self.limits.memory and (process_memory(worker.process) or 0) > self.limits.memory:
+                        self._fail(worker, 'Too large')
+        except BaseException as e:
+            # Never leave the caller waiting for results that cannot come
+            for worker in self._workers:
+                if worker.job is not None:
+                    worker.job[0].set_exception(e)
+            with self._lock:
+                for future, _, _ in self._jobs:
+                    future.set_exception(e)
+                self._jobs.clear()
+    
+    def _dispatch(self):
+        """Hand queued files to idle workers, starting workers as needed"""
+        with self._lock:
+            while self._jobs:
+                worker = next((worker for worker in self._workers if worker.job is None), None)
+                if worker is None:
+                    if len(self._workers) >= self.max_workers:
+                        return
+                    worker = _WatchedWorker(self._context, self.initargs)
+                    self._workers.append(worker)
+                
+                future, fn, args = self._jobs[0]
+                if future.cancelled():
+                    self._jobs.popleft()
+                    continue
+                try:
+                    worker.conn.send((fn, args))
+                except OSError:
+                    # The worker is gone; the file goes to a new one
+                    self._discard(worker)
+                    continue
+                self._jobs.popleft()
+                future.set_running_or_notify_cancel()
+                worker.job = (future, args)
+                worker.started = time.monotonic()
+    
+    def _receive(self, worker):
+        """Collect the result of a worker's file"""
+        future, args = worker.job
+        try:
+            ok, value = worker.conn.recv()
+        except (EOFError, OSError):
+            # The worker died, e.g. it was killed by the system for lack of memory
+            self._discard(worker)
+            future.set_result(self.failed_result(args[0], 'Error'))
+            return
+        
+        worker.job = None
+        if ok:
+            future.set_result(value)
+        else:
+            future.set_exception(value)
+    
+    def _fail(self, worker, value):
+        """Kill a worker whose file exceeded a limit"""
+        future, args = worker.job
+        self._discard(worker)
+        future.set_result(self.failed_result(args[0], value))
+    
+    def _discard(self, worker):
+        """Kill a worker and forget it"""
+        worker.kill()
+        if worker in self._workers:
+            self._workers.remove(worker)
+
+class DuplicateFilter:
+    """
+    Recognises PDFs by content, so renamed or re-sent copies are skipped.
+    
+    Starts from the content hashes of the PDFs already exported to the
+    target sheet (see exported_content_hashes) and adds every file it lets
+    through, so copies within one run are skipped as well.
+    """
+    
+    def __init__(self, known_hashes=()):
+        self.known = set(known_hashes)
+        self.hashes = {}  # pdf_path -> content hash of the files let through
+        self.skipped = []  # Paths of the duplicates
+    
+    def admit(self, pdf_path, content_hash):
+        """Return True if the file's content is new, False for a duplicate"""
+        if content_hash in self.known:
+            self.skipped.append(pdf_path)
+            return False
+        self.known.add(content_hash)
+        self.hashes[pdf_path] = content_hash
+        return True
+
+def exported_content_hashes(excel_path, sheet_name):
+    """
+    Get the content hashes of the PDFs exported to a sheet.
+    
+    Only the workbook's duplicate index is read. If the workbook was changed
+    since the index was written, no hashes are returned; the index is
+    rebuilt when the next rows are written.
+    
+    Args:
+        excel_path: Path of the Excel file
+        sheet_name: Name of the sheet
+        
+    Returns:
+        Set of content hashes
+    """
+    if not os.path.exists(excel_path):
+        return set()
+    
+    index = ExportIndex(excel_path)
+    try:
+        if not index.is_current(sheet_name):
+            return set()
+        return index.content_hashes(sheet_name)
+    finally:
+        index.rollback()
+        index.close()
+
+def format_tier_counts(tiers):
+    """Describe a Counter of fields per tier, like: text 30 (83%), table 6 (17%)"""
+    total = sum(tiers.values())
+    return ", ".join(
+        f"{tier} {tiers[tier]} ({tiers[tier] / total:.0%})"
+        for tier in EXTRACTION_TIERS if tiers[tier]
+    )
+
+def compare_engines(pdf_files, field_mapping, templates=None, methods=None):
+    """
+    Compare the speed and accuracy of the extraction engines on PDF files.
+    
+    Every file is extracted with each engine in this process (no cache or
+    layout plans). The pdfplumber results are the reference: a field
+    agrees when the other engine extracted the same value.
+    
+    Args:
+        pdf_files: List of PDF file paths
+        field_mapping: List of field names to extract
+        templates: Optional learned field region templates
+        methods: Optional learned field methods
+        
+    Returns:
+        Dictionary of engine: {'seconds': total extraction time,
+                               'found': number of field values found,
+                               'agree': number of values equal to pdfplumber's,
+                               'differences': [(filename, field, value, reference)]}
+    """
+    report = {engine: {'seconds': 0.0, 'found': 0, 'agree': 0, 'differences': []}
+              for engine in EXTRACTION_ENGINES}
+    
+    for pdf_path in pdf_files:
+        results = {}
+        for engine in EXTRACTION_ENGINES:
+            start = time.perf_counter()
+            results[engine] = extract_field_from_pdf(
+                pdf_path, field_mapping, templates, engine, methods
+            )
+            report[engine]['seconds'] += time.perf_counter() - start
+            
+            # Drop the analysis, so the next run of this file starts from scratch
+            with _analysis_lock:
+                for key in [key for key in _analysis_cache if key[0] == os.path.abspath(pdf_path)]:
+                    _analysis_cache.pop(key).close()
+        
+        reference = results[DEFAULT_ENGINE]
+        for engine, values in results.items():
+            stats = report[engine]
+            for field in field_mapping:
+                value = values.get(field)
+                if value is not None:
+                    stats['found'] += 1
+                if value == reference.get(field):
+                    stats['agree'] += 1
+                else:
+                    stats['differences'].append(
+                        (os.path.basename(pdf_path), field, value, reference.get(field))
+                    )
+    
+    return report
+
+def prefetch(iterable, maxsize):
+    """
+    Consume an iterable in a background thread.
+    
+    Items are handed over through a queue of at most maxsize items, so the
+    producer (e.g. a folder walk) runs ahead of the consumer without
+    building the whole list. An exception raised by the iterable is raised
+    again in the consumer.
+    
+    Args:
+        iterable: Iterable to consume
+        maxsize: Maximum number of items waiting in the queue
+        
+    Yields:
+        The items of iterable, in order
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+    done = object()
+    
+    def put(entry):
+        # Give up once the consumer has stopped reading
+        while not stop.is_set():
+            try:
+                items.put(entry, timeout=DISCOVERY_POLL_SECONDS)
+                return True
+            except queue.Full:
+                pass
+        return False
+    
+    def produce():
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            put((done, e))
+        else:
+            put((done, None))
+    
+    thread = threading.Thread(target=produce, name="pdf-discovery", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+
+def write_records_in_batches(records, write_batch, batch_size=None):
+    """
+    Write records to the output while they are being extracted.
+    
+    Records are handed to write_batch every batch_size files, so a crash
+    or a locked workbook never loses more than one batch of rows. A batch
+    that could not be written is retried together with the next one; after
+    MAX_FAILED_WRITES failed writes in a row the conversion stops instead
+    of holding ever more rows, and a resumed run (see ConversionJournal)
+    writes them.
+    
+    write_batch runs in a separate writer thread: extraction continues
+    while a batch is being saved, and at most WRITE_QUEUE_BATCHES further
+    batches wait for the writer, so memory stays bounded however many files
+    are converted. An exception raised by write_batch stops the conversion
+    and is raised again here.
+    
+    Args:
+        records: Iterable of tuples (filename, [field_values], full_path)
+        write_batch: Function writing a list of records; returns True on success
+        batch_size: Number of files per batch (default: FLUSH_EVERY_FILES)
+        
+    Returns:
+        Tuple (number of records, success)
+    """
+    batch_size = max(1, batch_size or FLUSH_EVERY_FILES)
+    batches = queue.Queue(WRITE_QUEUE_BATCHES)
+    state = {'success': True, 'error': None, 'stopped': False}
+    
+    def writer():
+        unwritten = []
+        failed_writes = 0
+        while True:
+            batch = batches.get()
+            if batch is None:
+                return
+            if state['error'] is not None or state['stopped']:
+                continue  # Keep draining so extraction is never blocked
+            unwritten.extend(batch)
+            try:
+                state['success'] = write_batch(unwritten)
+            except BaseException as e:
+                state['error'] = e
+                continue
+            if state['success']:
+                unwritten = []
+                failed_writes = 0
+            else:
+                failed_writes += 1
+                if failed_writes >= MAX_FAILED_WRITES:
+                    state['stopped'] = True
+                    unwritten = []
+    
+    thread = threading.Thread(target=writer, name="excel-writer", daemon=True)
+    thread.start()
+    
+    pending = []
+    count = 0
+    try:
+        for record in records:
+            pending.append(record)
+            count += 1
+            if len(pending) >= batch_size:
+                batches.put(pending)
+                pending = []
+                if state['error'] is not None or state['stopped']:
+                    break
+        else:
+            if pending:
+                batches.put(pending)
+    finally:
+        # Let the writer finish the batches it was given
+        batches.put(None)
+        thread.join()
+    
+    if state['error'] is not None:
+        raise state['error']
+    return count, state['success']
+
+def resolve_sheet_name(excel_path, sheet_name):
+    """
+    Resolve "[Create New Sheet]" to the name of the sheet that will be created.
+    
+    Lets a conversion that is written in several batches keep appending to
+    the sheet created by its first batch.
+    
+    Args:
+        excel_path: Path of the Excel file (may not exist yet)
+        sheet_name: Name of the sheet, or "[Create New Sheet]"
+        
+    Returns:
+        Sheet name
+    """
+    if sheet_name != "[Create New Sheet]" and sheet_name:
+        return sheet_name
+    if not os.path.exists(excel_path):
+        return "PDF Files"
+    
+    import openpyxl
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        sheet_names = wb.sheetnames
+    finally:
+        wb.close()
+    
+    # Same naming as _open_target_sheet
+    base_name = "PDF Files"
+    counter = 1
+    while base_name in sheet_names:
+        base_name = f"PDF Files {counter}"
+        counter += 1
+    return base_name
+
+def write_to_excel(pdf_data, excel_path):
+    """
+    Write PDF filenames, total amounts, and hyperlinks to an Excel file.
+    Prevents duplicate entries by checking existing data.
+    
+    Args:
+        pdf_data: List of tuples (filename, total_amount, full_path)
+        excel_path: Path where the Excel file will be saved
+    """
+    import openpyxl
+    
+    try:
+        # Check if Excel file already exists
+        existing_files = set()
+        if os.path.exists(excel_path):
+            try:
+                wb = openpyxl.load_workbook(excel_path)
+                ws = wb.active
+                
+                # Collect existing filenames by iterating only through cells with values
+                # This completely ignores empty/deleted rows
+                for row in ws.iter_rows(min_row=2, min_col=1, max_col=1):
+                    cell_value = row[0].value
+                    if cell_value and str(cell_value).strip():
+                        existing_files.add(cell_value)
+                
+            except PermissionError:
+                print(f"\n❌ ERROR: Cannot open '{excel_path}'")
+                print("   The file is currently open in another program.")
+                print("   Please close the file and try again.\n")
+                return False
+        else:
+            wb = openpyxl.Workbook()
+            ws = wb.active
+            ws.title = "PDF Files"
+            # Add headers
+            ws['A1'] = "PDF Filename"
+            ws['B1'] = "Total Amount"
+            ws['C1'] = "Path to Invoice"
+            ws['A1'].font = openpyxl.styles.Font(bold=True)
+            ws['B1'].font = openpyxl.styles.Font(bold=True)
+            ws['C1'].font = openpyxl.styles.Font(bold=True)
+        
+        # Filter out duplicates
+        new_data = [(name, amount, path) for name, amount, path in pdf_data if name not in existing_files]
+        duplicates_count = len(pdf_data) - len(new_data)
+        
+        if duplicates_count > 0:
+            print(f"\n⚠ Skipped {duplicates_count} duplicate file(s)")
+        
+        if not new_data:
+            print("\n⚠ No new files to add (all files already exist in Excel)")
+            return True
+        
+        # Find the next empty row
+        start_row = ws.max_row + 1 if ws.max_row > 1 else 2
+        
+        # Write only new PDF data
+        for idx, (pdf_name, total_amount, pdf_path) in enumerate(new_data, start=start_row):
+            ws[f'A{idx}'] = pdf_name
+            ws[f'B{idx}'] = total_amount
+            # Use relative path from Excel file location
+            relative_path = os.path.relpath(pdf_path, os.path.dirname(excel_path))
+            ws[f'C{idx}'].hyperlink = relative_path
+            ws[f'C{idx}'].value = "Open Invoice"
+            ws[f'C{idx}'].font = openpyxl.styles.Font(color="0563C1", underline="single")
+        
+        # Adjust column widths
+        ws.column_dimensions['A'].width = 40
+        ws.column_dimensions['B'].width = 20
+        ws.column_dimensions['C'].width = 20
+        
+        # Save the workbook
+        try:
+            wb.save(excel_path)
+            print(f"\n✓ Successfully wrote {len(new_data)} PDF file(s) to {excel_path}")
+            if duplicates_count > 0:
+                print(f"  ({duplicates_count} duplicate(s) skipped)")
+            return True
+        except PermissionError:
+            print(f"\n❌ ERROR: Cannot save to '{excel_path}'")
+            print("   The file is currently open in another program (Excel, etc.)")
+            print("   Please close the file and try again.\n")
+            
+            # Offer to save with a different name
+            retry = input("Would you like to save with a different filename? (yes/no): ").strip().lower()
+            if retry in ['yes', 'y']:
+                new_path = input("Enter new Excel file path: ").strip()
+                if not new_path.lower().endswith('.xlsx'):
+                    new_path += '.xlsx'
+                return write_to_excel(pdf_data, new_path)
+            return False
+            
+    except Exception as e:
+        print(f"\n❌ Unexpected error: {e}")
+        return False
+
+def _is_failed(values):
+    """Check whether a row's values (a list, or a single total amount) are a failed result"""
+    if not isinstance(values, (list, tuple)):
+        values = [values]
+    return any(value in FAILED_VALUES for value in values)
+
+def _place_rows(pdf_data, index, sheet_name, next_row):
+    """
+    Choose the row each record is written to.
+    
+    A file whose earlier result failed (see FAILED_VALUES) gets its failed
+    row back, so retrying it does not add another row; other records are
+    appended from next_row on.
+    
+    Args:
+        pdf_data: Tuples (filename, [field_values] or total_amount, full_path)
+        index: ExportIndex of the workbook
+        sheet_name: Name of the sheet
+        next_row: First free row of the sheet
+        
+    Returns:
+        Tuple ([(row_idx, record)], number of failed rows replaced)
+    """
+    rows = []
+    replaced = 0
+    for record in pdf_data:
+        row_idx = index.pop_failed_row(sheet_name, record[0], record[2])
+        if row_idx is None:
+            row_idx = next_row
+            next_row += 1
+        else:
+            replaced += 1
+        rows.append((row_idx, record))
+    return rows, replaced
+
+def _index_rows(index, sheet_name, rows, content_hashes):
+    """
+    Record written rows in the duplicate index.
+    
+    Rows of files that could not be extracted are recorded as failed rows,
+    so a later run tries those files again and replaces their row.
+    
+    Args:
+        index: ExportIndex of the workbook
+        sheet_name: Name of the sheet
+        rows: Tuples (row_idx, (filename, values, full_path))
+        content_hashes: Dictionary of pdf_path: content hash
+    """
+    index.add(
+        sheet_name,
+        [pdf_path for _, (_, values, pdf_path) in rows if not _is_failed(values)],
+        content_hashes
+    )
+    index.add_failed(
+        sheet_name,
+        [(pdf_path, row_idx) for row_idx, (_, values, pdf_path) in rows if _is_failed(values)]
+    )
+
+def _open_target_sheet(excel_path, sheet_name, index, log_func):
+    """
+    Load an existing workbook and select (or create) the target sheet.
+    
+    Makes sure the export index describes the selected sheet, rebuilding it
+    from the sheet's rows if the index is missing or stale.
+    
+    Args:
+        excel_path: Path of the existing Excel file
+        sheet_name: Name of the sheet, or "[Create New Sheet]"
+        index: ExportIndex of the workbook
+        log_func: Function to log messages
+        
+    Returns:
+        Tuple (workbook, worksheet, sheet_name)
+    """
+    import openpyxl
+    wb = openpyxl.load_workbook(excel_path)
+    
+    if sheet_name == "[Create New Sheet]":
+        # Generate new sheet name
+        base_name = "PDF Files"
+        counter = 1
+        while base_name in wb.sheetnames:
+            base_name = f"PDF Files {counter}"
+            counter += 1
+        ws = wb.create_sheet(base_name)
+        sheet_name = base_name
+        log_func(f"Creating new sheet: {sheet_name}")
+        index.is_current(sheet_name)
+        index.add_sheet(sheet_name)
+    elif sheet_name in wb.sheetnames:
+        # Use existing sheet
+        ws = wb[sheet_name]
+        if not index.is_current(sheet_name):
+            log_func("Building duplicate index from sheet...")
+            index.rebuild(sheet_name, ws)
+        
+        existing_count = index.count(sheet_name)
+        if existing_count:
+            log_func(f"Found {existing_count} existing file(s) in sheet")
+        else:
+            log_func("Sheet is empty, will add all files")
+    else:
+        ws = wb.create_sheet(sheet_name)
+        index.is_current(sheet_name)
+        index.add_sheet(sheet_name)
+    
+    return wb, ws, sheet_name
+
+def write_to_excel_gui(pdf_data, excel_path, sheet_name, log_func, content_hashes=None,
+                       changed=None):
+    """
+    Write PDF filenames, total amounts, and hyperlinks to an Excel file (GUI version).
+    
+    content_hashes is an optional dictionary of pdf_path: content hash (see
+    DuplicateFilter); copies of exported files under another name are skipped.
+    changed is an optional set of pdf_paths whose content changed since they
+    were exported; they get a new row although their path is in the index.
+    """
+    changed = changed or set()
+    content_hashes = content_hashes or {}
+    # New workbooks are streamed to disk without building them in memory
+    if not os.path.exists(excel_path):
+        streamed_data = [(name, [amount], path) for name, amount, path in pdf_data]
+        return write_to_excel_streaming(
+            streamed_data, excel_path, sheet_name, ["Total Amount"], log_func, content_hashes
+        )
+    
+    index = ExportIndex(excel_path)
+    try:
+        try:
+            wb, ws, sheet_name = _open_target_sheet(excel_path, sheet_name, index, log_func)
+        except PermissionError:
+            log_func(f"\n❌ ERROR: Cannot open '{excel_path}'")
+            log_func("   The file is currently open in another program.")
+            log_func("   Please close the file and try again.")
+            return False
+        
+        _ensure_named_styles(wb)
+        
+        # Add headers if new sheet or empty
+        if ws.max_row == 1 or ws['A1'].value != "PDF Filename":
+            for col_idx, header in enumerate(["PDF Filename", "Total Amount", "Path to Invoice"], start=1):
+                ws.cell(row=1, column=col_idx, value=header).style = HEADER_STYLE
+        
+        new_data = [(name, amount, path) for name, amount, path in pdf_data
+                    if path in changed
+                    or not index.contains(sheet_name, name, path, content_hashes.get(path))]
+        duplicates_count = len(pdf_data) - len(new_data)
+        
+        if duplicates_count > 0:
+            log_func(f"\n⚠ Skipped {duplicates_count} duplicate file(s)")
+        
+        if not new_data:
+            # The workbook is unchanged, so a rebuilt index is still valid
+            index.commit()
+            log_func("\n⚠ No new files to add (all files already exist in Excel)")
+            return True
+        
+        start_row = ws.max_row + 1 if ws.max_row > 1 else 2
+        rows, replaced = _place_rows(new_data, index, sheet_name, start_row)
+        
+        for idx, (pdf_name, total_amount, pdf_path) in rows:
+            ws.cell(row=idx, column=1, value=pdf_name)
+            ws.cell(row=idx, column=2, value=total_amount)
+            # Use relative path from Excel file location
+            link_cell = ws.cell(row=idx, column=3, value="Open Invoice")
+            link_cell.hyperlink = os.path.relpath(pdf_path, os.path.dirname(excel_path))
+            link_cell.style = LINK_STYLE
+        
+        ws.column_dimensions['A'].width = 40
+        ws.column_dimensions['B'].width = 20
+        ws.column_dimensions['C'].width = 20
+        
+        try:
+            wb.save(excel_path)
+        except PermissionError:
+            index.rollback()
+            log_func(f"\n❌ ERROR: Cannot save to '{excel_path}'")
+            log_func("   The file is currently open in another program.")
+            return False
+        
+        _index_rows(index, sheet_name, rows, content_hashes)
+        index.commit()
+        log_func(f"\n✓ Successfully wrote {len(new_data)} PDF file(s) to Excel")
+        if replaced > 0:
+            log_func(f"  ({replaced} failed row(s) replaced)")
+        if duplicates_count > 0:
+            log_func(f"  ({duplicates_count} duplicate(s) skipped)")
+        return True
+            
+    except Exception as e:
+        log_func(f"\n❌ Unexpected error: {e}")
+        return False
+    finally:
+        index.close()
+
+def _ensure_named_styles(wb):
+    """Register the shared header and hyperlink styles in a workbook"""
+    from openpyxl.styles import Font, NamedStyle
+    
+    existing = set(wb.named_styles)
+    if HEADER_STYLE not in existing:
+        wb.add_named_style(NamedStyle(name=HEADER_STYLE, font=Font(bold=True)))
+    if LINK_STYLE not in existing:
+        wb.add_named_style(NamedStyle(name=LINK_STYLE, font=Font(color="0563C1", underline="single")))
+
+class StreamingExcelWriter:
+    """
+    A new Excel file written with openpyxl's write-only mode.
+    
+    Rows are streamed to disk as they are appended, so memory use stays
+    flat no matter how many rows are written, and batches can be appended
+    until the workbook is saved once at the end. Only usable when the Excel
+    file does not exist yet (write-only workbooks cannot be loaded).
+    
+    The duplicate index of the workbook is started afresh and committed
+    when the workbook is saved.
+    """
+    
+    def __init__(self, excel_path, sheet_name, field_mapping, content_hashes=None):
+        """
+        Args:
+            excel_path: Path where the Excel file will be saved
+            sheet_name: Name of the sheet to create ("[Create New Sheet]" for default)
+            field_mapping: List of field names (column headers)
+            content_hashes: Optional dictionary of pdf_path: content hash;
+                            it is read when rows are appended, so it may
+                            still be filled while the writer is open
+        """
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+        
+        if sheet_name == "[Create New Sheet]" or not sheet_name:
+            sheet_name = "PDF Files"
+        
+        self.excel_path = excel_path
+        self.sheet_name = sheet_name
+        self.content_hashes = content_hashes if content_hashes is not None else {}
+        self.count = 0
+        self._cell = WriteOnlyCell
+        self._excel_dir = os.path.dirname(excel_path)
+        
+        self.wb = openpyxl.Workbook(write_only=True)
+        _ensure_named_styles(self.wb)
+        self.ws = self.wb.create_sheet(sheet_name)
+        
+        # Column widths must be set before any rows are written
+        path_col_idx = len(field_mapping) + 2
+        self.ws.column_dimensions['A'].width = 40
+        for col_idx in range(2, path_col_idx + 1):
+            self.ws.column_dimensions[openpyxl.utils.get_column_letter(col_idx)].width = 20
+        
+        headers = ["PDF Filename"] + list(field_mapping) + ["Path to Invoice"]
+        header_row = []
+        for header in headers:
+            cell = WriteOnlyCell(self.ws, value=header)
+            cell.style = HEADER_STYLE
+            header_row.append(cell)
+        self.ws.append(header_row)
+        
+        # Start a fresh duplicate index for the new workbook
+        self.index = ExportIndex(excel_path)
+        self.index.reset()
+        self.index.add_sheet(sheet_name)
+    
+    def append(self, pdf_data):
+        """Append rows for tuples (filename, [field_values], full_path)"""
+        rows = []
+        for pdf_name, field_values, pdf_path in pdf_data:
+            link_cell = self._cell(self.ws, value="Open Invoice")
+            link_cell.hyperlink = os.path.relpath(pdf_path, self._excel_dir)
+            link_cell.style = LINK_STYLE
+            self.ws.append([pdf_name, *field_values, link_cell])
+            # Data rows start below the header row
+            rows.append((self.count + len(rows) + 2, (pdf_name, field_values, pdf_path)))
+        _index_rows(self.index, self.sheet_name, rows, self.content_hashes)
+        self.count += len(rows)
+    
+    def save(self, log_func):
+        """
+        Save the workbook and commit its duplicate index.
+        
+        Returns:
+            True if the workbook was saved
+        """
+        try:
+            try:
+                self.wb.save(self.excel_path)
+            except PermissionError:
+                self.index.rollback()
+                log_func(f"\n❌ ERROR: Cannot save to '{self.excel_path}'")
+                log_func("   The location is not writable or the file is open in another program.")
+                return False
+            
+            self.index.commit()
+            log_func(f"\n✓ Successfully wrote {self.count} PDF file(s) to Excel")
+            return True
+        finally:
+            self.index.close()
+
+def write_to_excel_streaming(pdf_data, excel_path, sheet_name, field_mapping, log_func,
+                             content_hashes=None):
+    """
+    Write PDF data to a new Excel file using openpyxl's write-only mode
+    (see StreamingExcelWriter).
+    
+    Args:
+        pdf_data: List of tuples (filename, [field_values], full_path)
+        excel_path: Path where the Excel file will be saved
+        sheet_name: Name of the sheet to create ("[Create New Sheet]" for default)
+        field_mapping: List of field names (column headers)
+        log_func: Function to log messages
+        content_hashes: Optional dictionary of pdf_path: content hash
+    """
+    try:
+        writer = StreamingExcelWriter(excel_path, sheet_name, field_mapping, content_hashes)
+        writer.append(pdf_data)
+        return writer.save(log_func)
+            
+    except Exception as e:
+        log_func(f"\n❌ Unexpected error: {e}")
+        return False
+
+class ExcelBatchWriter:
+    """
+    Writes the batches of a conversion (see write_records_in_batches) to
+    one sheet.
+    
+    If the Excel file does not exist when the first batch arrives, it is
+    created with a StreamingExcelWriter that stays open across batches and
+    is saved by close(); until then the rows are safe in the conversion
+    journal. Batches for an existing workbook are appended by loading and
+    saving the workbook, which takes longer the larger the workbook is, so
+    they should be large (see FLUSH_EVERY_FILES).
+    """
+    
+    def __init__(self, excel_path, sheet_name, field_mapping, log_func, content_hashes=None):
+        """
+        Args:
+            excel_path: Path of the Excel file
+            sheet_name: Name of the sheet (see resolve_sheet_name)
+            field_mapping: List of field names, or None/empty for the
+                           default Total Amount columns
+            log_func: Function to log messages
+            content_hashes: Optional dictionary of pdf_path: content hash
+                            (see DuplicateFilter)
+        """
+        self.excel_path = excel_path
+        self.sheet_name = sheet_name
+        self.field_mapping = field_mapping
+        self.log_func = log_func
+        self.content_hashes = content_hashes if content_hashes is not None else {}
+        self._stream = None
+    
+    def write(self, records):
+        """
+        Write a batch of tuples (filename, [field_values], full_path).
+        
+        Returns:
+            True if the batch was written (or streamed to a new workbook)
+        """
+        if self._stream is None and not os.path.exists(self.excel_path):
+            self._stream = StreamingExcelWriter(
+                self.excel_path, self.sheet_name, self.field_mapping or ["Total Amount"],
+                self.content_hashes
+            )
+        if self._stream is not None:
+            self._stream.append(records)
+            return True
+        
+        if not self.field_mapping:
+            old_format_data = [(name, values[0], path) for name, values, path in records]
+            return write_to_excel_gui(
+                old_format_data, self.excel_path, self.sheet_name, self.log_func,
+                self.content_hashes
+            )
+        return write_to_excel_with_mapping(
+            records, self.excel_path, self.sheet_name, self.field_mapping, self.log_func,
+            self.content_hashes
+        )
+    
+    def close(self):
+        """
+        Save a workbook that was created by this writer.
+        
+        Returns:
+            True if every written row is on disk
+        """
+        if self._stream is None:
+            return True
+        stream, self._stream = self._stream, None
+        return stream.save(self.log_func)
+
+def write_to_excel_with_mapping(pdf_data, excel_path, sheet_name, field_mapping, log_func,
+                                content_hashes=None, changed=None):
+    """
+    Write PDF data to Excel using custom field mapping.
+    
+    Args:
+        pdf_data: List of tuples (filename, [field_values], full_path)
+        excel_path: Path where the Excel file will be saved
+        sheet_name: Name of the sheet to write to
+        field_mapping: List of field names (column headers)
+        log_func: Function to log messages
+        content_hashes: Optional dictionary of pdf_path: content hash (see
+                        DuplicateFilter); copies of exported files under
+                        another name are skipped
+        changed: Optional set of pdf_paths whose content changed since they
+                 were exported; they get a new row although their path is
+                 in the index
+    """
+    # New workbooks are streamed to disk without building them in memory
+    if not os.path.exists(excel_path):
+        return write_to_excel_streaming(
+            pdf_data, excel_path, sheet_name, field_mapping, log_func, content_hashes
+        )
+    
+    import openpyxl
+    
+    content_hashes = content_hashes or {}
+    changed = changed or set()
+    
+    index = ExportIndex(excel_path)
+    try:
+        try:
+            wb, ws, sheet_name = _open_target_sheet(excel_path, sheet_name, index, log_func)
+        except PermissionError:
+            log_func(f"\n❌ ERROR: Cannot open '{excel_path}'")
+            log_func("   The file is currently open in another program.")
+            log_func("   Please close the file and try again.")
+            return False
+        
+        _ensure_named_styles(wb)
+        path_col_idx = len(field_mapping) + 2
+        
+        # Add headers if new sheet or empty
+        if ws.max_row == 1 or ws['A1'].value != "PDF Filename":
+            headers = ["PDF Filename"] + list(field_mapping) + ["Path to Invoice"]
+            for col_idx, header in enumerate(headers, start=1):
+                cell = ws.cell(row=1, column=col_idx, value=header)
+                cell.style = HEADER_STYLE
+        
+        # Filter duplicates
+        new_data = [(name, values, path) for name, values, path in pdf_data
+                    if path in changed
+                    or not index.contains(sheet_name, name, path, content_hashes.get(path))]
+        duplicates_count = len(pdf_data) - len(new_data)
+        
+        if duplicates_count > 0:
+            log_func(f"\n⚠ Skipped {duplicates_count} duplicate file(s)")
+        
+        if not new_data:
+            # The workbook is unchanged, so a rebuilt index is still valid
+            index.commit()
+            log_func("\n⚠ No new files to add (all files already exist in Excel)")
+            return True
+        
+        start_row = ws.max_row + 1 if ws.max_row > 1 else 2
+        rows, replaced = _place_rows(new_data, index, sheet_name, start_row)
+        
+        # Write data
+        excel_dir = os.path.dirname(excel_path)
+        for row_idx, (pdf_name, field_values, pdf_path) in rows:
+            # PDF filename
+            ws.cell(row=row_idx, column=1, value=pdf_name)
+            
+            # Field values
+            for col_idx, value in enumerate(field_values, start=2):
+                ws.cell(row=row_idx, column=col_idx, value=value)
+            
+            # Path hyperlink
+            link_cell = ws.cell(row=row_idx, column=path_col_idx, value="Open Invoice")
+            link_cell.hyperlink = os.path.relpath(pdf_path, excel_dir)
+            link_cell.style = LINK_STYLE
+        
+        # Adjust column widths
+        ws.column_dimensions['A'].width = 40
+        for col_idx in range(2, len(field_mapping) + 2):
+            col_letter = openpyxl.utils.get_column_letter(col_idx)
+            ws.column_dimensions[col_letter].width = 20
+        path_col = openpyxl.utils.get_column_letter(path_col_idx)
+        ws.column_dimensions[path_col].width = 20
+        
+        try:
+            wb.save(excel_path)
+        except PermissionError:
+            index.rollback()
+            log_func(f"\n❌ ERROR: Cannot save to '{excel_path}'")
+            log_func("   The file is currently open in another program.")
+            return False
+        
+        _index_rows(index, sheet_name, rows, content_hashes)
+        index.commit()
+        log_func(f"\n✓ Successfully wrote {len(new_data)} PDF file(s) to Excel")
+        if replaced > 0:
+            log_func(f"  ({replaced} failed row(s) replaced)")
+        if duplicates_count > 0:
+            log_func(f"  ({duplicates_count} duplicate(s) skipped)")
+        return True
+            
+    except Exception as e:
+        log_func(f"\n❌ Unexpected error: {e}")
+        return False
+    finally:
+        index.close()
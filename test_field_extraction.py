@@ -4,7 +4,7 @@ Run this to test the new field mapping features without the GUI
 """
 
 import os
-from pdf_to_excel import extract_all_fields_from_pdf, extract_field_from_pdf
+from pdf_to_excel_core import extract_all_fields_from_pdf, extract_field_from_pdf
 
 def test_field_extraction():
     """Test field extraction on a sample PDF"""
@@ -0,0 +1,24 @@
+"""Shared fixtures of the test suite"""
+
+import pytest
+
+from pdf_factory import write_invoice
+
+
+@pytest.fixture
+def invoices(tmp_path):
+    """Folder with three invoices; returns (folder, [paths])"""
+    folder = tmp_path / "invoices"
+    folder.mkdir()
+    paths = []
+    for i, amount in enumerate(("10.00", "20.50", "1,234.00")):
+        path = str(folder / f"invoice_{i}.pdf")
+        write_invoice(path, f"INV-{i}", amount)
+        paths.append(path)
+    return str(folder), paths
+
+
+@pytest.fixture(autouse=True)
+def _in_tmp_path(tmp_path, monkeypatch):
+    """Run every test in its own directory (sidecar files land there)"""
+    monkeypatch.chdir(tmp_path)
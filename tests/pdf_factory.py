@@ -0,0 +1,57 @@
+"""Minimal PDF files for the tests (no PDF writer library needed)"""
+
+
+def write_pdf(path, pages):
+    """
+    Write a minimal PDF with text in the standard Helvetica font.
+
+    Args:
+        path: Output file
+        pages: List of pages, each a list of (x, y, text) lines
+    """
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # Pages, filled in once the page objects are numbered
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for lines in pages:
+        text = "".join(
+            f"BT /F1 11 Tf {x} {y} Td ({line.replace('(', '[').replace(')', ']')}) Tj ET\n"
+            for x, y, line in lines
+        )
+        objects.append(f"<< /Length {len(text)} >>\nstream\n{text}endstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        page_ids.append(len(objects))
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{i} 0 R' for i in page_ids)}] "
+        f"/Count {len(page_ids)} >>"
+    )
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def write_invoice(path, number, amount):
+    """Write a one-page invoice with an Invoice Number and a Total Amount"""
+    write_pdf(path, [[
+        (72, 720, f"Invoice Number: {number}"),
+        (72, 690, "Customer Name: Test Co"),
+        (72, 600, f"Total Amount USD {amount}"),
+    ]])
@@ -0,0 +1,82 @@
+"""Tests of the command-line interface (pdf_to_excel_cli.py)"""
+
+import csv
+import io
+import json
+
+import openpyxl
+import pytest
+
+from pdf_to_excel_cli import EXIT_NO_PDFS, EXIT_OK, EXIT_USAGE, main
+
+
+@pytest.fixture
+def broken_pdf(invoices):
+    folder, _ = invoices
+    path = f"{folder}/invoice_3_broken.pdf"
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\nthis is not a PDF\n%%EOF\n")
+    return path
+
+
+@pytest.mark.parametrize("limits", [
+    ["--workers", "1", "--max-seconds", "0", "--max-memory", "0"],  # In-process
+    ["--workers", "2"],  # Watched worker processes
+])
+def test_jsonl_stdout_holds_only_records(invoices, broken_pdf, capfd, limits):
+    folder, _ = invoices
+    assert main([folder, "-f", "jsonl", "--no-cache", *limits]) == EXIT_OK
+
+    out, err = capfd.readouterr()
+    records = [json.loads(line) for line in out.splitlines()]
+    assert [(record["PDF Filename"], record["Total Amount"]) for record in records] == [
+        ("invoice_0.pdf", "10.00"),
+        ("invoice_1.pdf", "20.50"),
+        ("invoice_2.pdf", "1234.00"),
+        ("invoice_3_broken.pdf", "Error"),
+    ]
+    assert "Error reading invoice_3_broken.pdf" in err
+
+
+def test_csv_stdout(invoices, broken_pdf, capfd):
+    folder, _ = invoices
+    assert main([folder, "-f", "csv", "--no-cache", "--workers", "1"]) == EXIT_OK
+
+    rows = list(csv.reader(io.StringIO(capfd.readouterr().out)))
+    assert rows[0] == ["PDF Filename", "Total Amount", "Path to Invoice"]
+    assert [row[:2] for row in rows[1:]] == [
+        ["invoice_0.pdf", "10.00"],
+        ["invoice_1.pdf", "20.50"],
+        ["invoice_2.pdf", "1234.00"],
+        ["invoice_3_broken.pdf", "Error"],
+    ]
+
+
+def test_xlsx_output(tmp_path, invoices):
+    folder, _ = invoices
+    excel_path = str(tmp_path / "out")
+    assert main([folder, "-o", excel_path, "--sheet", "January", "--workers", "1"]) == EXIT_OK
+
+    ws = openpyxl.load_workbook(excel_path + ".xlsx")["January"]
+    assert [row[:2] for row in ws.iter_rows(values_only=True)] == [
+        ("PDF Filename", "Total Amount"),
+        ("invoice_0.pdf", "10.00"),
+        ("invoice_1.pdf", "20.50"),
+        ("invoice_2.pdf", "1234.00"),
+    ]
+
+
+def test_exit_codes(tmp_path, invoices):
+    folder, _ = invoices
+    empty = tmp_path / "empty"
+    empty.mkdir()
+
+    assert main([str(empty), "-f", "jsonl"]) == EXIT_NO_PDFS
+    assert main([str(tmp_path / "missing"), "-f", "jsonl"]) == EXIT_USAGE
+    assert main([folder]) == EXIT_USAGE  # xlsx needs --output
+    assert main([folder, "-f", "sqlite"]) == EXIT_USAGE
+    assert main([folder, "-f", "jsonl", "--workers", "0"]) == EXIT_USAGE
+    assert main([folder, "-f", "csv", "--watch", "-o", "out.csv"]) == EXIT_USAGE
+    with pytest.raises(SystemExit) as exit_info:
+        main([folder, "-f", "pdf"])
+    assert exit_info.value.code == EXIT_USAGE
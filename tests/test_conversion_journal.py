@@ -0,0 +1,128 @@
+"""Tests of resumable conversions (conversion_journal.py)"""
+
+import os
+
+import openpyxl
+import pytest
+
+import pdf_to_excel_core
+from conversion_journal import ConversionJournal, default_journal_path
+from pdf_to_excel_core import (
+    NO_FILE_LIMITS,
+    ExcelBatchWriter,
+    extract_pdf_records,
+    write_records_in_batches,
+)
+
+
+def convert(pdf_files, excel_path, write_batch=None, resume=False):
+    """Run a journaled xlsx conversion; returns (count, success, journal)"""
+    journal = ConversionJournal(default_journal_path(excel_path), resume=resume)
+    writer = ExcelBatchWriter(excel_path, "PDF Files", None, lambda message: None)
+    success = False
+    try:
+        records = extract_pdf_records(pdf_files, workers=1, journal=journal, limits=NO_FILE_LIMITS)
+        count, success = write_records_in_batches(records, write_batch or writer.write, 2)
+        if success:
+            success = writer.close()
+        return count, success, journal
+    finally:
+        # Like the CLI: the journal is only deleted once every row is written
+        if success:
+            journal.discard()
+        else:
+            journal.close()
+
+
+def test_resume_after_failed_save_skips_extraction(tmp_path, invoices, monkeypatch):
+    _, pdf_files = invoices
+    excel_path = str(tmp_path / "out.xlsx")
+
+    # The workbook could not be saved (e.g. it was open in Excel)
+    count, success, journal = convert(pdf_files, excel_path, lambda batch: False)
+    assert (count, success) == (3, False)
+    assert os.path.exists(journal.journal_path)
+    assert not os.path.exists(excel_path)
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("a journaled file was extracted again")
+
+    monkeypatch.setattr(pdf_to_excel_core, "_extract_pdf_record", no_extraction)
+    count, success, journal = convert(pdf_files, excel_path, resume=True)
+
+    assert journal.resumed == 3
+    assert (count, success) == (3, True)
+    assert not os.path.exists(journal.journal_path)
+    rows = list(openpyxl.load_workbook(excel_path)["PDF Files"].iter_rows(values_only=True))
+    assert [row[:2] for row in rows[1:]] == [
+        ("invoice_0.pdf", "10.00"), ("invoice_1.pdf", "20.50"), ("invoice_2.pdf", "1234.00"),
+    ]
+
+
+def test_journal_ignores_changed_failed_and_torn_entries(tmp_path, invoices):
+    _, pdf_files = invoices
+    journal_path = str(tmp_path / "out.journal.jsonl")
+
+    journal = ConversionJournal(journal_path, ["Total Amount"])
+    journal.append(pdf_files[0], ["10.00"])
+    journal.append(pdf_files[1], ["Timeout"])
+    journal.append(pdf_files[2], ["1234.00"])
+    # Appended results are on disk, not kept in memory
+    assert journal.entries == {}
+    journal.close()
+
+    with open(pdf_files[2], "ab") as f:
+        f.write(b"\n% changed since it was journaled\n")
+    with open(journal_path, "a", encoding="utf-8") as f:
+        f.write('{"path": "torn')
+
+    journal = ConversionJournal(journal_path, ["Total Amount"], resume=True)
+    try:
+        assert journal.resumed == 1
+        assert journal.lookup(pdf_files[0]) == ["10.00"]
+        assert journal.lookup(pdf_files[1]) is None
+        assert journal.lookup(pdf_files[2]) is None
+    finally:
+        journal.close()
+
+    # Another field mapping does not resume this journal
+    journal = ConversionJournal(journal_path, ["Invoice Number"], resume=True)
+    try:
+        assert journal.resumed == 0
+    finally:
+        journal.discard()
+    assert not os.path.exists(journal_path)
+
+
+def test_writer_error_is_raised_and_journal_kept(tmp_path, invoices):
+    _, pdf_files = invoices
+    excel_path = str(tmp_path / "out.xlsx")
+
+    def broken(batch):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        convert(pdf_files, excel_path, broken)
+    assert os.path.exists(default_journal_path(excel_path))
+
+
+def test_written_marks_follow_the_latest_result(tmp_path, invoices):
+    _, pdf_files = invoices
+    journal_path = str(tmp_path / "out.journal.jsonl")
+
+    journal = ConversionJournal(journal_path)
+    for path, amount in zip(pdf_files, ("10.00", "20.50", "1234.00")):
+        journal.append(path, [amount])
+    journal.mark_written(pdf_files[:2])
+    # The second file was extracted again after its row was written
+    journal.append(pdf_files[1], ["20.50"])
+    journal.close()
+
+    journal = ConversionJournal(journal_path, resume=True)
+    try:
+        assert journal.resumed == 3
+        assert journal.was_written(pdf_files[0])
+        assert not journal.was_written(pdf_files[1])
+        assert not journal.was_written(pdf_files[2])
+    finally:
+        journal.close()
@@ -0,0 +1,70 @@
+"""Tests of content-based duplicate detection (DuplicateFilter)"""
+
+import hashlib
+import shutil
+
+from pdf_to_excel_core import (
+    NO_FILE_LIMITS,
+    DuplicateFilter,
+    exported_content_hashes,
+    extract_pdf_records,
+    write_to_excel_gui,
+)
+
+
+def content_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def test_admit_skips_known_and_repeated_content():
+    dedup = DuplicateFilter({"exported"})
+
+    assert not dedup.admit("old.pdf", "exported")
+    assert dedup.admit("a.pdf", "h1")
+    assert not dedup.admit("a copy.pdf", "h1")
+    assert dedup.admit("b.pdf", "h2")
+
+    assert dedup.skipped == ["old.pdf", "a copy.pdf"]
+    assert dedup.hashes == {"a.pdf": "h1", "b.pdf": "h2"}
+
+
+def test_renamed_copies_are_skipped_before_parsing(invoices):
+    folder, pdf_files = invoices
+    copy = f"{folder}/zz_resent.pdf"
+    shutil.copyfile(pdf_files[1], copy)
+
+    dedup = DuplicateFilter()
+    records = list(extract_pdf_records(
+        pdf_files + [copy], workers=1, dedup=dedup, limits=NO_FILE_LIMITS
+    ))
+
+    assert [record[0] for record in records] == ["invoice_0.pdf", "invoice_1.pdf", "invoice_2.pdf"]
+    assert dedup.skipped == [copy]
+    assert dedup.hashes[pdf_files[1]] == content_hash(copy)
+
+
+def test_exported_content_is_skipped_in_a_later_run(tmp_path, invoices):
+    folder, pdf_files = invoices
+    excel_path = str(tmp_path / "out.xlsx")
+
+    dedup = DuplicateFilter(exported_content_hashes(excel_path, "PDF Files"))
+    records = list(extract_pdf_records(pdf_files[:2], workers=1, dedup=dedup, limits=NO_FILE_LIMITS))
+    assert write_to_excel_gui(
+        [(name, values[0], path) for name, values, path in records],
+        excel_path, "PDF Files", lambda message: None, dedup.hashes
+    )
+    assert exported_content_hashes(excel_path, "PDF Files") == {
+        content_hash(path) for path in pdf_files[:2]
+    }
+
+    # A re-sent copy of an exported invoice under a new name
+    copy = f"{folder}/resent.pdf"
+    shutil.copyfile(pdf_files[0], copy)
+    dedup = DuplicateFilter(exported_content_hashes(excel_path, "PDF Files"))
+    records = list(extract_pdf_records(
+        [copy, pdf_files[2]], workers=1, dedup=dedup, limits=NO_FILE_LIMITS
+    ))
+
+    assert [record[0] for record in records] == ["invoice_2.pdf"]
+    assert dedup.skipped == [copy]
@@ -0,0 +1,63 @@
+"""Tests of the pdfminer extraction engine and of --compare-engines"""
+
+import json
+
+import pytest
+
+from pdf_to_excel_cli import EXIT_OK, EXIT_USAGE, main
+from pdf_to_excel_core import (
+    EXTRACTION_ENGINES,
+    PDFAnalysis,
+    PDFMinerAnalysis,
+    compare_engines,
+    extract_field_from_pdf,
+    get_pdf_analysis,
+    write_mapping_file,
+)
+
+FIELDS = ["Invoice Number", "Total Amount"]
+
+
+def test_engine_selects_the_analysis(invoices):
+    _, pdf_files = invoices
+    with get_pdf_analysis(pdf_files[0], "pdfminer") as analysis:
+        assert type(analysis) is PDFMinerAnalysis
+    with get_pdf_analysis(pdf_files[0], "pdfplumber") as analysis:
+        assert type(analysis) is PDFAnalysis
+
+
+@pytest.mark.parametrize("engine", EXTRACTION_ENGINES)
+def test_engines_extract_the_same_fields(invoices, engine):
+    _, pdf_files = invoices
+    values = [extract_field_from_pdf(pdf_path, FIELDS, engine=engine) for pdf_path in pdf_files]
+
+    assert [value["Total Amount"] for value in values] == [
+        "USD 10.00", "USD 20.50", "USD 1,234.00"
+    ]
+    assert [value["Invoice Number"] for value in values] == ["INV-0", "INV-1", "INV-2"]
+
+
+def test_comparison_reports_agreement(invoices):
+    _, pdf_files = invoices
+    report = compare_engines(pdf_files, FIELDS)
+
+    assert set(report) == set(EXTRACTION_ENGINES)
+    for stats in report.values():
+        assert stats["found"] == stats["agree"] == len(pdf_files) * len(FIELDS)
+        assert stats["differences"] == []
+
+
+def test_compare_engines_cli(tmp_path, invoices, capsys):
+    folder, _ = invoices
+    mapping_file = str(tmp_path / "mapping.json")
+    write_mapping_file(mapping_file, FIELDS, engine="pdfminer")
+    with open(mapping_file) as f:
+        assert json.load(f)["engine"] == "pdfminer"
+
+    assert main([folder, "-m", mapping_file, "--compare-engines"]) == EXIT_OK
+    out = capsys.readouterr().out
+    assert all(engine in out for engine in EXTRACTION_ENGINES)
+    assert "Differences" not in out
+
+    # Without a mapping there is nothing to compare
+    assert main([folder, "--compare-engines"]) == EXIT_USAGE
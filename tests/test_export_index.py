@@ -0,0 +1,127 @@
+"""Tests of the workbook duplicate index (export_index.py)"""
+
+import os
+
+import openpyxl
+
+from export_index import ExportIndex, default_index_path
+from pdf_to_excel_core import exported_content_hashes, write_to_excel_with_mapping
+
+FIELDS = ["Invoice Number"]
+
+
+def write_sheet(excel_path, rows):
+    """Write a workbook with one sheet; rows are (filename, value, link target or None)"""
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "PDF Files"
+    ws.append(["PDF Filename", "Invoice Number", "Path to Invoice"])
+    for row_idx, (name, value, target) in enumerate(rows, start=2):
+        ws.cell(row=row_idx, column=1, value=name)
+        ws.cell(row=row_idx, column=2, value=value)
+        if target is not None:
+            cell = ws.cell(row=row_idx, column=3, value="Open Invoice")
+            cell.hyperlink = target
+    wb.save(excel_path)
+
+
+def test_rebuild_keys_rows_on_link_or_filename(tmp_path):
+    excel_path = str(tmp_path / "out.xlsx")
+    write_sheet(excel_path, [
+        ("a.pdf", "INV-1", os.path.join("pdfs", "a.pdf")),
+        ("b.pdf", "INV-2", None),
+        ("c.pdf", "Timeout", os.path.join("pdfs", "c.pdf")),
+        (None, None, None),
+    ])
+
+    index = ExportIndex(excel_path)
+    try:
+        index.rebuild("PDF Files", openpyxl.load_workbook(excel_path)["PDF Files"])
+
+        assert index.count("PDF Files") == 2
+        assert index.contains("PDF Files", "renamed.pdf", str(tmp_path / "pdfs" / "a.pdf"))
+        assert index.contains("PDF Files", "b.pdf", str(tmp_path / "elsewhere" / "b.pdf"))
+        # Failed rows are not exported files: the file is tried again and
+        # its new result goes into the failed row
+        c_path = str(tmp_path / "pdfs" / "c.pdf")
+        assert not index.contains("PDF Files", "c.pdf", c_path)
+        assert index.pop_failed_row("PDF Files", "c.pdf", c_path) == 4
+        assert index.pop_failed_row("PDF Files", "c.pdf", c_path) is None
+    finally:
+        index.close()
+
+
+def test_index_is_current_until_workbook_changes(tmp_path):
+    excel_path = str(tmp_path / "out.xlsx")
+    pdf_path = str(tmp_path / "a.pdf")
+    assert write_to_excel_with_mapping(
+        [("a.pdf", ["INV-1"], pdf_path)], excel_path, "PDF Files", FIELDS, print, {pdf_path: "h1"}
+    )
+    assert os.path.exists(default_index_path(excel_path))
+
+    index = ExportIndex(excel_path)
+    try:
+        assert index.is_current("PDF Files")
+        assert not index.is_current("Other")
+        assert index.contains("PDF Files", "a.pdf", pdf_path)
+    finally:
+        index.close()
+    assert exported_content_hashes(excel_path, "PDF Files") == {"h1"}
+
+    # Edit the workbook behind the index's back
+    wb = openpyxl.load_workbook(excel_path)
+    wb["PDF Files"]["B2"] = "INV-1 (edited)"
+    wb.save(excel_path)
+
+    index = ExportIndex(excel_path)
+    try:
+        assert not index.is_current("PDF Files")
+        assert index.count("PDF Files") == 0
+    finally:
+        index.close()
+    assert exported_content_hashes(excel_path, "PDF Files") == set()
+
+
+def test_stale_index_is_rebuilt_before_writing(tmp_path):
+    excel_path = str(tmp_path / "out.xlsx")
+    pdf_path = str(tmp_path / "a.pdf")
+    write_to_excel_with_mapping(
+        [("a.pdf", ["INV-1"], pdf_path)], excel_path, "PDF Files", FIELDS, print, {pdf_path: "h1"}
+    )
+    os.remove(default_index_path(excel_path))
+
+    messages = []
+    assert write_to_excel_with_mapping(
+        [("a.pdf", ["INV-1"], pdf_path), ("b.pdf", ["INV-2"], str(tmp_path / "b.pdf"))],
+        excel_path, "PDF Files", FIELDS, messages.append
+    )
+
+    assert "Building duplicate index from sheet..." in messages
+    rows = list(openpyxl.load_workbook(excel_path)["PDF Files"].iter_rows(values_only=True))
+    assert [row[0] for row in rows] == ["PDF Filename", "a.pdf", "b.pdf"]
+
+
+def test_content_hashes_count_while_their_row_exists(tmp_path):
+    excel_path = str(tmp_path / "out.xlsx")
+    pdf_path = str(tmp_path / "a.pdf")
+    write_to_excel_with_mapping(
+        [("a.pdf", ["INV-1"], pdf_path)], excel_path, "PDF Files", FIELDS, print, {pdf_path: "h1"}
+    )
+
+    index = ExportIndex(excel_path)
+    try:
+        # A copy under another name is recognised by its content
+        assert index.contains("PDF Files", "copy.pdf", str(tmp_path / "copy.pdf"), "h1")
+
+        # Hashes survive a rebuild as long as their row is still in the sheet
+        ws = openpyxl.load_workbook(excel_path)["PDF Files"]
+        index.reset()
+        index.rebuild("PDF Files", ws)
+        assert index.content_hashes("PDF Files") == {"h1"}
+
+        ws.delete_rows(2)
+        index.reset()
+        index.rebuild("PDF Files", ws)
+        assert index.content_hashes("PDF Files") == set()
+    finally:
+        index.close()
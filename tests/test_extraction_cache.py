@@ -0,0 +1,101 @@
+"""Tests of the persistent extraction cache (extraction_cache.py)"""
+
+import os
+
+import pytest
+
+import pdf_to_excel_core
+from extraction_cache import ExtractionCache, file_content_hash, mapping_hash
+from pdf_to_excel_core import NO_FILE_LIMITS, extract_pdf_records
+
+FIELDS = ["Invoice Number", "Total Amount"]
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ExtractionCache(str(tmp_path / "cache.db"), FIELDS)
+    yield cache
+    cache.close()
+
+
+def test_stored_values_are_served_until_the_file_changes(cache, invoices):
+    _, pdf_files = invoices
+    pdf_path = pdf_files[0]
+
+    assert cache.lookup(pdf_path) is None
+    cache.store(pdf_path, ["INV-0", "10.00"])
+    assert cache.lookup(pdf_path, file_content_hash(pdf_path)) == ["INV-0", "10.00"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Same content, new mtime: a different file key
+    os.utime(pdf_path, ns=(1, 1))
+    assert cache.lookup(pdf_path) is None
+
+
+def test_results_belong_to_their_mapping_and_engine(tmp_path, invoices):
+    _, pdf_files = invoices
+    db_path = str(tmp_path / "cache.db")
+    cache = ExtractionCache(db_path, FIELDS)
+    cache.store(pdf_files[0], ["INV-0", "10.00"])
+    cache.close()
+
+    for other in (
+        ExtractionCache(db_path, ["Invoice Number"]),
+        ExtractionCache(db_path, FIELDS, engine="pdfminer"),
+        ExtractionCache(db_path, FIELDS, templates={"Total Amount": {"page": 0}}),
+    ):
+        try:
+            assert other.lookup(pdf_files[0]) is None
+        finally:
+            other.close()
+
+    assert mapping_hash(FIELDS) == mapping_hash(FIELDS, engine="pdfplumber")
+    assert mapping_hash(FIELDS) != mapping_hash(list(reversed(FIELDS)))
+
+    reopened = ExtractionCache(db_path, FIELDS)
+    try:
+        assert reopened.lookup(pdf_files[0]) == ["INV-0", "10.00"]
+    finally:
+        reopened.close()
+
+
+def test_failed_values_are_not_cached(cache, invoices):
+    _, pdf_files = invoices
+    for value in ("Error", "Timeout", "Too large"):
+        cache.lookup(pdf_files[0])
+        cache.store(pdf_files[0], ["INV-0", value])
+        assert cache.lookup(pdf_files[0]) is None
+    # A failed file does not keep its looked-up key
+    assert cache._keys == {pdf_files[0]: cache._file_key(pdf_files[0])}
+    cache.store(pdf_files[0], ["INV-0", "Error"])
+    assert cache._keys == {}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, invoices):
+    _, pdf_files = invoices
+    cache = ExtractionCache(str(tmp_path / "cache.db"), FIELDS, max_bytes=400)
+    try:
+        for i, pdf_path in enumerate(pdf_files):
+            cache.store(pdf_path, [f"INV-{i}", "x" * 100])
+            cache.lookup(pdf_files[0])  # Keep the first file in use
+        cache.evict()
+
+        assert cache.lookup(pdf_files[0]) is not None
+        assert cache.lookup(pdf_files[1]) is None
+    finally:
+        cache.close()
+
+
+def test_second_run_is_served_from_the_cache(cache, invoices, monkeypatch):
+    _, pdf_files = invoices
+    first = list(extract_pdf_records(pdf_files, FIELDS, cache=cache, limits=NO_FILE_LIMITS))
+    assert cache.hits == 0
+
+    def no_extraction(*args, **kwargs):
+        raise AssertionError("a cached file was extracted again")
+
+    monkeypatch.setattr(pdf_to_excel_core, "_extract_pdf_record", no_extraction)
+    second = list(extract_pdf_records(pdf_files, FIELDS, cache=cache, limits=NO_FILE_LIMITS))
+
+    assert second == first
+    assert cache.hits == len(pdf_files)
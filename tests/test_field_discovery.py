@@ -0,0 +1,82 @@
+"""Tests of corpus-wide field discovery and of the GUI's background mapping work"""
+
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from pdf_to_excel_core import FieldDiscovery, discover_fields, sample_pdf_files
+
+pdf_to_excel = pytest.importorskip("pdf_to_excel")  # Needs tkinter, not a display
+
+
+def test_sample_is_spread_over_the_files():
+    files = [f"{i}.pdf" for i in range(10)]
+    assert sample_pdf_files(files, 20) == files
+    assert sample_pdf_files(files, 3) == ["0.pdf", "3.pdf", "6.pdf"]
+
+
+def test_discovery_counts_fields_per_pdf(invoices):
+    _, pdf_files = invoices
+    discovery = FieldDiscovery()
+    for pdf_path, fields in discover_fields(pdf_files, workers=2):
+        discovery.add(pdf_path, fields)
+
+    assert set(discovery.files) == set(pdf_files)
+    assert discovery.counts["Invoice Number"] == 3
+    assert discovery.ranked_fields()[0] in ("Invoice Number", "Customer Name", "Total Amount")
+    assert discovery.best_sample(["Invoice Number"]) in pdf_files
+
+
+def gui_stub():
+    """Stand-in for PDFtoExcelApp in the worker-thread methods"""
+    app = SimpleNamespace(messages=[], finished=[])
+    app.log_message = app.messages.append
+    app.after = lambda delay, callback: callback()
+    app.finish_field_mapping = lambda *result: app.finished.append(result)
+    return app
+
+
+def test_folder_search_and_discovery_run_in_the_worker_thread(invoices):
+    folder, pdf_files = invoices
+    app = gui_stub()
+    results = queue.Queue()
+
+    pdf_to_excel.PDFtoExcelApp.run_field_discovery(
+        app, folder, False, 1, results, threading.Event()
+    )
+
+    items = []
+    while not results.empty():
+        items.append(results.get())
+    # The sample PDFs first, then one result per PDF, then the end marker
+    assert items[0] == pdf_files
+    assert sorted(item[0] for item in items[1:-1]) == pdf_files
+    assert items[-1] is None
+
+
+def test_empty_folder_ends_discovery(tmp_path):
+    app = gui_stub()
+    results = queue.Queue()
+
+    pdf_to_excel.PDFtoExcelApp.run_field_discovery(
+        app, str(tmp_path), False, 1, results, threading.Event()
+    )
+
+    assert results.get() == []
+    assert results.get() is None
+    assert "No PDF files found in the selected folder" in app.messages
+
+
+def test_learning_hands_the_mapping_to_the_main_loop(invoices):
+    _, pdf_files = invoices
+    app = gui_stub()
+    mapping = ["Invoice Number", "Total Amount"]
+
+    pdf_to_excel.PDFtoExcelApp.learn_field_mapping(app, pdf_files[0], mapping, "pdfplumber")
+
+    [(field_mapping, engine, templates, methods)] = app.finished
+    assert (field_mapping, engine) == (mapping, "pdfplumber")
+    assert set(templates) == set(mapping)
+    assert methods == {"Invoice Number": "text", "Total Amount": "text"}
@@ -0,0 +1,62 @@
+"""Tests of the single-scan field matcher (FieldMatcher)"""
+
+from pdf_to_excel_core import FieldMatcher, get_field_matcher
+
+TEXT = (
+    "INVOICE\n"
+    "invoice number: INV-7\n"
+    "Total\n"
+    "Total Amount: USD 99.00\n"
+    "Due Date\n"
+    "2024-05-01\n"
+)
+
+
+def test_labels_are_found_case_insensitively_and_overlapping():
+    matcher = FieldMatcher(["Invoice", "Invoice Number", "Total Amount", "Missing"])
+
+    anchors = matcher.find_anchors(TEXT)
+
+    # "INVOICE" and the start of "invoice number" both end an "Invoice" label
+    assert anchors["Invoice"] == [len("INVOICE"), len("INVOICE\ninvoice")]
+    assert anchors["Invoice Number"] == [len("INVOICE\ninvoice number")]
+    assert matcher.fields_in(TEXT) == {"Invoice", "Invoice Number", "Total Amount"}
+    assert matcher.fields_in("") == set()
+
+
+def test_values_on_the_same_or_next_line():
+    matcher = FieldMatcher(["Invoice Number", "Total Amount", "Due Date"])
+    found_by = {}
+
+    values = matcher.match_values(TEXT, found_by=found_by)
+
+    assert values == {
+        "Invoice Number": "INV-7",
+        "Total Amount": "USD 99.00",
+        "Due Date": "2024-05-01",
+    }
+    assert found_by == {
+        "Invoice Number": "text",
+        "Total Amount": "text",
+        "Due Date": "multiline",
+    }
+
+
+def test_first_number_after_a_label_is_the_fallback():
+    matcher = FieldMatcher(["Balance"])
+
+    # No separator after the label, so no "Label: value" match
+    assert matcher.match_values("Balance(USD) 1,250.75 due") == {"Balance": "1,250.75"}
+    assert matcher.match_values("Balance") == {}
+
+
+def test_only_the_requested_fields_are_matched():
+    matcher = FieldMatcher(["Invoice Number", "Total Amount", ""])
+
+    assert matcher.field_patterns == ["Invoice Number", "Total Amount"]
+    assert matcher.match_values(TEXT, fields=["Total Amount"]) == {"Total Amount": "USD 99.00"}
+
+
+def test_matchers_are_reused_per_mapping():
+    assert get_field_matcher(["Total Amount"]) is get_field_matcher(["Total Amount"])
+    assert get_field_matcher(["Total Amount"]) is not get_field_matcher(["Invoice Number"])
@@ -0,0 +1,111 @@
+"""Tests of the CSV, SQLite and Parquet output sinks (output_sinks.py)"""
+
+import csv
+import os
+import sqlite3
+
+import pytest
+
+import output_sinks
+import pdf_to_excel_cli
+from output_sinks import CSVSink, SQLiteSink
+from pdf_factory import write_invoice
+
+HEADERS = ["PDF Filename", "Total Amount", "Path to Invoice"]
+
+
+def record(name, amount):
+    return (name, [amount], os.path.abspath(name))
+
+
+def read_csv(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return list(csv.reader(f))
+
+
+def test_csv_sink_appends_and_checks_columns(tmp_path):
+    path = str(tmp_path / "out.csv")
+    for amount in ("1.00", "2.00"):
+        sink = CSVSink(path, HEADERS)
+        try:
+            assert sink.write([record("a.pdf", amount)])
+        finally:
+            sink.close()
+
+    rows = read_csv(path)
+    assert rows[0] == HEADERS
+    assert [row[:2] for row in rows[1:]] == [["a.pdf", "1.00"], ["a.pdf", "2.00"]]
+
+    with pytest.raises(ValueError, match="different columns"):
+        CSVSink(path, ["PDF Filename", "Invoice Number", "Path to Invoice"])
+
+
+def test_sqlite_sink_upserts_on_filename(tmp_path):
+    path = str(tmp_path / "out.db")
+    sink = SQLiteSink(path, HEADERS, "Invoices")
+    try:
+        sink.write([record("a.pdf", "1.00"), record("b.pdf", "2.00")])
+        sink.write([record("a.pdf", "3.00")])
+    finally:
+        sink.close()
+
+    # A newly mapped field becomes a new column
+    sink = SQLiteSink(path, ["PDF Filename", "Total Amount", "Invoice Number", "Path to Invoice"],
+                      "Invoices")
+    try:
+        sink.write([("c.pdf", ["4.00", "INV-4"], os.path.abspath("c.pdf"))])
+    finally:
+        sink.close()
+
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            'SELECT "PDF Filename", "Total Amount", "Invoice Number" FROM "Invoices" '
+            'ORDER BY "PDF Filename"'
+        ).fetchall()
+    finally:
+        conn.close()
+    assert rows == [("a.pdf", "3.00", None), ("b.pdf", "2.00", None), ("c.pdf", "4.00", "INV-4")]
+
+
+def fail_second_batch(monkeypatch, sink_class):
+    """Make the sink's second write raise, like a full disk"""
+    write = sink_class.write
+    calls = []
+
+    def flaky_write(self, records):
+        calls.append(len(records))
+        if len(calls) == 2:
+            raise OSError("disk full")
+        return write(self, records)
+
+    monkeypatch.setattr(sink_class, "write", flaky_write)
+    return calls
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_resume_does_not_write_rows_twice(tmp_path, invoices, monkeypatch, output_format):
+    if output_format == "parquet":
+        pq = pytest.importorskip("pyarrow.parquet")
+    folder, _ = invoices
+    for i in (3, 4):
+        write_invoice(f"{folder}/invoice_{i}.pdf", f"INV-{i}", f"{i}.00")
+    output = str(tmp_path / f"out.{output_format}")
+    args = [folder, "-f", output_format, "-o", output, "--flush-every", "2", "--workers", "1",
+            "--no-cache"]
+
+    sink_class = output_sinks.CSVSink if output_format == "csv" else output_sinks.ParquetSink
+    calls = fail_second_batch(monkeypatch, sink_class)
+    assert pdf_to_excel_cli.main(args) == pdf_to_excel_cli.EXIT_FAILURE
+    assert calls == [2, 2]
+
+    monkeypatch.undo()
+    monkeypatch.chdir(tmp_path)
+    assert pdf_to_excel_cli.main(args + ["--resume"]) == pdf_to_excel_cli.EXIT_OK
+
+    if output_format == "csv":
+        names = [row[0] for row in read_csv(output)[1:]]
+    else:
+        names = pq.read_table(output).column("PDF Filename").to_pylist()
+    assert sorted(names) == [f"invoice_{i}.pdf" for i in range(5)]
+    assert not os.path.exists(os.path.splitext(output)[0] + ".journal.jsonl")
@@ -0,0 +1,58 @@
+"""Tests of the page search order (PageStats)"""
+
+from pdf_factory import write_pdf
+from pdf_to_excel_core import (
+    NO_FILE_LIMITS,
+    PageStats,
+    extract_field_from_pdf,
+    extract_pdf_records,
+    extract_total_amount,
+)
+
+
+def write_long_pdf(path, page_count, field_page, line):
+    """Write a PDF with line on page field_page and filler text on the others"""
+    write_pdf(path, [
+        [(72, 700, line if page_num == field_page else f"Statement page {page_num + 1}")]
+        for page_num in range(page_count)
+    ])
+
+
+def test_page_order_covers_every_page():
+    stats = PageStats()
+    assert stats.page_order(["Total Amount"], 10) == [0, 1, 2, 7, 8, 9, 3, 4, 5, 6]
+    assert stats.page_order(["Total Amount"], 3) == [0, 2, 1]
+    assert stats.page_order(["Total Amount"], 1) == [0]
+
+
+def test_likely_pages_come_first():
+    stats = PageStats()
+    # Found twice on the last page and once on page 5 (counted from the start)
+    stats.add([("Total Amount", -1), ("Total Amount", -1), ("Total Amount", 4)])
+
+    order = stats.page_order(["Total Amount"], 10)
+    assert order[:2] == [9, 4]
+    assert sorted(order) == list(range(10))
+    assert stats.page_order(["Invoice Number"], 10)[:3] == [0, 1, 2]
+
+
+def test_field_on_a_middle_page_is_found(tmp_path):
+    pdf_path = str(tmp_path / "statement.pdf")
+    write_long_pdf(pdf_path, 10, 4, "Total Amount USD 999.00")
+
+    found_on = {}
+    assert extract_total_amount(pdf_path, found_on=found_on) == "999.00"
+    assert found_on == {"Total Amount": (4, 10)}
+
+    records = list(extract_pdf_records([pdf_path], workers=1, limits=NO_FILE_LIMITS))
+    assert records[0][1] == ["999.00"]
+
+
+def test_mapped_field_on_a_middle_page_is_found(tmp_path):
+    pdf_path = str(tmp_path / "statement.pdf")
+    write_long_pdf(pdf_path, 10, 5, "Invoice Number: INV-6")
+
+    found_on = {}
+    results = extract_field_from_pdf(pdf_path, ["Invoice Number"], found_on=found_on)
+    assert results == {"Invoice Number": "INV-6"}
+    assert found_on == {"Invoice Number": (5, 10)}
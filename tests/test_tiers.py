@@ -0,0 +1,58 @@
+"""Tests of the tiered Total Amount extraction"""
+
+from collections import Counter
+
+import pytest
+
+from pdf_to_excel_core import (
+    NO_FILE_LIMITS,
+    extract_pdf_records,
+    extract_total_amount,
+    format_tier_counts,
+)
+from pdf_factory import write_pdf
+
+
+def test_confident_text_match_stays_in_the_text_tier(invoices):
+    _, pdf_files = invoices
+    found_by = {}
+
+    assert extract_total_amount(pdf_files[2], found_by) == "1234.00"
+    assert found_by == {"Total Amount": "text"}
+
+
+@pytest.mark.parametrize("line", ["Total Amount 55.00", "Total Amount: 55.00"])
+def test_weak_match_is_escalated(tmp_path, line):
+    pdf_path = str(tmp_path / "weak.pdf")
+    write_pdf(pdf_path, [[(72, 720, "Invoice Number: INV-9"), (72, 600, line)]])
+    found_by = {}
+
+    assert extract_total_amount(pdf_path, found_by) == "55.00"
+    assert found_by["Total Amount"] in ("table", "document")
+
+
+def test_missing_amount_has_no_tier(tmp_path):
+    pdf_path = str(tmp_path / "none.pdf")
+    write_pdf(pdf_path, [[(72, 720, "Invoice Number: INV-9")]])
+    found_by = {}
+
+    assert extract_total_amount(pdf_path, found_by) == "N/A"
+    assert found_by == {}
+
+
+def test_records_count_fields_per_tier(invoices):
+    folder, pdf_files = invoices
+    weak_path = f"{folder}/invoice_3_weak.pdf"
+    write_pdf(weak_path, [[(72, 600, "Total Amount 55.00")]])
+    tiers = Counter()
+
+    records = list(extract_pdf_records(
+        [*pdf_files, weak_path], tiers=tiers, limits=NO_FILE_LIMITS
+    ))
+
+    assert [record[1] for record in records] == [
+        ["10.00"], ["20.50"], ["1234.00"], ["55.00"]
+    ]
+    assert tiers["text"] == 3
+    assert sum(tiers.values()) == 4
+    assert format_tier_counts(Counter(text=3, table=1)) == "text 3 (75%), table 1 (25%)"
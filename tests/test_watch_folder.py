@@ -0,0 +1,189 @@
+"""Tests of watch mode (watch_folder.py and pdf_to_excel_cli.run_watch)"""
+
+import os
+
+import openpyxl
+import pytest
+
+import pdf_to_excel_cli
+import watch_folder
+from pdf_factory import write_invoice
+from watch_folder import FolderWatcher, ProcessedManifest
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    manifest = ProcessedManifest(str(tmp_path / "out.manifest.db"))
+    yield FolderWatcher(str(folder), manifest, full_rescan_polls=1)
+    manifest.close()
+
+
+def rewrite(path, number, amount):
+    """Overwrite a PDF in place with new content and a new mtime"""
+    mtime_ns = os.stat(path).st_mtime_ns
+    write_invoice(path, number, amount)
+    os.utime(path, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+
+
+def test_new_file_is_reported_once_it_is_stable(watcher):
+    path = os.path.join(watcher.folder_path, "a.pdf")
+    write_invoice(path, "INV-1", "10.00")
+
+    assert watcher.poll() == []  # Still possibly being copied
+    ready = watcher.poll()
+    assert [entry[0] for entry in ready] == [path]
+
+    watcher.mark_processed(ready)
+    assert watcher.poll() == []
+
+    # A restarted watcher remembers the processed files
+    restarted = FolderWatcher(watcher.folder_path, watcher.manifest, full_rescan_polls=1)
+    restarted.poll()
+    assert restarted.poll() == []
+
+
+def test_changed_content_is_reported_and_touch_is_not(watcher):
+    path = os.path.join(watcher.folder_path, "a.pdf")
+    write_invoice(path, "INV-1", "10.00")
+    watcher.poll()
+    watcher.mark_processed(watcher.poll())
+
+    # Same content, new mtime: recorded without being reported
+    os.utime(path, ns=(1, 1))
+    watcher.poll()
+    assert watcher.poll() == []
+    assert watcher.known[path][1] == 1
+
+    rewrite(path, "INV-1", "20.00")
+    watcher.poll()
+    assert [entry[0] for entry in watcher.poll()] == [path]
+
+
+class CountingEntry:
+    """os.DirEntry stand-in that counts stat() calls"""
+
+    def __init__(self, entry, stats):
+        self._entry = entry
+        self._stats = stats
+        self.name = entry.name
+        self.path = entry.path
+
+    def is_file(self):
+        return self._entry.is_file()
+
+    def stat(self):
+        self._stats.append(self.name)
+        return self._entry.stat()
+
+
+def test_new_file_only_stats_new_names(tmp_path, monkeypatch):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    for i in range(5):
+        write_invoice(str(folder / f"old_{i}.pdf"), f"INV-{i}", "1.00")
+    manifest = ProcessedManifest(str(tmp_path / "out.manifest.db"))
+    watcher = FolderWatcher(str(folder), manifest, full_rescan_polls=100)
+    watcher.baseline()
+
+    stats = []
+    scandir = os.scandir
+
+    class CountingScandir:
+        def __init__(self, path):
+            self._entries = scandir(path)
+
+        def __enter__(self):
+            return (CountingEntry(entry, stats) for entry in self._entries.__enter__())
+
+        def __exit__(self, *exc_info):
+            return self._entries.__exit__(*exc_info)
+
+    monkeypatch.setattr(watch_folder.os, "scandir", CountingScandir)
+
+    # The first poll checks every file
+    assert watcher.poll() == []
+    assert len(stats) == 5
+
+    # A dropped file changes the folder's mtime; only its name is checked
+    stats.clear()
+    old = str(folder / "old_0.pdf")
+    rewrite(old, "INV-0", "2.00")
+    new = str(folder / "new.pdf")
+    write_invoice(new, "INV-9", "9.00")
+    os.utime(folder, ns=(1, 1))
+    watcher.poll()
+    ready = watcher.poll()
+    assert [entry[0] for entry in ready] == [new]
+    assert stats == ["new.pdf"]
+    watcher.mark_processed(ready)
+
+    # The in-place change is found by the periodic full rescan
+    watcher.full_rescan_polls = 1
+    watcher.poll()
+    assert [entry[0] for entry in watcher.poll()] == [old]
+    manifest.close()
+
+
+def test_watch_passes_changed_files(watcher, monkeypatch):
+    first = os.path.join(watcher.folder_path, "a.pdf")
+    write_invoice(first, "INV-1", "10.00")
+    calls = []
+    polls = iter(range(6))
+
+    def sleep(seconds):
+        poll = next(polls, None)
+        if poll == 1:
+            rewrite(first, "INV-1", "20.00")
+            write_invoice(os.path.join(watcher.folder_path, "b.pdf"), "INV-2", "5.00")
+        elif poll is None:
+            raise KeyboardInterrupt
+
+    def process(pdf_paths, changed):
+        calls.append(([os.path.basename(path) for path in pdf_paths], changed))
+        return True
+
+    monkeypatch.setattr(watch_folder.time, "sleep", sleep)
+    with pytest.raises(KeyboardInterrupt):
+        watcher.watch(process, 0, lambda message: None)
+
+    assert calls == [(["a.pdf"], set()), (["a.pdf", "b.pdf"], {first})]
+
+
+def test_run_watch_appends_changed_pdfs_to_one_new_sheet(tmp_path, monkeypatch):
+    folder = tmp_path / "drop"
+    folder.mkdir()
+    excel_path = str(tmp_path / "out.xlsx")
+    first = str(folder / "a.pdf")
+    write_invoice(first, "INV-1", "10.00")
+
+    wb = openpyxl.Workbook()
+    wb.active.title = "PDF Files"
+    wb.save(excel_path)
+
+    monkeypatch.setattr(FolderWatcher.__init__, "__defaults__", (1,))
+    polls = iter(range(8))
+
+    def sleep(seconds):
+        poll = next(polls, None)
+        if poll == 2:
+            rewrite(first, "INV-1", "20.00")
+        elif poll == 4:
+            write_invoice(str(folder / "b.pdf"), "INV-2", "30.00")
+        elif poll is None:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(watch_folder.time, "sleep", sleep)
+    exit_code = pdf_to_excel_cli.main([
+        str(folder), "-o", excel_path, "--watch", "--sheet", "[Create New Sheet]",
+        "--workers", "1", "--no-cache", "--max-seconds", "0", "--max-memory", "0",
+    ])
+
+    assert exit_code == pdf_to_excel_cli.EXIT_OK
+    wb = openpyxl.load_workbook(excel_path)
+    assert wb.sheetnames == ["PDF Files", "PDF Files 1"]
+    rows = list(wb["PDF Files 1"].iter_rows(values_only=True))
+    assert [row[:2] for row in rows[1:]] == [
+        ("a.pdf", "10.00"), ("a.pdf", "20.00"), ("b.pdf", "30.00"),
+    ]
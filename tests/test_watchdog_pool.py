@@ -0,0 +1,146 @@
+"""Tests of the per-file limits (WatchdogPool and extract_pdf_records)"""
+
+import json
+import os
+import sys
+import time
+
+import openpyxl
+import pytest
+
+import pdf_to_excel_cli
+from pdf_factory import write_pdf
+from pdf_to_excel_core import (
+    DEFAULT_DOCUMENT_MEMORY_LIMIT,
+    FileLimits,
+    WatchdogPool,
+    extract_pdf_records,
+)
+
+
+def worker_pid(pdf_path, data=None):
+    return os.getpid()
+
+
+def sleep_for(seconds, data=None):
+    time.sleep(seconds)
+    return seconds
+
+
+def hold_memory(megabytes, data=None):
+    block = bytearray(megabytes * 1024 * 1024)
+    time.sleep(30)
+    return len(block)
+
+
+def fail(message, data=None):
+    raise ValueError(message)
+
+
+def watchdog_pool(workers, limits):
+    """WatchdogPool whose failed results are the limit's value"""
+    return WatchdogPool(
+        workers, (DEFAULT_DOCUMENT_MEMORY_LIMIT, {}), limits, lambda pdf_path, value: value
+    )
+
+
+def test_timeout_kills_and_replaces_the_worker():
+    pool = watchdog_pool(1, FileLimits(seconds=1, pages=0, memory=0))
+    try:
+        first_pid = pool.submit(worker_pid, "a.pdf").result(timeout=30)
+
+        started = time.monotonic()
+        assert pool.submit(sleep_for, 60).result(timeout=30) == "Timeout"
+        assert time.monotonic() - started < 10
+
+        # The next file runs in a fresh worker
+        second_pid = pool.submit(worker_pid, "b.pdf").result(timeout=30)
+        assert second_pid != first_pid
+        assert pool.submit(sleep_for, 0).result(timeout=30) == 0
+    finally:
+        pool.shutdown()
+
+
+def test_other_files_are_not_affected():
+    pool = watchdog_pool(2, FileLimits(seconds=2, pages=0, memory=0))
+    try:
+        stuck = pool.submit(sleep_for, 60)
+        quick = [pool.submit(sleep_for, 0.1) for _ in range(5)]
+
+        assert [future.result(timeout=30) for future in quick] == [0.1] * 5
+        assert stuck.result(timeout=30) == "Timeout"
+    finally:
+        pool.shutdown()
+
+
+def test_errors_are_raised_without_losing_the_worker():
+    pool = watchdog_pool(1, FileLimits(seconds=10, pages=0, memory=0))
+    try:
+        pid = pool.submit(worker_pid, "a.pdf").result(timeout=30)
+        with pytest.raises(ValueError, match="broken"):
+            pool.submit(fail, "broken").result(timeout=30)
+        assert pool.submit(worker_pid, "b.pdf").result(timeout=30) == pid
+    finally:
+        pool.shutdown()
+
+
+@pytest.mark.skipif(
+    not (sys.platform.startswith("linux") or sys.platform == "win32"),
+    reason="process memory is only measured on Linux and Windows (see process_memory)"
+)
+def test_memory_limit_stops_the_file():
+    pool = watchdog_pool(1, FileLimits(seconds=0, pages=0, memory=200 * 1024 * 1024))
+    try:
+        assert pool.submit(hold_memory, 400).result(timeout=30) == "Too large"
+        assert pool.submit(sleep_for, 0).result(timeout=30) == 0
+    finally:
+        pool.shutdown()
+
+
+def test_page_limit_marks_long_pdfs_too_large(tmp_path, invoices):
+    _, pdf_files = invoices
+    long_pdf = str(tmp_path / "long.pdf")
+    write_pdf(long_pdf, [[(72, 700, f"Page {page}")] for page in range(5)])
+
+    for workers, limits in ((1, FileLimits(0, 3, 0)), (2, FileLimits(30, 3, 0))):
+        records = list(extract_pdf_records(
+            [pdf_files[0], long_pdf, pdf_files[1]], workers=workers, limits=limits
+        ))
+        assert [record[1] for record in records] == [["10.00"], ["Too large"], ["20.50"]]
+
+
+@pytest.mark.parametrize("fields", [None, ["Invoice Number", "Total Amount"]])
+def test_retried_files_replace_their_failed_row(tmp_path, invoices, fields):
+    folder, _ = invoices
+    write_pdf(f"{folder}/long.pdf", [
+        [(72, 700, "Invoice Number: INV-L")],
+        [(72, 700, "Total Amount USD 99.00")],
+    ])
+    excel_path = str(tmp_path / "out.xlsx")
+    args = [folder, "-o", excel_path, "--workers", "1", "--max-seconds", "0", "--max-memory", "0"]
+    if fields:
+        mapping_file = str(tmp_path / "mapping.json")
+        with open(mapping_file, "w", encoding="utf-8") as f:
+            json.dump({"fields": fields}, f)
+        args += ["-m", mapping_file]
+
+    def rows():
+        ws = openpyxl.load_workbook(excel_path)["PDF Files"]
+        return [row[:-1] for row in ws.iter_rows(min_row=2, values_only=True)]
+
+    # Every run over the page limit keeps the one failed row
+    for _ in range(3):
+        pdf_to_excel_cli.main(args + ["--max-pages", "1"])
+        assert len(rows()) == 4
+    long_row = rows()[-1]
+    assert long_row[0] == "long.pdf" and "Too large" in long_row
+
+    # A successful retry replaces it
+    pdf_to_excel_cli.main(args + ["--max-pages", "0"])
+    assert len(rows()) == 4
+    long_row = rows()[-1]
+    assert long_row[0] == "long.pdf" and long_row[-1].endswith("99.00")
+    assert "Too large" not in long_row
+
+    pdf_to_excel_cli.main(args + ["--max-pages", "0"])
+    assert len(rows()) == 4
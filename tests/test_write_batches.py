@@ -0,0 +1,59 @@
+"""Tests of the batched writer stage (write_records_in_batches)"""
+
+import itertools
+
+import pytest
+
+from pdf_to_excel_core import MAX_FAILED_WRITES, write_records_in_batches
+
+
+def records(count=None):
+    numbers = itertools.count() if count is None else range(count)
+    return ((f"{i}.pdf", [str(i)], f"/pdfs/{i}.pdf") for i in numbers)
+
+
+def test_batches_are_written_in_order():
+    written = []
+
+    def write_batch(batch):
+        written.append([record[0] for record in batch])
+        return True
+
+    assert write_records_in_batches(records(5), write_batch, 2) == (5, True)
+    assert written == [["0.pdf", "1.pdf"], ["2.pdf", "3.pdf"], ["4.pdf"]]
+
+
+def test_failed_batch_is_retried_with_the_next_one():
+    results = iter([False, True, True])
+    written = []
+
+    def write_batch(batch):
+        written.append(len(batch))
+        return next(results)
+
+    assert write_records_in_batches(records(5), write_batch, 2) == (5, True)
+    assert written == [2, 4, 1]
+
+
+def test_conversion_stops_after_repeated_failed_writes():
+    sizes = []
+
+    def write_batch(batch):
+        sizes.append(len(batch))
+        return False
+
+    # Endless input: only the cap on failed writes ends the conversion
+    count, success = write_records_in_batches(records(), write_batch, 10)
+
+    assert not success
+    assert len(sizes) == MAX_FAILED_WRITES
+    assert sizes == [10 * n for n in range(1, MAX_FAILED_WRITES + 1)]
+    assert count < 10 * (MAX_FAILED_WRITES + 5)
+
+
+def test_writer_error_stops_the_conversion():
+    def write_batch(batch):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError, match="disk full"):
+        write_records_in_batches(records(), write_batch, 10)
@@ -0,0 +1,251 @@
+"""
+Incremental watch-folder support for the PDF to Excel Converter.
+
+A FolderWatcher polls a drop folder and reports only PDFs that are new or
+have changed since they were last processed. Processed files are kept in
+a ProcessedManifest (SQLite) with their size, mtime and content hash, so
+restarting the watcher never re-processes the historical files.
+"""
+
+import os
+import sqlite3
+import time
+
+from extraction_cache import file_content_hash
+
+# Default number of seconds between polls
+DEFAULT_POLL_INTERVAL = 5.0
+
+# A full stat() rescan of every PDF is forced every N polls (and done on
+# the first poll). In-place modifications don't touch the folder's mtime,
+# and scans triggered by a new file only stat the new names, so changes to
+# processed files are noticed by this rescan: after up to N polls
+DEFAULT_FULL_RESCAN_POLLS = 60
+
+
+def default_manifest_path(excel_path):
+    """Return the manifest path used for an output workbook"""
+    return os.path.splitext(excel_path)[0] + ".manifest.db"
+
+
+class ProcessedManifest:
+    """SQLite manifest of processed PDF files (path, size, mtime, hash)"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS processed (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                content_hash TEXT,
+                processed_at REAL NOT NULL
+            )
+            """
+        )
+        self.conn.commit()
+
+    def load(self):
+        """
+        Load all manifest entries.
+
+        Returns:
+            Dictionary of path: (size, mtime_ns, content_hash)
+        """
+        return {
+            path: (size, mtime_ns, content_hash)
+            for path, size, mtime_ns, content_hash in self.conn.execute(
+                "SELECT path, size, mtime_ns, content_hash FROM processed"
+            )
+        }
+
+    def record(self, entries):
+        """
+        Record processed files.
+
+        Args:
+            entries: Iterable of tuples (path, size, mtime_ns, content_hash)
+        """
+        now = time.time()
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO processed (path, size, mtime_ns, content_hash, processed_at)
+            VALUES (?, ?, ?, ?, ?)
+            """,
+            [(*entry, now) for entry in entries]
+        )
+        self.conn.commit()
+
+    def close(self):
+        """Close the database"""
+        self.conn.close()
+
+
+class FolderWatcher:
+    """
+    Polls a folder for new or changed PDF files.
+
+    A file is only reported once its size and mtime are unchanged between
+    two polls, so PDFs that are still being copied are not picked up
+    half-written. Files whose size or mtime changed but whose content hash
+    is unchanged (e.g. touched or copied over with identical content) are
+    not reported again.
+    """
+
+    def __init__(self, folder_path, manifest, full_rescan_polls=DEFAULT_FULL_RESCAN_POLLS):
+        self.folder_path = folder_path
+        self.manifest = manifest
+        self.full_rescan_polls = full_rescan_polls
+        self.known = manifest.load()
+        self.pending = {}  # path -> (size, mtime_ns) seen on the previous poll
+        self._folder_mtime = None
+        self._polls_since_rescan = 0
+
+    def _scan(self, skip_known=False):
+        """
+        Yield (path, size, mtime_ns) for the PDFs in the folder.
+
+        With skip_known, processed files that are not waiting to be
+        re-checked are skipped without a stat().
+        """
+        with os.scandir(self.folder_path) as entries:
+            for entry in entries:
+                if not entry.name.lower().endswith('.pdf'):
+                    continue
+                if skip_known and entry.path in self.known and entry.path not in self.pending:
+                    continue
+                try:
+                    if not entry.is_file():
+                        continue
+                    stat = entry.stat()
+                except OSError:
+                    continue
+                yield entry.path, stat.st_size, stat.st_mtime_ns
+
+    def _stat_paths(self, paths):
+        """Yield (path, size, mtime_ns) for the given paths that still exist"""
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            yield path, stat.st_size, stat.st_mtime_ns
+
+    def baseline(self):
+        """
+        Record every PDF currently in the folder as processed, without
+        hashing or extracting it.
+
+        Returns:
+            Number of files recorded
+        """
+        entries = [
+            (path, size, mtime_ns, None)
+            for path, size, mtime_ns in self._scan()
+            if path not in self.known
+        ]
+        self.manifest.record(entries)
+        for path, size, mtime_ns, content_hash in entries:
+            self.known[path] = (size, mtime_ns, content_hash)
+        return len(entries)
+
+    def poll(self):
+        """
+        Look for new or changed PDF files.
+
+        Returns:
+            List of tuples (path, size, mtime_ns, content_hash) ready to be
+            processed, sorted by path
+        """
+        try:
+            folder_mtime = os.stat(self.folder_path).st_mtime_ns
+        except OSError:
+            return []
+
+        # Only list the folder when a file was added or removed (the folder's
+        # mtime changed) or a periodic full rescan is due; otherwise just
+        # re-check the files that were still being written. A listing for
+        # an added file only stats the names that were not processed yet,
+        # so a drop into a large folder does not stat every PDF in it
+        self._polls_since_rescan += 1
+        full_rescan = (
+            self._folder_mtime is None or self._polls_since_rescan >= self.full_rescan_polls
+        )
+        if full_rescan:
+            self._polls_since_rescan = 0
+        if full_rescan or folder_mtime != self._folder_mtime:
+            self._folder_mtime = folder_mtime
+            candidates = self._scan(skip_known=not full_rescan)
+        elif self.pending:
+            candidates = self._stat_paths(list(self.pending))
+        else:
+            return []
+
+        ready = []
+        unchanged = []
+        pending = {}
+        for path, size, mtime_ns in candidates:
+            known = self.known.get(path)
+            if known is not None and known[:2] == (size, mtime_ns):
+                continue
+
+            # Wait until the file stops changing
+            if self.pending.get(path) != (size, mtime_ns):
+                pending[path] = (size, mtime_ns)
+                continue
+
+            try:
+                content_hash = file_content_hash(path)
+            except OSError:
+                continue
+
+            if known is not None and known[2] == content_hash:
+                unchanged.append((path, size, mtime_ns, content_hash))
+            else:
+                ready.append((path, size, mtime_ns, content_hash))
+
+        self.pending = pending
+
+        if unchanged:
+            self.mark_processed(unchanged)
+
+        return sorted(ready)
+
+    def mark_processed(self, entries):
+        """
+        Record files as processed so they are not reported again.
+
+        Args:
+            entries: List of tuples (path, size, mtime_ns, content_hash)
+        """
+        self.manifest.record(entries)
+        for path, size, mtime_ns, content_hash in entries:
+            self.known[path] = (size, mtime_ns, content_hash)
+
+    def watch(self, process_func, interval=DEFAULT_POLL_INTERVAL, log_func=print):
+        """
+        Poll the folder until interrupted, processing new or changed files.
+
+        Args:
+            process_func: Called with a list of PDF paths and the set of
+                          those that were processed before (changed files);
+                          must return True when they were processed
+                          successfully. Files are only recorded in the
+                          manifest on success.
+            interval: Seconds between polls
+            log_func: Function to log messages
+        """
+        while True:
+            ready = self.poll()
+            if ready:
+                log_func(f"Detected {len(ready)} new or changed PDF file(s)")
+                changed = {path for path, _, _, _ in ready if path in self.known}
+                if process_func([path for path, _, _, _ in ready], changed):
+                    self.mark_processed(ready)
+                else:
+                    log_func("⚠ Processing failed, files will be retried")
+                    for path, size, mtime_ns, _ in ready:
+                        self.pending[path] = (size, mtime_ns)
+            time.sleep(interval)